@@ -0,0 +1,309 @@
+"""Run a script for many sets of arguments in worker processes over TCP.
+
+The coordinator parses the script once and sends each worker that
+connects the forms in the binary AST format of binast.py, with the
+function definitions. Then it streams jobs to the workers, at most
+`WINDOW` in flight to each, and writes the results in the order of the
+jobs, as soon as all jobs before them are done. If a worker dies, its
+jobs in flight are sent again to other workers, at most `MAX_ATTEMPTS`
+times. Workers started by the coordinator are restarted if they die.
+
+Messages are netstrings holding bytes: first the program, then each job
+or result as fields encoded by `client.encode`. A job is its index then
+its arguments; a result is the index, the standard output, standard
+error and exit status. An empty message tells a worker to exit.
+"""
+
+import asyncio
+import collections
+import os
+import socket
+import sys
+from typing import (
+    BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, Optional,
+    Tuple,
+)
+
+from client import decode, encode
+from daemon import Response, Script, run_parsed
+from evaluator import NATIVE_OPS
+import binast
+import errors
+import evaluator
+
+WINDOW = 2  # jobs in flight to each worker
+MAX_ATTEMPTS = 3  # of each job
+MAX_LENGTH_DIGITS = 12  # of a message
+
+Job = Tuple[int, List[str]]  # index, arguments
+Emitter = Callable[[int, Response], None]
+
+
+def frame(data: bytes) -> bytes:
+    return b'%d:%s,' % (len(data), data)
+
+
+def check_length(digits: bytes) -> int:
+    if not digits.isdigit() or len(digits) > MAX_LENGTH_DIGITS:
+        raise errors.InvalidRequest('bad message length')
+    return int(digits)
+
+
+def read_frame(stream: BinaryIO) -> bytes:
+    """Read message from blocking `stream`; raise EOFError at its end."""
+    digits = b''
+    while (byte := stream.read(1)) != b':':
+        if not byte:
+            raise EOFError('connection closed')
+        digits += byte
+        if len(digits) > MAX_LENGTH_DIGITS:
+            break
+    length = check_length(digits)
+    data = stream.read(length + 1)
+    if len(data) != length + 1 or data[-1:] != b',':
+        raise errors.InvalidRequest('bad message end')
+    return data[:-1]
+
+
+async def read_message(reader: asyncio.StreamReader) -> bytes:
+    length = check_length((await reader.readuntil(b':'))[:-1])
+    data = await reader.readexactly(length + 1)
+    if data[-1:] != b',':
+        raise errors.InvalidRequest('bad message end')
+    return data[:-1]
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(':')
+    if not port.isdigit():
+        raise errors.InvalidOption(f'bad address {address}')
+    return host or '127.0.0.1', int(port)
+
+
+def write_response(index: int, response: Response) -> None:
+    stdout, stderr, _ = response
+    sys.stdout.write(stdout)
+    sys.stdout.flush()
+    sys.stderr.write(stderr)
+
+
+class Coordinator:
+    """Send jobs running `source` to workers; emit results in order.
+
+    `jobs` yields the arguments of each job, and is read as workers
+    need more jobs. `emit` is called with the index and response of
+    each job, in order; by default, the output is written.
+    """
+
+    def __init__(self, source: str, jobs: Iterable[List[str]],
+                 emit: Emitter = write_response,
+                 max_attempts: int = MAX_ATTEMPTS):
+        script = Script.parse(source)
+        if script.error is not None:
+            raise script.error
+        self.program = frame(binast.dumps(script.forms))
+        self.jobs = iter(jobs)
+        self.emit = emit
+        self.max_attempts = max_attempts
+        self.retries: Deque[Job] = collections.deque()
+        self.attempts: Dict[int, int] = collections.Counter()
+        self.submitted = self.completed = self.emitted = 0
+        self.exhausted = False
+        self.results: Dict[int, Response] = {}
+        self.status = 0
+        self.done = asyncio.Event()
+        self.wakeup = asyncio.Event()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.supervisors: List['asyncio.Task[None]'] = []
+        self.supervising = 0  # worker processes, running or restarting
+
+    async def start(self, host: str = '127.0.0.1',
+                    port: int = 0) -> Tuple[str, int]:
+        """Listen for workers; return the address."""
+        self.server = await asyncio.start_server(self.handle, host, port)
+        address = self.server.sockets[0].getsockname()
+        self.check_done()  # in case there are no jobs
+        return address[0], address[1]
+
+    def start_workers(self, count: int, address: Tuple[str, int]) -> None:
+        """Run `count` worker processes on this machine."""
+        restarts = [count * self.max_attempts]  # shared by all
+        self.supervising += count
+        self.supervisors += [
+            asyncio.create_task(self.supervise(address, restarts))
+            for _ in range(count)]
+
+    async def wait(self) -> int:
+        """Wait for all results; return the highest exit status."""
+        await self.done.wait()
+        await asyncio.gather(*self.supervisors)  # workers told to exit
+        assert self.server is not None
+        self.server.close()
+        return self.status
+
+    async def run(self, workers: int, host: str = '127.0.0.1',
+                  port: int = 0) -> int:
+        """Run all jobs with `workers` local processes, or remote ones."""
+        address = await self.start(host, port)
+        if workers:
+            self.start_workers(workers, address)
+        else:
+            print(f'Waiting for workers on {address[0]}:{address[1]}',
+                  file=sys.stderr)
+        return await self.wait()
+
+    async def supervise(self, address: Tuple[str, int],
+                        restarts: List[int]) -> None:
+        script = os.path.join(os.path.dirname(__file__), 'subpascal.py')
+        while not self.done.is_set():
+            worker = await asyncio.create_subprocess_exec(
+                sys.executable, script, *worker_options(),
+                '--batch-worker', f'{address[0]}:{address[1]}')
+            await worker.wait()
+            if self.done.is_set():
+                break
+            restarts[0] -= 1
+            if restarts[0] < 0:
+                break
+        self.supervising -= 1
+        if not self.supervising and not self.done.is_set():
+            self.fail_all('worker restarted too many times')
+
+    def take_job(self) -> Optional[Job]:
+        if self.retries:
+            return self.retries.popleft()
+        if self.exhausted:
+            return None
+        args = next(self.jobs, None)
+        if args is None:
+            self.exhausted = True
+            self.check_done()
+            return None
+        self.submitted += 1
+        return self.submitted - 1, args
+
+    def retry(self, job: Job) -> None:
+        index = job[0]
+        self.attempts[index] += 1
+        if self.attempts[index] < self.max_attempts:
+            self.retries.append(job)
+            self.notify()
+        else:
+            self.fail(index, f'after {self.max_attempts} attempts')
+
+    def fail(self, index: int, reason: str) -> None:
+        self.complete(index, ('', f'*** {errors.WorkerDied(reason)}\n', 1))
+
+    def fail_all(self, reason: str) -> None:
+        """Give up jobs not done, when no worker is left to run them."""
+        while (job := self.take_job()) is not None:
+            self.fail(job[0], reason)
+        for index in range(self.emitted, self.submitted):
+            if index not in self.results:
+                self.fail(index, reason)
+
+    def complete(self, index: int, response: Response) -> None:
+        if index in self.results or index < self.emitted:
+            return  # a worker thought dead answered after all
+        self.results[index] = response
+        self.completed += 1
+        while self.emitted in self.results:
+            response = self.results.pop(self.emitted)
+            self.status = max(self.status, response[2])
+            self.emit(self.emitted, response)
+            self.emitted += 1
+        self.check_done()
+
+    def check_done(self) -> None:
+        if self.exhausted and self.completed == self.submitted:
+            self.done.set()
+            self.notify()
+
+    def notify(self) -> None:
+        """Wake up connections waiting for jobs."""
+        self.wakeup.set()
+        self.wakeup = asyncio.Event()
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """Send jobs to a worker; requeue those in flight if it dies."""
+        in_flight: Dict[int, Job] = {}
+        try:
+            writer.write(self.program)
+            while not self.done.is_set():
+                while len(in_flight) < WINDOW:
+                    job = self.take_job()
+                    if job is None:
+                        break
+                    in_flight[job[0]] = job
+                    writer.write(frame(encode([str(job[0]), *job[1]])))
+                await writer.drain()
+                if not in_flight:
+                    if not self.done.is_set():
+                        await self.wakeup.wait()
+                    continue
+                fields = decode(await read_message(reader))
+                if len(fields) != 4 or not fields[3].isdigit():
+                    raise errors.InvalidRequest('bad result')
+                index, stdout, stderr, status = fields
+                if int(index) in in_flight:
+                    del in_flight[int(index)]
+                    self.complete(int(index), (stdout, stderr, int(status)))
+            writer.write(frame(b''))
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError,
+                errors.InvalidRequest, ValueError):
+            for job in in_flight.values():
+                self.retry(job)
+        finally:
+            writer.close()
+
+
+def worker_options() -> List[str]:
+    """Options of `subpascal.py` to run workers like this process."""
+    options = ['--tier-threshold', str(evaluator.tier_threshold)]
+    if not NATIVE_OPS:
+        options.append('--no-native')
+    if evaluator.specializer is not None:
+        options.append('--specialize')
+    return options
+
+
+def work(address: str) -> None:
+    """Run jobs sent by the coordinator at `address` until told to exit."""
+    host, port = parse_address(address)
+    with socket.create_connection((host, port)) as sock, \
+            sock.makefile('rb') as stream:
+        script = Script(binast.loads(read_frame(stream)))
+        evaluator.freeze_program()
+        while message := read_frame(stream):
+            index, *args = decode(message)
+            stdout, stderr, status = run_parsed(script, args)
+            sock.sendall(frame(encode([index, stdout, stderr, str(status)])))
+
+
+def read_jobs(lines: Iterable[str]) -> Iterator[List[str]]:
+    """Yield the arguments of each non-blank line, like `a:18 b:45`."""
+    for line in lines:
+        if line.strip():
+            yield line.split()
+
+
+def main(path: str, jobs_path: str, workers: Optional[int] = None,
+         address: str = '127.0.0.1:0') -> int:
+    """Run script at `path` for each job in `jobs_path`, or stdin if `-`.
+
+    Start `workers` processes, one per CPU by default; if 0, wait for
+    workers started elsewhere to connect to `address`.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    with open(path) as source_file:
+        source = source_file.read()
+    host, port = parse_address(address)
+    jobs_file = sys.stdin if jobs_path == '-' else open(jobs_path)
+    with jobs_file:
+        async def run() -> int:
+            coordinator = Coordinator(source, read_jobs(jobs_file))
+            return await coordinator.run(workers, host, port)
+        return asyncio.run(run())
@@ -0,0 +1,148 @@
+import asyncio
+import io
+import math
+
+from pytest import mark, raises
+
+import batch
+from batch import Coordinator
+from specializer import Specializer
+import errors
+import evaluator
+
+GCD = """
+(define mod (m n) (- m (* n (/ m n))))
+(define gcd (m n) (if (= n 0) m (gcd n (mod m n))))
+(print (gcd a b))
+"""
+
+
+def gcd_jobs(count):
+    return [[f'a:{n}', f'b:{n * 7 % 40 + 1}'] for n in range(1, count + 1)]
+
+
+def gcd_response(args):
+    a, b = (int(arg.split(':')[1]) for arg in args)
+    return f'{math.gcd(a, b)}\n', '', 0
+
+
+async def dying_worker(address):
+    """Connect, take a job, and die without answering."""
+    reader, writer = await asyncio.open_connection(*address)
+    await batch.read_message(reader)  # the program
+    await batch.read_message(reader)  # a job
+    writer.close()
+    await writer.wait_closed()
+
+
+@mark.parametrize("data", [b'', b'(print 1)', bytes(range(256))])
+def test_frame_read_frame(data):
+    stream = io.BytesIO(batch.frame(data) + batch.frame(b'next'))
+    assert data == batch.read_frame(stream)
+    assert b'next' == batch.read_frame(stream)
+    with raises(EOFError):
+        batch.read_frame(stream)
+
+
+@mark.parametrize("message", [b'3:ab,', b'x:ab,', b'2:abc', b'9' * 20])
+def test_read_frame_invalid(message):
+    with raises((errors.InvalidRequest, EOFError)):
+        batch.read_frame(io.BytesIO(message))
+
+
+def test_read_jobs():
+    lines = ['a:1 b:2\n', '\n', '  a:3\n', '\n']
+    assert [['a:1', 'b:2'], ['a:3']] == list(batch.read_jobs(lines))
+
+
+def test_worker_options(monkeypatch):
+    monkeypatch.setattr(evaluator, 'tier_threshold', 50)
+    assert ['--tier-threshold', '50'] == batch.worker_options()
+    monkeypatch.setattr(evaluator, 'tier_threshold', 0)
+    monkeypatch.setattr(evaluator, 'specializer', Specializer())
+    monkeypatch.setattr(evaluator, 'NATIVE_OPS', {})
+    monkeypatch.setattr(batch, 'NATIVE_OPS', {})
+    assert (['--tier-threshold', '0', '--no-native', '--specialize']
+            == batch.worker_options())
+
+
+def test_script_with_syntax_error():
+    with raises(errors.UnexpectedEndOfSource):
+        Coordinator('(print 1) (print', [])
+
+
+def test_no_jobs():
+    async def main():
+        return await Coordinator(GCD, []).run(workers=2)
+    assert 0 == asyncio.run(main())
+
+
+def test_worker_processes():
+    jobs = gcd_jobs(30)
+    results = []
+
+    async def main():
+        coordinator = Coordinator(GCD, jobs, lambda *r: results.append(r))
+        return await coordinator.run(workers=3)
+
+    assert 0 == asyncio.run(main())
+    assert list(enumerate(map(gcd_response, jobs))) == results
+
+
+def test_jobs_of_dead_worker_are_retried():
+    jobs = gcd_jobs(5)
+    results = []
+
+    async def main():
+        coordinator = Coordinator(GCD, jobs, lambda *r: results.append(r))
+        address = await coordinator.start()
+        await dying_worker(address)
+        worker = asyncio.to_thread(batch.work, f'{address[0]}:{address[1]}')
+        status, _ = await asyncio.gather(coordinator.wait(), worker)
+        return status, coordinator.attempts
+
+    status, attempts = asyncio.run(main())
+    assert 0 == status
+    assert {0: 1, 1: 1} == attempts
+    assert list(enumerate(map(gcd_response, jobs))) == results
+
+
+def test_jobs_reuse_functions_of_previous_jobs(monkeypatch):
+    monkeypatch.setattr(evaluator, 'tier_threshold', 10)
+    source = """
+    (define f (n) (abs n))
+    (define g () (f (- 0 k)))
+    (let k a)
+    (print (g))
+    (define abs (n) 42)
+    (for i 1 20 (f i))
+    (print (g))
+    """
+    results = []
+
+    async def main():
+        coordinator = Coordinator(source, [['a:5'], ['a:6'], ['a:7']],
+                                  lambda *r: results.append(r))
+        address = await coordinator.start()
+        worker = asyncio.to_thread(batch.work, f'{address[0]}:{address[1]}')
+        status, _ = await asyncio.gather(coordinator.wait(), worker)
+        return status
+
+    assert 0 == asyncio.run(main())
+    assert [(n, (f'{n + 5}\n42\n', '', 0)) for n in range(3)] == results
+
+
+def test_job_fails_after_max_attempts():
+    results = []
+
+    async def main():
+        coordinator = Coordinator(GCD, [['a:1', 'b:2']],
+                                  lambda *r: results.append(r))
+        address = await coordinator.start()
+        while not coordinator.done.is_set():
+            await dying_worker(address)
+        return await coordinator.wait()
+
+    assert 1 == asyncio.run(main())
+    message = "*** Worker died: 'after 3 attempts'.\n"
+    assert [(0, ('', message, 1))] == results
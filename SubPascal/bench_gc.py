@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""Measure garbage collector pauses running a script with a huge AST.
+
+The script defines many functions with large bodies, then runs a loop
+calling them. It runs twice, in fresh processes: with parsed forms
+frozen out of the cyclic GC (as by subpascal.py), and without.
+
+Usage: bench_gc.py [FUNCTIONS]
+"""
+
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+import evaluator
+import subpascal
+
+FUNCTIONS = 1000
+EXPS_PER_BODY = 2000  # each (+ x K) is one list
+ITERATIONS = 100_000
+
+
+def make_script(functions: int) -> str:
+    lines = []
+    for n in range(functions):
+        body = ' '.join(f'(+ x {k})' for k in range(EXPS_PER_BODY))
+        lines.append(f'(define f{n} (x) (begin {body}))')
+    lines.append('(define g (x) (+ x 1))')
+    lines.append(f'(let i 0) (while (< i {ITERATIONS}) (let i (g i)))')
+    return '\n'.join(lines) + '\n'
+
+
+class PauseTimer:
+    """Record duration of each collection of the oldest generation."""
+
+    def __init__(self) -> None:
+        self.pauses: List[float] = []
+        self.start = 0.0
+
+    def __call__(self, phase: str, info: dict) -> None:
+        if info['generation'] != 2:
+            return
+        if phase == 'start':
+            self.start = time.perf_counter()
+        else:
+            self.pauses.append(time.perf_counter() - self.start)
+
+
+def measure(path: str, freeze: bool) -> None:
+    evaluator.freeze_gc = freeze
+    timer = PauseTimer()
+    gc.callbacks.append(timer)
+    start = time.perf_counter()
+    subpascal.run(path)
+    total = time.perf_counter() - start
+    gc.callbacks.remove(timer)
+    pauses = timer.pauses or [0.0]
+    label = 'frozen' if freeze else 'not frozen'
+    print(f'{label:>10}: {total:6.2f}s total, '
+          f'{len(timer.pauses)} full collections, '
+          f'{sum(pauses):6.3f}s in them, longest {max(pauses) * 1000:.1f} ms')
+
+
+def main(args: List[str]) -> None:
+    if args and args[0] in ('--freeze', '--no-freeze'):
+        measure(args[1], args[0] == '--freeze')
+        return
+    functions = int(args[0]) if args else FUNCTIONS
+    print(f'{functions * EXPS_PER_BODY:,} lists in function bodies')
+    path: Optional[str] = None
+    try:
+        with tempfile.NamedTemporaryFile('w', suffix='.subpas',
+                                         delete=False) as script:
+            script.write(make_script(functions))
+            path = script.name
+        for flag in ('--no-freeze', '--freeze'):
+            subprocess.run([sys.executable, __file__, flag, path], check=True)
+    finally:
+        if path is not None:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
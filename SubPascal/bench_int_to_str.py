@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+"""Compare `str` and `output.int_to_str` on huge integers.
+
+`str` is timed only up to STR_MAX_DIGITS, since its time is quadratic.
+"""
+
+import math
+import sys
+import time
+from typing import Callable
+
+from output import int_to_str
+
+SIZES = [10_000, 100_000, 300_000, 1_000_000]  # digits, approximately
+STR_MAX_DIGITS = 300_000
+
+
+def timed(convert: Callable[[int], str], value: int) -> float:
+    start = time.perf_counter()
+    convert(value)
+    return time.perf_counter() - start
+
+
+def factorial_with_digits(digits: int) -> int:
+    """Return the smallest n! with at least `digits` digits."""
+    n, log = 1, 0.0
+    while log < digits - 1:
+        n += 1
+        log += math.log10(n)
+    return math.factorial(n)
+
+
+def main() -> None:
+    sys.set_int_max_str_digits(0)
+    print(f'{"digits":>10} {"str":>10} {"int_to_str":>10}')
+    for digits in SIZES:
+        value = factorial_with_digits(digits)
+        ours = timed(int_to_str, value)
+        if digits <= STR_MAX_DIGITS:
+            builtin = f'{timed(str, value):9.3f}s'
+        else:
+            builtin = '-'
+        print(f'{digits:>10,} {builtin:>10} {ours:9.3f}s')
+
+
+if __name__ == '__main__':
+    main()
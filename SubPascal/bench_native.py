@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+"""Compare native library functions with their SubPascal definitions."""
+
+import io
+import timeit
+
+import evaluator
+from subpascal import run
+
+PRELUDE = """
+(define mod (m n) (- m (* n (/ m n))))
+(define <> (x y) (if (= x y) 0 1))
+(define <= (x y) (if (> x y) 0 1))
+(define abs (x) (if (< x 0) (- 0 x) x))
+(define max (x y) (if (> x y) x y))
+(define gcd (m n) (if (= n 0) m (gcd n (mod m n))))
+"""
+
+BENCHMARKS = {
+    'gcd': '(let i 1) (while (<= i 2000) (begin (gcd i 360) (let i (+ i 1))))',
+    'mod': '(let i 1) (while (<= i 5000) (begin (mod i 7) (let i (+ i 1))))',
+    'abs': '(let i -2500) (while (<> i 2500) (begin (abs i) (let i (+ i 1))))',
+    'max': '(let i 1) (while (<= i 5000) (begin (max i 99) (let i (+ i 1))))',
+}
+
+
+def time_source(source: str, repeat: int = 5) -> float:
+    def run_once() -> None:
+        evaluator.function_env = {}
+        run(io.StringIO(source), {})
+    return min(timeit.repeat(run_once, number=1, repeat=repeat))
+
+
+def main() -> None:
+    print(f'{"benchmark":10} {"defined":>10} {"native":>10} {"speedup":>8}')
+    for name, source in BENCHMARKS.items():
+        defined = time_source(PRELUDE + source)
+        native = time_source(source)
+        print(f'{name:10} {defined:10.4f} {native:10.4f} '
+              f'{defined / native:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+"""Compare sequential parsing with `parse_parallel` on a large source."""
+
+import os
+import time
+
+from parallel_parse import parse_parallel
+from parser import parse_exp, tokenize
+
+COPIES = 20_000
+
+
+def parse_sequential(source: str) -> int:
+    tokens = tokenize(source)
+    count = 0
+    while tokens:
+        parse_exp(tokens)
+        count += 1
+    return count
+
+
+def main() -> None:
+    with open('examples/arrow-demo.subpas') as source_file:
+        source = source_file.read() * COPIES
+    print(f'{len(source):,} characters, {os.cpu_count()} CPUs')
+    start = time.perf_counter()
+    count = parse_sequential(source)
+    print(f'{"sequential":>12}: {time.perf_counter() - start:.3f}s')
+    workers = 2
+    while workers <= (os.cpu_count() or 1) * 2:
+        start = time.perf_counter()
+        assert count == sum(1 for _ in parse_parallel(source, workers))
+        print(f'{workers:>4} workers: {time.perf_counter() - start:.3f}s')
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""Compare iterative `parse_exp` with the recursive version it replaced."""
+
+import sys
+import time
+from typing import Callable, Deque, List
+
+from parser import Expression, parse_atom, parse_exp, tokenize
+import errors
+
+DEEP_NESTING = 1_000_000
+
+
+def parse_exp_recursive(tokens: Deque[str]) -> Expression:
+    head = tokens.popleft()
+    if head == '(':
+        ast = []
+        while tokens and tokens[0] != ')':
+            ast.append(parse_exp_recursive(tokens))
+        if not tokens:
+            raise errors.UnexpectedEndOfSource()
+        tokens.popleft()  # discard ')'
+        return ast
+    elif head == ')':
+        raise errors.UnexpectedCloseParen()
+    else:
+        return parse_atom(head)
+
+
+def parse_all(parse: Callable[[Deque[str]], Expression],
+              tokens: Deque[str]) -> List[Expression]:
+    forms = []
+    while tokens:
+        forms.append(parse(tokens))
+    return forms
+
+
+def timed(parse: Callable[[Deque[str]], Expression], source: str) -> str:
+    """Time parsing, but not tokenizing, of `source`."""
+    tokens = tokenize(source)
+    start = time.perf_counter()
+    try:
+        parse_all(parse, tokens)
+    except RecursionError:
+        return 'RecursionError'
+    return f'{time.perf_counter() - start:.3f}s'
+
+
+def main() -> None:
+    with open('examples/arrow-demo.subpas') as source_file:
+        shallow = source_file.read() * 2000
+    deep = '(begin ' * DEEP_NESTING + '1' + ')' * DEEP_NESTING
+    print(f'{"input":28} {"recursive":>15} {"iterative":>15}')
+    for name, source in [(f'shallow ({len(shallow):,} chars)', shallow),
+                         (f'nested {DEEP_NESTING:,} deep', deep)]:
+        print(f'{name:28} {timed(parse_exp_recursive, source):>15} '
+              f'{timed(parse_exp, source):>15}')
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10_000)
+    main()
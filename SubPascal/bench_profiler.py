@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+"""Measure the overhead of `SamplingProfiler` on a recursive workload."""
+
+import time
+
+from evaluator import evaluate
+from parser import parse_exp, tokenize
+from profiler import SamplingProfiler
+from repl import eval_source
+import evaluator
+
+FIB = '(define fib (n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))'
+CALL = '(fib 20)'
+ROUNDS = 30
+
+
+def timed() -> float:
+    start = time.perf_counter()
+    evaluate({}, parse_exp(tokenize(CALL)))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    evaluator.tier_threshold = 0  # profile the interpreter, not closures
+    eval_source(FIB)
+    plain, profiled = [], []
+    sampler = SamplingProfiler()
+    for _ in range(ROUNDS):  # alternate, so both see the same conditions
+        plain.append(timed())
+        with sampler:
+            profiled.append(timed())
+    samples = sum(sampler.samples.values())
+    overhead = (min(profiled) / min(plain) - 1) * 100
+    print(f'without profiler: {min(plain):.3f}s')
+    print(f'with profiler:    {min(profiled):.3f}s ({overhead:+.1f}%)')
+    print(f'sample rate:      {samples / sum(profiled):.0f} Hz')
+    share = sampler.sampling_time / sum(profiled) * 100
+    print(f'time sampling:    {share:.1f}% of profiled time')
+
+
+if __name__ == '__main__':
+    main()
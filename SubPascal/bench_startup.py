@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+"""Measure how long subpascal.py takes to start and run a trivial script.
+
+Each run is a fresh process, as when subpascal.py is called from a
+shell loop. Bytecode is cached under a temporary directory, so compiling
+the sources is not measured.
+"""
+
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+HERE = pathlib.Path(__file__).parent
+COMMAND = [sys.executable, str(HERE / 'subpascal.py'),
+           str(HERE / 'examples' / 'gcd-a-b.subpas'), 'a:18', 'b:45']
+ROUNDS = 20
+
+
+def import_times(env: Dict[str, str]) -> List[Tuple[int, str]]:
+    """Return (cumulative microseconds, module) of imports, slowest first."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import subpascal'],
+        cwd=HERE, env=env, capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line.split('|')
+        times.append((int(cumulative), module.strip()))
+    return sorted(times, reverse=True)
+
+
+def main() -> None:
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=tempfile.mkdtemp())
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    subprocess.run(COMMAND, env=env, stdout=subprocess.DEVNULL, check=True)
+    print('slowest imports (cumulative):')
+    for micros, module in import_times(env)[:10]:
+        print(f'{micros / 1000:8.1f} ms {module}')
+    baseline, total = [], []
+    for _ in range(ROUNDS):  # alternate, so both see the same conditions
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], env=env, check=True)
+        baseline.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        subprocess.run(COMMAND, env=env, stdout=subprocess.DEVNULL,
+                       check=True)
+        total.append(time.perf_counter() - start)
+    print(f'python -c pass: {min(baseline) * 1000:6.1f} ms')
+    print(f'subpascal.py:   {min(total) * 1000:6.1f} ms '
+          f'(+{(min(total) - min(baseline)) * 1000:.1f} ms)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""Compare time and peak memory of `tokenize` and `tokenize_file`."""
+
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+from parser import parse_exp, tokenize, tokenize_file
+
+COPIES = 5000
+
+
+def parse_text(path: str) -> None:
+    with open(path) as source_file:
+        tokens = tokenize(source_file.read())
+    while tokens:
+        parse_exp(tokens)
+
+
+def parse_mapped(path: str) -> None:
+    with tokenize_file(path) as tokens:
+        while tokens:
+            parse_exp(tokens)
+
+
+def measure(parse: Callable[[str], None], path: str) -> str:
+    tracemalloc.start()
+    start = time.perf_counter()
+    parse(path)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return f'{elapsed:8.3f}s {peak / 2**20:10.1f} MiB'
+
+
+def main() -> None:
+    with open('examples/arrow-demo.subpas') as source_file:
+        source = source_file.read() * COPIES
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'big.subpas')
+        with open(path, 'w') as out_file:
+            out_file.write(source)
+        print(f'{len(source):,} bytes')
+        print(f'{"tokenize":>14}: {measure(parse_text, path)}')
+        print(f'{"tokenize_file":>14}: {measure(parse_mapped, path)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""Compact binary format for parsed programs.
+
+Layout, where every number is an unsigned LEB128 varint:
+
+    MAGIC VERSION
+    symbol count, then (UTF-8 byte length, UTF-8 bytes) for each symbol
+    form count, then each form in prefix order
+
+Each node of a form starts with a varint holding `payload << 2 | tag`:
+
+    INT     payload is the zigzag-encoded integer
+    SYMBOL  payload is the index in the symbol table
+    LIST    payload is the number of items, which follow
+    BIGINT  payload is the length of the little-endian two's complement
+            bytes that follow; used for integers beyond 63 bits
+"""
+
+import mmap
+from typing import Dict, Iterator, List, Tuple, Union
+
+from parser import Expression
+import errors
+
+MAGIC = b'SPAST'
+VERSION = 1
+
+INT, SYMBOL, LIST, BIGINT = range(4)
+BIGINT_BITS = 63
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+def write_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def read_varint(view: memoryview, pos: int) -> Tuple[int, int]:
+    """Return value of varint at `pos`, and the position after it."""
+    result = shift = 0
+    while True:
+        byte = view[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def write_int(out: bytearray, n: int) -> None:
+    if n.bit_length() <= BIGINT_BITS:
+        zigzag = n * 2 if n >= 0 else -n * 2 - 1
+        write_varint(out, zigzag << 2 | INT)
+    else:
+        data = n.to_bytes(n.bit_length() // 8 + 1, 'little', signed=True)
+        write_varint(out, len(data) << 2 | BIGINT)
+        out += data
+
+
+def dumps(forms: List[Expression]) -> bytes:
+    symbols: Dict[str, int] = {}
+    tree = bytearray()
+    write_varint(tree, len(forms))
+    pending = list(reversed(forms))
+    while pending:
+        exp = pending.pop()
+        if isinstance(exp, list):
+            write_varint(tree, len(exp) << 2 | LIST)
+            pending.extend(reversed(exp))
+        elif isinstance(exp, str):
+            index = symbols.setdefault(exp, len(symbols))
+            write_varint(tree, index << 2 | SYMBOL)
+        elif isinstance(exp, int) and not isinstance(exp, bool):
+            write_int(tree, exp)
+        else:
+            raise TypeError(f'cannot encode {exp!r}')
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    write_varint(out, len(symbols))
+    for symbol in symbols:  # dicts keep insertion order, same as indexes
+        data = symbol.encode('utf-8')
+        write_varint(out, len(data))
+        out += data
+    return bytes(out + tree)
+
+
+class SymbolTable:
+    """Symbols decoded on demand from slices of the buffer."""
+
+    def __init__(self, view: memoryview, pos: int):
+        count, pos = read_varint(view, pos)
+        self.view = view
+        self.spans: List[Tuple[int, int]] = []
+        for _ in range(count):
+            size, pos = read_varint(view, pos)
+            self.spans.append((pos, pos + size))
+            pos += size
+        self.end = pos
+        self.decoded: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def __getitem__(self, index: int) -> str:
+        try:
+            return self.decoded[index]
+        except KeyError:
+            start, end = self.spans[index]
+            symbol = str(self.view[start:end], 'utf-8')
+            self.decoded[index] = symbol
+            return symbol
+
+
+class BinaryAST:
+    """Read forms from a buffer in the binary AST format.
+
+    The buffer is not copied, so it may be an `mmap`. Use as a context
+    manager, or call `release`, to let go of the buffer.
+    """
+
+    def __init__(self, buffer: Buffer):
+        self.view = memoryview(buffer)
+        header = MAGIC + bytes([VERSION])
+        if self.view[:len(header)] != header:
+            self.view.release()
+            raise errors.InvalidBinaryAST('bad header or version')
+        try:
+            self.symbols = SymbolTable(self.view, len(header))
+            self.count, self.start = read_varint(self.view, self.symbols.end)
+        except IndexError as exc:
+            self.view.release()
+            raise errors.InvalidBinaryAST('truncated data') from exc
+
+    def __enter__(self) -> 'BinaryAST':
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.release()
+
+    def release(self) -> None:
+        self.view.release()
+
+    def forms(self) -> Iterator[Expression]:
+        pos = self.start
+        for _ in range(self.count):
+            try:
+                exp, pos = self.read_exp(pos)
+            except IndexError as exc:
+                raise errors.InvalidBinaryAST('truncated data') from exc
+            yield exp
+
+    def read_exp(self, pos: int) -> Tuple[Expression, int]:
+        view = self.view
+        stack: List[Tuple[List[Expression], int]] = []  # list, its length
+        while True:
+            head = view[pos]
+            if head < 0x80:  # fast path for one-byte varints
+                pos += 1
+            else:
+                head, pos = read_varint(view, pos)
+            tag, payload = head & 3, head >> 2
+            exp: Expression
+            if tag == LIST:
+                if payload:
+                    stack.append(([], payload))
+                    continue
+                exp = []
+            elif tag == SYMBOL:
+                exp = self.symbols[payload]
+            elif tag == INT:
+                exp = payload >> 1 if payload & 1 == 0 else -(payload >> 1) - 1
+            else:
+                end = pos + payload
+                if end > len(view):
+                    raise IndexError(end)
+                exp = int.from_bytes(view[pos:end], 'little', signed=True)
+                pos = end
+            while True:  # add `exp` to its parent, and completed parents
+                if not stack:
+                    return exp, pos
+                parent, length = stack[-1]
+                parent.append(exp)
+                if len(parent) < length:
+                    break
+                stack.pop()
+                exp = parent
+
+
+def loads(buffer: Buffer) -> List[Expression]:
+    with BinaryAST(buffer) as ast:
+        return list(ast.forms())
+
+
+def dump_file(forms: List[Expression], path: str) -> None:
+    with open(path, 'wb') as out_file:
+        out_file.write(dumps(forms))
+
+
+def load_file(path: str) -> List[Expression]:
+    with open(path, 'rb') as in_file:
+        with mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return loads(data)
@@ -0,0 +1,83 @@
+import glob
+
+from pytest import mark, raises
+
+from binast import BinaryAST, dumps, loads, dump_file, load_file
+from parser import parse_exp, tokenize
+import errors
+
+
+def parse_all(source):
+    tokens = tokenize(source)
+    forms = []
+    while tokens:
+        forms.append(parse_exp(tokens))
+    return forms
+
+
+@mark.parametrize("forms", [
+    [],
+    [7],
+    ['x', -1, 0],
+    [[]],
+    [['+', 1, ['*', 'x', -300]], ['print', 'x']],
+    [[2 ** 63 - 1, 2 ** 63, -2 ** 63, -2 ** 63 - 1, 3 ** 1000, -3 ** 1000]],
+    [['λ', 'ação', '<>']],
+])
+def test_round_trip(forms):
+    assert forms == loads(dumps(forms))
+
+
+@mark.parametrize("path", sorted(glob.glob('examples/*.subpas')))
+def test_round_trip_examples(path):
+    with open(path) as source_file:
+        source = source_file.read()
+    forms = parse_all(source)
+    data = dumps(forms)
+    assert forms == loads(data)
+    assert len(data) < len(source) * 0.7
+
+
+def test_round_trip_deeply_nested():
+    depth = 100_000
+    forms = parse_all('(+ 1 ' * depth + '0' + ')' * depth)
+    data = dumps(forms)
+    # comparing the lists with == would recurse too deep
+    assert data == dumps(loads(data))
+
+
+def test_symbols_are_shared():
+    [exp] = loads(dumps([['x', 'x', 'x']]))
+    assert exp[0] is exp[1] is exp[2]
+
+
+def test_symbol_table():
+    data = dumps([['define', 'f', ['n'], ['f', 'n']]])
+    with BinaryAST(data) as ast:
+        assert 3 == len(ast.symbols)
+        assert 'n' == ast.symbols[2]
+        assert {2: 'n'} == ast.symbols.decoded
+
+
+def test_load_file(tmp_path):
+    forms = parse_all('(define sq (n) (* n n)) (print (sq 12))')
+    path = str(tmp_path / 'sq.spast')
+    dump_file(forms, path)
+    assert forms == load_file(path)
+
+
+def test_cannot_encode_bool():
+    with raises(TypeError):
+        dumps([True])
+
+
+@mark.parametrize("data, message", [
+    (b'(print 1)', 'bad header or version'),
+    (b'SPAST\x02\x00\x00', 'bad header or version'),
+    (b'SPAST\x01\x05', 'truncated data'),
+    (dumps([['+', 1, 2]])[:-1], 'truncated data'),
+])
+def test_invalid_data(data, message):
+    with raises(errors.InvalidBinaryAST) as excinfo:
+        loads(data)
+    assert f"Invalid binary AST: '{message}'." == str(excinfo.value)
@@ -0,0 +1,200 @@
+"""Checkpoints of long runs, to resume them after the process ends.
+
+The evaluator recurses in Python, so its stack cannot be saved. Instead,
+checkpoints are taken at safe points where the only pending evaluation
+is the top-level form: before each top-level form, and after each
+iteration of a top-level `while`. There, the execution state is the
+global variables, the functions, the variables given in the command
+line, and the index of the form to run, which is a `while` being
+resumed at its condition. The state is encoded like a snapshot.
+
+Taking a checkpoint flushes the output and encodes the state with
+`marshal`; a background thread writes it to a temporary file, then
+renames it, so a crash while writing keeps the previous checkpoint.
+Output printed after the last checkpoint is printed again on resume.
+"""
+
+import hashlib
+import os
+import signal
+import sys
+import threading
+from types import FrameType
+from typing import Iterator, Optional, Tuple
+
+import evaluator
+from evaluator import define_function, ValueEnv
+from parser import Expression, is_define, tokenize_file
+from subpascal import read_forms
+import errors
+import snapshot
+
+MAGIC = b'SubPascal checkpoint\n'
+
+
+def source_digest(path: str) -> str:
+    with open(path, 'rb') as source_file:
+        return hashlib.sha256(source_file.read()).hexdigest()
+
+
+def write_file(path: str, data: bytes) -> None:
+    """Replace file at `path` with one holding `data`, atomically."""
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as temp_file:
+        temp_file.write(data)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    os.replace(temp_path, path)
+
+
+def is_while(exp: Expression) -> bool:
+    return isinstance(exp, list) and len(exp) == 3 and exp[0] == 'while'
+
+
+class Checkpointer:
+    """Run script at `source_path`, writing checkpoints to `path`.
+
+    A checkpoint is taken every `every` safe points, if not zero, and
+    at the next safe point after signal SIGUSR1. After SIGTERM, the run
+    stops at the next safe point, once its checkpoint is written.
+    """
+
+    def __init__(self, path: str, source_path: str, env: ValueEnv,
+                 every: int = 0):
+        self.path = path
+        self.source_path = source_path
+        self.digest = source_digest(source_path)
+        self.env = env
+        self.every = every
+        self.countdown = every or -1  # never reaches 0 if `every` is 0
+        self.requested = False
+        self.stopping = False
+        self.lock = threading.Lock()
+        self.pending: Optional[bytes] = None
+        self.writer: Optional[threading.Thread] = None
+
+    @classmethod
+    def resume(cls, path: str,
+               every: Optional[int] = None) -> Tuple['Checkpointer', int]:
+        """Restore state saved at `path`; return checkpointer and index.
+
+        Checkpoints continue to be written to `path`, every `every`
+        safe points, or as often as in the run resumed.
+        """
+        with open(path, 'rb') as checkpoint_file:
+            state = snapshot.decode(checkpoint_file.read(), MAGIC,
+                                    'checkpoint')
+        try:
+            (global_env, functions, env, source_path, digest,
+             index, saved_every) = state
+        except (TypeError, ValueError) as exc:
+            raise errors.InvalidSnapshot('corrupted data') from exc
+        checkpointer = cls(path, source_path, env,
+                           saved_every if every is None else every)
+        if checkpointer.digest != digest:
+            raise errors.InvalidSnapshot(f'{source_path} changed')
+        snapshot.restore(global_env, functions)
+        return checkpointer, index
+
+    def handle_signal(self, signum: int, frame: Optional[FrameType]) -> None:
+        self.requested = True
+        if signum == signal.SIGTERM:
+            self.stopping = True
+
+    def safe_point(self, index: int) -> None:
+        """Take a checkpoint if due; `index` is of the form to run next."""
+        self.countdown -= 1
+        if self.countdown == 0 or self.requested:
+            self.save(index)
+
+    def save(self, index: int) -> None:
+        self.countdown = self.every or -1
+        self.requested = False
+        evaluator.output.flush()
+        state = (evaluator.global_env, snapshot.function_table(), self.env,
+                 self.source_path, self.digest, index, self.every)
+        data = snapshot.encode(state, MAGIC)
+        with self.lock:
+            self.pending = data
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.write_pending)
+                self.writer.start()
+        if self.stopping:
+            self.close()
+            print(f'*** Stopped: resume with --resume {self.path}',
+                  file=sys.stderr)
+            raise SystemExit(128 + signal.SIGTERM)
+
+    def write_pending(self) -> None:
+        """Write checkpoints until none is pending; skip stale ones."""
+        while True:
+            with self.lock:
+                data, self.pending = self.pending, None
+                if data is None:
+                    self.writer = None
+                    return
+            write_file(self.path, data)
+
+    def close(self) -> None:
+        """Wait for checkpoints being written."""
+        with self.lock:
+            writer = self.writer
+        if writer is not None:
+            writer.join()
+
+    def run(self, start: int = 0) -> None:
+        """Run the script from form `start`; take a checkpoint at the end."""
+        handlers = {signum: signal.signal(signum, self.handle_signal)
+                    for signum in (signal.SIGUSR1, signal.SIGTERM)}
+        try:
+            with tokenize_file(self.source_path) as tokens:
+                index = self.execute(read_forms(tokens), start)
+            self.save(index)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            self.close()
+
+    def execute(self, forms: Iterator[Expression], start: int) -> int:
+        """Like `subpascal.execute`; return the index after the last form."""
+        done = start
+        loading = True  # like `subpascal.execute`
+        evaluator.pause_gc()
+        try:
+            for index, current_exp in enumerate(forms):
+                if index < start:
+                    continue  # run before the checkpoint
+                self.safe_point(index)
+                done = index + 1
+                if is_define(current_exp):
+                    define_function(*current_exp[1:])
+                    continue
+                if loading:
+                    evaluator.freeze_program()
+                    loading = False
+                try:
+                    if is_while(current_exp):
+                        self.run_while(current_exp, index)
+                    else:
+                        evaluator.evaluate_form(self.env, current_exp)
+                except errors.EvaluatorException as exc:
+                    print('***', exc, file=sys.stderr)
+        except errors.UnexpectedCloseParen as exc:
+            print('***', exc, file=sys.stderr)
+        finally:
+            if loading:
+                evaluator.freeze_program()
+        return done
+
+    def run_while(self, exp: Expression, index: int) -> None:
+        """Like the `while` special form, with a safe point per iteration."""
+        assert isinstance(exp, list)
+        _, condition, block = exp
+        env = self.env
+        evaluate = evaluator.evaluate
+        while evaluate(env, condition):
+            evaluate(env, block)
+            evaluator.back_edges += 1
+            self.countdown -= 1  # inlined `safe_point`
+            if self.countdown == 0 or self.requested:
+                self.save(index)
@@ -0,0 +1,107 @@
+import os
+import signal
+
+from pytest import fixture, raises
+
+import evaluator
+from checkpoint import Checkpointer
+import errors
+
+COUNTING = """
+(define square (n) (* n n))
+(let i 0)
+(let total 0)
+(while (< i 10)
+    (begin
+        (let total (+ total (square i)))
+        (if (= i start) (stop) 0)
+        (print i)
+        (let i (+ i 1))))
+(print total)
+"""
+
+
+@fixture
+def session():
+    # backup global_env, function_env and the built-in operators
+    saved = (evaluator.global_env, evaluator.function_env,
+             dict(evaluator.VALUE_OPS))
+    evaluator.global_env = {}
+    evaluator.function_env = {}
+    yield
+    # restore them
+    evaluator.global_env, evaluator.function_env = saved[:2]
+    evaluator.VALUE_OPS.clear()
+    evaluator.VALUE_OPS.update(saved[2])
+
+
+@fixture
+def script(tmp_path, session):
+    path = tmp_path / 'counting.subpas'
+    path.write_text(COUNTING)
+    evaluator.register_builtin(
+        'stop', lambda: os.kill(os.getpid(), signal.SIGTERM) or 0, 0)
+    return str(path)
+
+
+def test_run_without_stopping(script, tmp_path, capsys):
+    Checkpointer(str(tmp_path / 'c.ckpt'), script, {'start': -1}).run()
+    assert '0\n1\n2\n3\n4\n5\n6\n7\n8\n9\n285\n' == capsys.readouterr().out
+
+
+def test_stop_and_resume(script, tmp_path, capsys):
+    path = str(tmp_path / 'c.ckpt')
+    with raises(SystemExit) as excinfo:
+        Checkpointer(path, script, {'start': 4}).run()
+    assert 128 + signal.SIGTERM == excinfo.value.code
+    captured = capsys.readouterr()
+    assert '0\n1\n2\n3\n4\n' == captured.out
+    assert f'*** Stopped: resume with --resume {path}\n' == captured.err
+    evaluator.global_env = {}
+    evaluator.function_env = {}
+    checkpointer, index = Checkpointer.resume(path)
+    assert 3 == index  # the `while`
+    assert {'i': 5, 'total': 30} == evaluator.global_env
+    assert ['square'] == list(evaluator.function_env)
+    checkpointer.run(index)
+    assert '5\n6\n7\n8\n9\n285\n' == capsys.readouterr().out
+
+
+def test_resume_finished_run(script, tmp_path, capsys):
+    path = str(tmp_path / 'c.ckpt')
+    Checkpointer(path, script, {'start': -1}, every=3).run()
+    capsys.readouterr()
+    checkpointer, index = Checkpointer.resume(path)
+    assert 5 == index  # after the last form
+    assert 3 == checkpointer.every
+    checkpointer.run(index)
+    assert '' == capsys.readouterr().out
+
+
+def test_checkpoint_every(script, tmp_path, monkeypatch):
+    path = str(tmp_path / 'c.ckpt')
+    checkpointer = Checkpointer(path, script, {'start': -1}, every=5)
+    indexes = []
+    save = checkpointer.save
+    monkeypatch.setattr(checkpointer, 'save',
+                        lambda index: indexes.append(index) or save(index))
+    checkpointer.run()
+    # safe points: 4 forms, 10 iterations of the `while`, the last form
+    assert [3, 3, 4, 5] == indexes
+
+
+def test_resume_changed_source(script, tmp_path):
+    path = str(tmp_path / 'c.ckpt')
+    Checkpointer(path, script, {'start': -1}).run()
+    with open(script, 'a') as source_file:
+        source_file.write('(print 0)\n')
+    with raises(errors.InvalidSnapshot) as excinfo:
+        Checkpointer.resume(path)
+    assert 'changed' in str(excinfo.value)
+
+
+def test_resume_not_a_checkpoint(script):
+    with raises(errors.InvalidSnapshot) as excinfo:
+        Checkpointer.resume(script)
+    message = "Invalid or stale snapshot: 'not a checkpoint'."
+    assert message == str(excinfo.value)
@@ -0,0 +1,109 @@
+"""Thin client of daemon.py: run a script in the warm interpreter.
+
+This module is imported by `subpascal.py --client`, which is meant to
+be called many times from shell loops, so it avoids slow imports: the
+messages are netstrings instead of JSON, and the socket is the one from
+the built-in `_socket` module. See bench_startup.py.
+
+A request is the source of the script followed by its arguments; the
+response is the standard output, standard error and exit status. Each
+side shuts down writing after its message.
+"""
+
+from __future__ import annotations
+
+import _socket
+import os
+import sys
+
+import errors
+
+TYPE_CHECKING = False  # `typing` is imported only by type checkers
+if TYPE_CHECKING:
+    from typing import List, NoReturn, Tuple
+
+# a directory only the user can write: another user could put a socket
+# of their own in a shared one, like /tmp, and receive the scripts
+SOCKET_DIR = (os.environ.get('XDG_RUNTIME_DIR')
+              or f'/tmp/subpascal-{os.getuid()}')
+DEFAULT_SOCKET = (os.environ.get('SUBPASCAL_SOCKET')
+                  or os.path.join(SOCKET_DIR, 'subpascal.sock'))
+RECV_SIZE = 1 << 16
+
+
+def encode(fields: List[str]) -> bytes:
+    """Encode each field as a netstring: `<length>:<UTF-8 bytes>,`."""
+    parts = []
+    for field in fields:
+        data = field.encode()
+        parts.append(b'%d:%s,' % (len(data), data))
+    return b''.join(parts)
+
+
+def decode(message: bytes) -> List[str]:
+    fields = []
+    pos = 0
+    while pos < len(message):
+        colon = message.find(b':', pos)
+        if colon < 0 or not message[pos:colon].isdigit():
+            raise errors.InvalidRequest('bad netstring length')
+        end = colon + 1 + int(message[pos:colon])
+        if message[end:end + 1] != b',':
+            raise errors.InvalidRequest('bad netstring end')
+        try:
+            fields.append(message[colon + 1:end].decode())
+        except UnicodeDecodeError as exc:
+            raise errors.InvalidRequest('bad UTF-8') from exc
+        pos = end + 1
+    return fields
+
+
+def request(path: str, args: List[str],
+            socket_path: str = DEFAULT_SOCKET) -> Tuple[str, str, int]:
+    """Run script at `path` with `args` in the daemon.
+
+    Return the standard output, standard error and exit status.
+    """
+    with open(path) as source_file:
+        source = source_file.read()
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as exc:
+            raise errors.DaemonNotRunning(socket_path) from exc
+        check_owner(sock, socket_path)
+        sock.sendall(encode([source, *args]))
+        sock.shutdown(_socket.SHUT_WR)
+        chunks = []
+        while chunk := sock.recv(RECV_SIZE):
+            chunks.append(chunk)
+    finally:
+        sock.close()
+    response = decode(b''.join(chunks))
+    if len(response) != 3 or not response[2].isdigit():
+        raise errors.InvalidRequest('bad response from daemon')
+    stdout, stderr, status = response
+    return stdout, stderr, int(status)
+
+
+def check_owner(sock: _socket.socket, socket_path: str) -> None:
+    """Refuse to send scripts to a daemon run by another user."""
+    if hasattr(_socket, 'SO_PEERCRED'):  # struct ucred: pid, uid, gid
+        credentials = sock.getsockopt(_socket.SOL_SOCKET,
+                                      _socket.SO_PEERCRED, 12)
+        uid = int.from_bytes(credentials[4:8], sys.byteorder)
+    else:
+        uid = os.stat(socket_path).st_uid
+    if uid != os.getuid():
+        raise errors.UntrustedDaemon(f'{socket_path} owned by user {uid}')
+
+
+def main(path: str, args: List[str],
+         socket_path: str = DEFAULT_SOCKET) -> NoReturn:
+    """Relay output and exit status of script run by the daemon."""
+    stdout, stderr, status = request(path, args, socket_path)
+    sys.stdout.write(stdout)
+    sys.stdout.flush()
+    sys.stderr.write(stderr)
+    sys.exit(status)
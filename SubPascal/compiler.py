@@ -0,0 +1,222 @@
+import time
+from typing import Callable, Dict, List, Optional
+
+import evaluator
+from evaluator import (
+    CompiledCode, Function, Operator, ValueEnv, UserFunction,
+    SPECIAL_FORMS, VARIADIC, check_arity, fetch_function,
+)
+from parser import Expression
+import errors
+
+Node = CompiledCode  # node(local_env, global_env) -> value
+
+
+def constant(value: int) -> Node:
+    def node(env: ValueEnv, genv: ValueEnv) -> int:
+        return value
+    return node
+
+
+def variable(name: str) -> Node:
+    def node(env: ValueEnv, genv: ValueEnv) -> int:
+        try:
+            return env[name]
+        except KeyError:
+            try:
+                return genv[name]
+            except KeyError as exc:
+                raise errors.UndefinedVariable(name) from exc
+    return node
+
+
+def assign(env: ValueEnv, genv: ValueEnv, name: str, value: int) -> None:
+    if name in env:
+        env[name] = value
+    else:
+        genv[name] = value
+
+
+def call(function: Callable[..., int], arg_nodes: List[Node]) -> Node:
+    if len(arg_nodes) == 1:
+        [arg] = arg_nodes
+
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            try:
+                return function(arg(env, genv))
+            except ZeroDivisionError as exc:
+                raise errors.DivisionByZero() from exc
+    elif len(arg_nodes) == 2:
+        left, right = arg_nodes
+
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            try:
+                return function(left(env, genv), right(env, genv))
+            except ZeroDivisionError as exc:
+                raise errors.DivisionByZero() from exc
+    else:
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            values = [arg(env, genv) for arg in arg_nodes]
+            try:
+                return function(*values)
+            except ZeroDivisionError as exc:
+                raise errors.DivisionByZero() from exc
+    return node
+
+
+class Compiler:
+    """Compile expressions to nested closures.
+
+    Each closure takes the local and global environments and does the
+    work `evaluate` would do for the same expression, without matching
+    and dispatching on the expression again at every step.
+    """
+
+    def __init__(self) -> None:
+        # names called, to the function bound, or None if resolved per call
+        self.callees: Dict[str, Optional[Function]] = {}
+        self.special_forms: Dict[str, Callable[..., Node]] = {
+            'let': self.compile_let,
+            'if': self.compile_if,
+            'begin': self.compile_begin,
+            'while': self.compile_while,
+            'for': self.compile_for,
+        }
+
+    def resolve(self, name: str) -> Function:
+        return fetch_function(name)
+
+    def fallback(self, exp: Expression) -> Node:
+        """Interpret `exp`, for cases not worth compiling."""
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            return evaluator.evaluate(env, exp)
+        return node
+
+    def compile(self, exp: Expression) -> Node:
+        if isinstance(exp, int):
+            return constant(exp)
+        elif isinstance(exp, str):
+            return variable(exp)
+        elif not exp or not isinstance(exp[0], str):
+            return self.fallback(exp)
+        symbol, *args = exp
+        if symbol not in SPECIAL_FORMS:
+            return self.compile_call(symbol, args)
+        form = SPECIAL_FORMS[symbol]
+        if form.arity != VARIADIC and len(args) != form.arity:
+            return self.arity_error(symbol, form.arity, args)
+        if not args:
+            return self.fallback(exp)
+        return self.special_forms[symbol](*args)
+
+    def arity_error(self, name: str, arity: int,
+                    args: List[Expression]) -> Node:
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            check_arity(name, arity, args)
+            return 0  # not reached: check_arity raises
+        return node
+
+    def compile_call(self, name: str, args: List[Expression]) -> Node:
+        try:
+            func = self.resolve(name)
+        except errors.UndefinedFunction:
+            self.callees.setdefault(name, None)
+            return self.compile_late_call(name, args)
+        self.callees[name] = func
+        arg_nodes = [self.compile(x) for x in args]
+        if isinstance(func, Operator) and func.arity == len(args):
+            return call(func.function, arg_nodes)  # arity already checked
+        return call(func, arg_nodes)
+
+    def compile_late_call(self, name: str, args: List[Expression]) -> Node:
+        """Compile call to function not yet defined."""
+        arg_nodes = [self.compile(x) for x in args]
+        resolve = self.resolve
+
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            func = resolve(name)
+            values = [arg(env, genv) for arg in arg_nodes]
+            try:
+                return func(*values)
+            except ZeroDivisionError as exc:
+                raise errors.DivisionByZero() from exc
+        return node
+
+    def compile_let(self, name: str, val_exp: Expression) -> Node:
+        value_node = self.compile(val_exp)
+
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            value = value_node(env, genv)
+            assign(env, genv, name, value)
+            return value
+        return node
+
+    def compile_if(self, condition: Expression,
+                   consequence: Expression,
+                   alternative: Expression) -> Node:
+        test = self.compile(condition)
+        then = self.compile(consequence)
+        otherwise = self.compile(alternative)
+
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            if test(env, genv):
+                return then(env, genv)
+            return otherwise(env, genv)
+        return node
+
+    def compile_begin(self, *statements: Expression) -> Node:
+        *init, last = [self.compile(x) for x in statements]
+
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            for statement in init:
+                statement(env, genv)
+            return last(env, genv)
+        return node
+
+    def compile_while(self, condition: Expression, block: Expression) -> Node:
+        test = self.compile(condition)
+        body = self.compile(block)
+
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            while test(env, genv):
+                body(env, genv)
+            return 0
+        return node
+
+    def compile_for(self, name: str, exp_first: Expression,
+                    exp_last: Expression, block: Expression) -> Node:
+        let_first = self.compile_let(name, exp_first)
+        last = self.compile(exp_last)
+        body = self.compile(block)
+
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            i = let_first(env, genv)
+            last_val = last(env, genv)
+            while i <= last_val:
+                body(env, genv)
+                i += 1
+                assign(env, genv, name, i)
+            return None  # type: ignore[return-value]  # same as For.apply
+        return node
+
+
+def promote(func: UserFunction) -> None:
+    """Compile the body of `func`, to be used in its next calls."""
+    start = time.perf_counter()
+    compiler = Compiler()
+    func.code = compiler.compile(func.body)
+    func.callees = compiler.callees
+    evaluator.tier_stats['promotions'] += 1
+    evaluator.tier_stats['compile_seconds'] += time.perf_counter() - start
+
+
+def stats_report() -> str:
+    stats = evaluator.tier_stats
+    compiled = sorted(f.name for f in evaluator.function_env.values()
+                      if f.code is not None)
+    return '\n'.join([
+        f"promotions: {stats['promotions']}",
+        f"deoptimizations: {stats['deoptimizations']}",
+        f"compile time: {stats['compile_seconds'] * 1000:.3f} ms",
+        f"compiled functions: {' '.join(compiled) or '-'}",
+    ])
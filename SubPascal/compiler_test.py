@@ -0,0 +1,130 @@
+import pickle
+
+from pytest import mark, raises
+
+import evaluator
+from evaluator import define_function, evaluate, UserFunction
+from compiler import Compiler, promote, stats_report
+import errors
+
+
+def run_compiled(exp, env):
+    code = Compiler().compile(exp)
+    return code(env, evaluator.global_env)
+
+
+@mark.parametrize("exp", [
+    7,
+    'x',
+    ['+', 'x', ['*', 2, 3]],
+    ['if', ['>', 'x', 0], 1, ['/', 1, 0]],
+    ['begin', ['let', 'x', 10], ['let', 'g', ['+', 'x', 1]], 'g'],
+    ['begin', ['let', 'n', 0],
+     ['while', ['<', 'n', 5], ['let', 'n', ['+', 'n', 1]]]],
+    ['begin', ['let', 't', 0],
+     ['for', 'i', 1, 4, ['let', 't', ['+', 't', 'i']]], 't'],
+    ['mod', 17, 'x'],
+    ['pow', 2, 'x', 5],
+    ['begin', 'x'],
+])
+def test_compiled_matches_evaluate(fresh_env, exp):
+    interpreted_env = {'x': 3}
+    want = evaluate(interpreted_env, exp)
+    want_globals = evaluator.global_env
+    evaluator.global_env = {}
+    compiled_env = {'x': 3}
+    assert want == run_compiled(exp, compiled_env)
+    assert interpreted_env == compiled_env
+    assert want_globals == evaluator.global_env
+
+
+@mark.parametrize("exp, error, message", [
+    ('y', errors.UndefinedVariable, "Undefined variable: 'y'."),
+    (['spam', 1], errors.UndefinedFunction, "Undefined function: 'spam'."),
+    (['/', 1, 0], errors.DivisionByZero, "Division by zero."),
+    (['/', 1], errors.MissingArgument, "Missing argument: '/' needs 2."),
+    (['if', 1, 2], errors.MissingArgument, "Missing argument: 'if' needs 3."),
+    (['while', 1, 2, 3], errors.TooManyArguments,
+     "Too many arguments: 'while' needs 2."),
+])
+def test_compiled_errors(fresh_env, exp, error, message):
+    with raises(error) as excinfo:
+        run_compiled(exp, {})
+    assert message == str(excinfo.value)
+
+
+def test_compiled_print(fresh_env, capsys):
+    assert 5 == run_compiled(['print', 5], {})
+    assert '5\n' == capsys.readouterr().out
+
+
+def test_promotion_after_threshold(fresh_env):
+    evaluator.tier_threshold = 3
+    define_function('double', ['n'], ['*', 'n', 2])
+    double = evaluator.function_env['double']
+    for i in range(2):
+        assert i * 2 == evaluate({}, ['double', i])
+    assert double.code is None
+    assert 4 == evaluate({}, ['double', 2])
+    assert double.code is not None
+    assert 6 == evaluate({}, ['double', 3])
+
+
+def test_loops_count_towards_promotion(fresh_env):
+    evaluator.tier_threshold = 10
+    define_function('count', ['n'],
+                    ['begin',
+                     ['while', 'n', ['let', 'n', ['-', 'n', 1]]], 'n'])
+    evaluate({}, ['count', 20])
+    evaluate({}, ['count', 20])
+    assert evaluator.function_env['count'].code is not None
+
+
+def test_redefined_callee_deoptimizes(fresh_env):
+    evaluator.tier_threshold = 0
+    define_function('f', ['n'], ['+', 'n', 1])
+    define_function('g', ['n'], ['f', 'n'])
+    g = evaluator.function_env['g']
+    promote(g)
+    assert 2 == evaluate({}, ['g', 1])
+    define_function('f', ['n'], ['+', 'n', 2])
+    assert g.code is None
+    assert 3 == evaluate({}, ['g', 1])
+
+
+def test_native_overridden_deoptimizes(fresh_env):
+    define_function('g', ['n'], ['abs', 'n'])
+    g = evaluator.function_env['g']
+    promote(g)
+    assert 2 == g(-2)
+    define_function('abs', ['x'], 0)
+    assert 0 == g(-2)
+
+
+def test_late_bound_callee(fresh_env):
+    g = UserFunction('g', ['n'], ['f', 'n'])
+    promote(g)
+    with raises(errors.UndefinedFunction):
+        g(1)
+    define_function('f', ['n'], ['*', 'n', 10])
+    assert 10 == g(1)
+
+
+def test_compiled_function_pickles_without_code(fresh_env):
+    define_function('f', ['n'], ['+', 'n', 1])
+    f = evaluator.function_env['f']
+    promote(f)
+    copy = pickle.loads(pickle.dumps(f))
+    assert (None, {}, 0) == (copy.code, copy.callees, copy.calls)
+    assert 3 == copy(2)
+    assert f.code is not None
+
+
+def test_stats_report(fresh_env):
+    evaluator.tier_stats.update(promotions=0, deoptimizations=0)
+    define_function('f', ['n'], 'n')
+    promote(evaluator.function_env['f'])
+    report = stats_report()
+    assert 'promotions: 1\n' in report
+    assert 'deoptimizations: 0\n' in report
+    assert 'compiled functions: f' in report
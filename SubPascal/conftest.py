@@ -0,0 +1,18 @@
+from pytest import fixture
+
+import evaluator
+
+
+@fixture
+def fresh_env():
+    # backup global_env, function_env and the optimizer settings
+    saved = (evaluator.global_env, evaluator.function_env,
+             evaluator.tier_threshold, dict(evaluator.tier_stats),
+             evaluator.specializer, evaluator.result_cache)
+    evaluator.global_env = {}
+    evaluator.function_env = {}
+    yield
+    # restore them
+    (evaluator.global_env, evaluator.function_env, evaluator.tier_threshold,
+     stats, evaluator.specializer, evaluator.result_cache) = saved
+    evaluator.tier_stats.update(stats)
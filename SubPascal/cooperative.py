@@ -0,0 +1,275 @@
+"""Run many scripts in one process, taking turns.
+
+A `Task` runs a script with a generator that yields every `quantum`
+steps, where a step is a loop iteration or a call of a user-defined
+function: the only ways a script can run for long. `Scheduler` runs
+tasks round-robin; `Task.run_async` lets an asyncio event loop do it.
+
+Each task has its own `Context`: variables, functions, output and error
+stream, swapped into evaluator.py while the task runs. Expressions that
+neither loop nor call user-defined functions take bounded time, so they
+are computed by `evaluator.evaluate` without yielding; the others are
+computed here, mirroring `evaluate`, to yield inside loops and calls.
+Only `while`, `for` and calls are more expensive than with `evaluate`.
+"""
+
+import asyncio
+import collections
+import contextlib
+import io
+import sys
+from typing import (
+    Deque, Dict, Generator, Iterator, Optional, TextIO, Tuple,
+)
+
+from evaluator import (
+    SPECIAL_FORMS, UserFunction, ValueEnv, FunctionEnv,
+    check_arity, define_function, fetch_function,
+)
+from output import MemorySink, OutputSink
+from parser import Expression, is_define, parse_exp, tokenize
+import errors
+import evaluator
+
+QUANTUM = 1000  # steps
+
+Steps = Generator[None, None, int]  # value returned when done
+
+
+class Context:
+    """State of a script: variables, functions, output and errors.
+
+    By default, output and error messages are kept in memory.
+    """
+
+    def __init__(self, output: Optional[OutputSink] = None,
+                 stderr: Optional[TextIO] = None):
+        self.global_env: ValueEnv = {}
+        self.function_env: FunctionEnv = {}
+        self.output = MemorySink() if output is None else output
+        self.stderr = io.StringIO() if stderr is None else stderr
+
+    @contextlib.contextmanager
+    def active(self) -> Iterator[None]:
+        """Make evaluator.py use this context."""
+        saved = evaluator.global_env, evaluator.function_env, evaluator.output
+        evaluator.global_env = self.global_env
+        evaluator.function_env = self.function_env
+        evaluator.output = self.output
+        try:
+            with contextlib.redirect_stderr(self.stderr):
+                yield
+        finally:
+            evaluator.global_env, evaluator.function_env = saved[:2]
+            evaluator.output = saved[2]
+
+
+class Evaluator:
+    """Evaluate expressions with generators yielding every `quantum` steps.
+
+    Results, errors and side effects are the same as with `evaluate`.
+    """
+
+    def __init__(self, quantum: int = QUANTUM):
+        self.quantum = quantum
+        self.countdown = quantum
+        # Whether expressions, by id, neither loop nor call user functions.
+        # Each expression is kept with its flag: once freed, its id could
+        # be reused by a new expression, which must be classified again.
+        self.straight: Dict[int, Tuple[Expression, bool]] = {}
+        self.generation = evaluator.generation
+
+    def check_functions(self) -> None:
+        """Forget what depends on functions, if any was defined since."""
+        if self.generation != evaluator.generation:
+            self.straight.clear()
+            self.generation = evaluator.generation
+
+    def is_straight(self, exp: Expression) -> bool:
+        if not isinstance(exp, list):
+            return True
+        cached = self.straight.get(id(exp))
+        if cached is not None and cached[0] is exp:
+            return cached[1]
+        result = self.classify(exp)
+        self.straight[id(exp)] = exp, result
+        return result
+
+    def classify(self, exp: list) -> bool:
+        if not exp or not isinstance(exp[0], str):
+            return True  # `evaluate` handles these quickly, or raises
+        symbol = exp[0]
+        if symbol == 'while' or symbol == 'for':
+            return False
+        if symbol not in SPECIAL_FORMS:
+            try:
+                if isinstance(fetch_function(symbol), UserFunction):
+                    return False
+            except errors.UndefinedFunction:
+                pass
+        return all(self.is_straight(x) for x in exp[1:])
+
+    def evaluate(self, env: ValueEnv, exp: Expression) -> Steps:
+        """Compute value of `exp` in `env`, yielding to take turns."""
+        if self.is_straight(exp):
+            return evaluator.evaluate(env, exp)
+        return (yield from self.generate(env, exp))
+
+    def generate(self, env: ValueEnv, exp: Expression) -> Steps:
+        """Mirror `evaluate` for expressions that are not straight."""
+        assert isinstance(exp, list)
+        straight = self.is_straight
+        generate = self.generate
+        evaluate = evaluator.evaluate
+        symbol, *args = exp
+        form = SPECIAL_FORMS.get(symbol)
+        if form is None:
+            func = fetch_function(symbol)
+            if evaluator.specializer and isinstance(func, UserFunction):
+                func, args = evaluator.specializer(func, args)
+            values = []
+            for x in args:
+                values.append(evaluate(env, x) if straight(x)
+                              else (yield from generate(env, x)))
+            if isinstance(func, UserFunction):
+                self.countdown -= 1
+                if not self.countdown:
+                    self.countdown = self.quantum
+                    yield
+                if not straight(func.body):
+                    check_arity(func.name, func.arity, values)
+                    local_env = dict(zip(func.formals, values))
+                    return (yield from generate(local_env, func.body))
+            try:
+                return func(*values)
+            except ZeroDivisionError as exc:
+                raise errors.DivisionByZero() from exc
+        check_arity(form.name, form.arity, args)
+        match args:
+            case [name, val_exp] if symbol == 'let':
+                value = (evaluate(env, val_exp) if straight(val_exp)
+                         else (yield from generate(env, val_exp)))
+                assign(env, name, value)
+                return value
+            case [condition, consequence, alternative] if symbol == 'if':
+                test = (evaluate(env, condition) if straight(condition)
+                        else (yield from generate(env, condition)))
+                branch = consequence if test else alternative
+                return (evaluate(env, branch) if straight(branch)
+                        else (yield from generate(env, branch)))
+            case [*statements, last] if symbol == 'begin':
+                for statement in statements:
+                    if straight(statement):
+                        evaluate(env, statement)
+                    else:
+                        yield from generate(env, statement)
+                return (evaluate(env, last) if straight(last)
+                        else (yield from generate(env, last)))
+            case [condition, block] if symbol == 'while':
+                while (evaluate(env, condition) if straight(condition)
+                       else (yield from generate(env, condition))):
+                    if straight(block):
+                        evaluate(env, block)
+                    else:
+                        yield from generate(env, block)
+                    evaluator.back_edges += 1
+                    self.countdown -= 1
+                    if not self.countdown:
+                        self.countdown = self.quantum
+                        yield
+                return 0
+            case [name, exp_first, exp_last, block] if symbol == 'for':
+                i = (evaluate(env, exp_first) if straight(exp_first)
+                     else (yield from generate(env, exp_first)))
+                assign(env, name, i)
+                last_val = (evaluate(env, exp_last) if straight(exp_last)
+                            else (yield from generate(env, exp_last)))
+                while i <= last_val:
+                    if straight(block):
+                        evaluate(env, block)
+                    else:
+                        yield from generate(env, block)
+                    i += 1
+                    assign(env, name, i)
+                    evaluator.back_edges += 1
+                    self.countdown -= 1
+                    if not self.countdown:
+                        self.countdown = self.quantum
+                        yield
+                return None  # type: ignore[return-value]  # as `evaluate`
+        raise AssertionError(f'unexpected special form: {symbol}')
+
+
+def assign(env: ValueEnv, name: str, value: int) -> None:
+    """Set variable like `let`: local if it exists, else global."""
+    if name in env:
+        env[name] = value
+    else:
+        evaluator.global_env[name] = value
+
+
+class Task:
+    """Run of a script, advanced one turn at a time by `step`."""
+
+    def __init__(self, source: str, env: Optional[ValueEnv] = None,
+                 context: Optional[Context] = None, quantum: int = QUANTUM):
+        self.context = Context() if context is None else context
+        self.env = {} if env is None else env
+        self.evaluator = Evaluator(quantum)
+        self.steps = self.execute(source)
+        self.done = False
+
+    def execute(self, source: str) -> Generator[None, None, None]:
+        """Like `subpascal.execute`, yielding to take turns."""
+        tokens = tokenize(source)
+        try:
+            while tokens:
+                exp = parse_exp(tokens)
+                if is_define(exp):
+                    define_function(*exp[1:])
+                    self.evaluator.check_functions()
+                    continue
+                try:
+                    yield from self.evaluator.evaluate(self.env, exp)
+                except errors.EvaluatorException as exc:
+                    print('***', exc, file=sys.stderr)
+        except errors.UnexpectedCloseParen as exc:
+            print('***', exc, file=sys.stderr)
+
+    def step(self) -> bool:
+        """Run for one turn; return True if the script ended."""
+        if self.done:
+            return True
+        with self.context.active():
+            self.evaluator.check_functions()
+            try:
+                next(self.steps)
+            except StopIteration:
+                self.done = True
+            finally:
+                evaluator.output.flush()
+        return self.done
+
+    async def run_async(self) -> None:
+        """Run to the end, letting the event loop run between turns."""
+        while not self.step():
+            await asyncio.sleep(0)
+
+
+class Scheduler:
+    """Run tasks in turns, round-robin."""
+
+    def __init__(self) -> None:
+        self.tasks: Deque[Task] = collections.deque()
+
+    def add(self, task: Task) -> Task:
+        self.tasks.append(task)
+        return task
+
+    def run(self) -> None:
+        """Run all tasks to the end, including tasks added meanwhile."""
+        tasks = self.tasks
+        while tasks:
+            task = tasks.popleft()
+            if not task.step():
+                tasks.append(task)
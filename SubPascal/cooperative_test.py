@@ -0,0 +1,159 @@
+import asyncio
+
+from pytest import fixture, mark, raises
+
+import evaluator
+from evaluator import define_function, evaluate
+from cooperative import Evaluator, Scheduler, Task
+import errors
+
+COUNTDOWN = """
+(define countdown (n) (begin (while (> n 0) (let n (- n 1))) n))
+"""
+FACTORIAL = """
+(define fact (n) (if (= n 0) 1 (* n (fact (- n 1)))))
+"""
+
+
+@fixture
+def functions(fresh_env):
+    define_function('countdown', ['n'],
+                    ['begin', ['while', ['>', 'n', 0],
+                               ['let', 'n', ['-', 'n', 1]]], 'n'])
+    define_function('fact', ['n'],
+                    ['if', ['=', 'n', 0], 1,
+                     ['*', 'n', ['fact', ['-', 'n', 1]]]])
+    define_function('square', ['n'], ['*', 'n', 'n'])
+
+
+def drive(steps):
+    """Run generator `steps` to the end; return its value and turns."""
+    turns = 0
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value, turns
+        turns += 1
+
+
+@mark.parametrize("exp", [
+    7,
+    'x',
+    ['+', 'x', ['square', 3]],
+    ['fact', 20],
+    ['countdown', 'x'],
+    ['begin', ['let', 'g', 0],
+     ['for', 'i', 1, 5, ['let', 'g', ['+', 'g', ['fact', 'i']]]], 'g'],
+    ['for', 'i', 1, 3, ['let', 'x', ['+', 'x', 'i']]],
+    ['if', ['fact', 0], ['countdown', 5], ['/', 1, 0]],
+    ['begin', ['let', 'x', 2], ['while', ['<', 'x', 100],
+                                ['let', 'x', ['square', 'x']]]],
+])
+def test_matches_evaluate(functions, exp):
+    interpreted_env = {'x': 3}
+    want = evaluate(interpreted_env, exp)
+    want_globals = evaluator.global_env
+    evaluator.global_env = {}
+    cooperative_env = {'x': 3}
+    value, _ = drive(Evaluator(quantum=1).evaluate(cooperative_env, exp))
+    assert want == value
+    assert interpreted_env == cooperative_env
+    assert want_globals == evaluator.global_env
+
+
+@mark.parametrize("exp, error", [
+    (['fact', 1, 2], errors.TooManyArguments),
+    (['countdown'], errors.MissingArgument),
+    (['while', ['fact', 1], 0, 0], errors.TooManyArguments),
+    (['+', ['fact', 1], ['spam']], errors.UndefinedFunction),
+    (['begin', ['countdown', 2], ['/', 1, 0]], errors.DivisionByZero),
+])
+def test_errors_match_evaluate(functions, exp, error):
+    with raises(error):
+        evaluate({}, exp)
+    with raises(error):
+        drive(Evaluator(quantum=1).evaluate({}, exp))
+
+
+@mark.parametrize("quantum, turns", [
+    (1, 11),  # the call, 10 iterations
+    (5, 2),
+    (1000, 0),
+])
+def test_yields_every_quantum_steps(functions, quantum, turns):
+    exp = ['countdown', 10]
+    assert (0, turns) == drive(Evaluator(quantum).evaluate({}, exp))
+
+
+def test_straight_expressions_do_not_yield(functions):
+    exp = ['+', ['square', 2], 1]  # `square` is straight, but called
+    assert (5, 1) == drive(Evaluator(quantum=1).evaluate({}, exp))
+    exp = ['*', ['+', 1, 2], ['-', 5, 1]]
+    assert (12, 0) == drive(Evaluator(quantum=1).evaluate({}, exp))
+
+
+def test_loop_after_many_forms_yields():
+    # ids of the forms run before the loop are reused by new expressions
+    short = ''.join(f'(+ {n} (* 2 3))\n' for n in range(2000))
+    task = Task(f'(let i 0) {short} (while (< i 10000) (let i (+ i 1)))',
+                quantum=100)
+    turns = 0
+    while not task.step():
+        turns += 1
+    assert turns >= 10000 // 100
+
+
+def test_tasks_take_turns():
+    long = '(let i 0) (while (< i 10000) (let i (+ i 1))) (print i)'
+    short = '(let i 0) (while (< i 100) (let i (+ i 1))) (print i)'
+    scheduler = Scheduler()
+    finished = []
+    tasks = [scheduler.add(Task(source, quantum=10))
+             for source in (long, short)]
+    while scheduler.tasks:
+        task = scheduler.tasks.popleft()
+        if task.step():
+            finished.append(task)
+        else:
+            scheduler.tasks.append(task)
+    assert [tasks[1], tasks[0]] == finished
+    assert ['10000\n', '100\n'] == [t.context.output.getvalue() for t in tasks]
+
+
+def test_tasks_are_isolated():
+    global_env, function_env = evaluator.global_env, evaluator.function_env
+    scheduler = Scheduler()
+    tasks = [scheduler.add(Task(f'(define f () {n}) (let x (f)) (print x)',
+                                quantum=1))
+             for n in range(3)]
+    tasks.append(scheduler.add(Task('(print (f))')))
+    scheduler.run()
+    outputs = [task.context.output.getvalue() for task in tasks]
+    assert ['0\n', '1\n', '2\n', ''] == outputs
+    assert {'x': 1} == tasks[1].context.global_env
+    stderr = tasks[3].context.stderr.getvalue()
+    assert "*** Undefined function: 'f'.\n" == stderr
+    assert evaluator.global_env is global_env
+    assert evaluator.function_env is function_env
+
+
+def test_run_async():
+    source = FACTORIAL + COUNTDOWN + '(print (fact 30)) (print (countdown n))'
+    tasks = [Task(source, {'n': n}, quantum=50) for n in (2000, 3000)]
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while not all(task.done for task in tasks):
+            ticks += 1
+            await asyncio.sleep(0)
+
+    async def main():
+        await asyncio.gather(ticker(), *(task.run_async() for task in tasks))
+
+    asyncio.run(main())
+    assert ticks > 10
+    for task in tasks:
+        want = '265252859812191058636308480000000\n0\n'
+        assert want == task.context.output.getvalue()
@@ -0,0 +1,252 @@
+"""Warm interpreter serving `subpascal.py --client` over a Unix socket.
+
+Scripts run in a pool of worker processes, so requests run concurrently.
+Each worker keeps the scripts it ran, parsed, keyed by the hash of their
+source, with the functions they defined; each request gets new variables
+and an empty function table. See client.py for the protocol.
+"""
+
+import asyncio
+import contextlib
+import errno
+import hashlib
+import io
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from client import DEFAULT_SOCKET, decode, encode
+from evaluator import (
+    NATIVE_OPS, UserFunction, ValueEnv, define_function, evaluate,
+    fetch_function,
+)
+from output import MemorySink
+from parser import Expression, is_define, parse_exp, tokenize
+from subpascal import env_from_args
+import errors
+import evaluator
+
+MAX_SCRIPTS = 256  # cached by each worker
+
+Response = Tuple[str, str, int]  # stdout, stderr, exit status
+
+
+class Script:
+    """Parsed forms of a script, and the functions it defined.
+
+    Functions are reused by later runs only if the script defines each
+    name once, keeping their compiled code unless `put_back` finds it
+    calls functions other than those defined so far.
+    """
+
+    def __init__(self, forms: List[Expression],
+                 error: Optional[errors.ParserException] = None):
+        self.forms = forms
+        self.error = error  # reported after running the forms before it
+        names = [exp[1] for exp in self.forms if is_define(exp)]
+        self.reusable = len(names) == len(set(names))
+        self.functions: Dict[int, UserFunction] = {}  # by form index
+
+    @classmethod
+    def parse(cls, source: str) -> 'Script':
+        forms: List[Expression] = []
+        tokens = tokenize(source)
+        try:
+            while tokens:
+                forms.append(parse_exp(tokens))
+        except errors.ParserException as exc:
+            return cls(forms, exc)
+        return cls(forms)
+
+    def run(self, env: ValueEnv) -> int:
+        """Run like `subpascal.execute`; return the exit status."""
+        for index, exp in enumerate(self.forms):
+            if not is_define(exp):
+                try:
+                    evaluate(env, exp)
+                except errors.EvaluatorException as exc:
+                    print('***', exc, file=sys.stderr)
+                continue
+            func = self.functions.get(index)
+            if func is None:
+                define_function(*exp[1:])
+                if self.reusable:
+                    self.functions[index] = evaluator.function_env[exp[1]]
+            else:
+                put_back(func)
+        if self.error is not None:
+            print('***', self.error, file=sys.stderr)
+            return int(not isinstance(self.error,
+                                      errors.UnexpectedCloseParen))
+        return 0
+
+
+def put_back(func: UserFunction) -> None:
+    """Define `func` again, as kept from a previous run.
+
+    Compiled code binds the functions called when it was compiled,
+    maybe later in the previous run: drop code that binds any other
+    function than the one its name now means, like `define` would.
+    """
+    evaluator.function_env[func.name] = func
+    evaluator.generation += 1
+    for other in evaluator.function_env.values():
+        if other.code is not None and not binds_current(other):
+            other.deoptimize()
+
+
+def binds_current(func: UserFunction) -> bool:
+    for name, bound in func.callees.items():
+        if bound is None:
+            continue  # resolved at each call
+        try:
+            if fetch_function(name) is not bound:
+                return False
+        except errors.UndefinedFunction:
+            return False
+    return True
+
+
+scripts: Dict[str, Script] = {}  # least recently used first
+
+
+def load_script(source: str) -> Script:
+    """Return cached script with this source, or parse it."""
+    key = hashlib.sha256(source.encode()).hexdigest()
+    script = scripts.pop(key, None)
+    if script is None:
+        script = Script.parse(source)
+    scripts[key] = script  # most recently used last
+    while len(scripts) > MAX_SCRIPTS:
+        del scripts[next(iter(scripts))]
+    return script
+
+
+def run_script(source: str, args: List[str]) -> Response:
+    """Run `source` in a worker process, with its own variables."""
+    return run_parsed(load_script(source), args)
+
+
+def run_parsed(script: Script, args: List[str]) -> Response:
+    """Run `script` with its own variables; capture its output."""
+    saved = evaluator.global_env, evaluator.function_env, evaluator.output
+    evaluator.global_env, evaluator.function_env = {}, {}
+    evaluator.output = sink = MemorySink()
+    stderr = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(stderr):
+            status = script.run(env_from_args(args))
+    finally:
+        evaluator.global_env, evaluator.function_env, evaluator.output = saved
+    return sink.getvalue(), stderr.getvalue(), status
+
+
+def configure_worker(tier_threshold: int, native: bool) -> None:
+    """Apply options given to the daemon in each spawned worker."""
+    evaluator.tier_threshold = tier_threshold
+    if not native:
+        NATIVE_OPS.clear()
+
+
+class Daemon:
+    """Run scripts sent by clients in a pool of warm processes."""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+        self.pool = self.new_pool()
+
+    def new_pool(self) -> ProcessPoolExecutor:
+        # spawned workers don't inherit the sockets of open connections
+        spawn = multiprocessing.get_context('spawn')
+        return ProcessPoolExecutor(
+            self.max_workers, mp_context=spawn, initializer=configure_worker,
+            initargs=(evaluator.tier_threshold, bool(NATIVE_OPS)))
+
+    async def start(self, path: str) -> asyncio.AbstractServer:
+        check_socket_dir(os.path.dirname(path) or '.')
+        server = await asyncio.start_unix_server(self.handle, path)
+        os.chmod(path, 0o600)
+        return server
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+
+    async def handle(self,
+                     reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            fields = decode(await reader.read())
+            if not fields:
+                raise errors.InvalidRequest('missing source')
+            source, *args = fields
+            pool = self.pool
+            try:
+                stdout, stderr, status = await loop.run_in_executor(
+                    pool, run_script, source, args)
+            except BrokenProcessPool:
+                if pool is self.pool:  # a worker died: replace them all
+                    self.pool = self.new_pool()
+                    pool.shutdown(wait=False)
+                raise
+        except Exception as exc:  # the daemon must outlive any request
+            stdout, stderr, status = '', f'*** {exc}\n', 1
+        try:
+            writer.write(encode([stdout, stderr, str(status)]))
+            await writer.drain()
+        except ConnectionError:
+            pass  # client is gone
+        finally:
+            writer.close()
+
+
+def check_socket_dir(path: str) -> None:
+    """Create directory `path` if needed; refuse it if others can write.
+
+    Otherwise, another user could replace the socket with their own.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise errors.InvalidOption(f'socket directory {path} is not private')
+
+
+def remove_stale_socket(path: str) -> None:
+    """Remove socket at `path` left by a daemon that is gone."""
+    with socket.socket(socket.AF_UNIX) as sock:
+        try:
+            sock.connect(path)
+        except FileNotFoundError:
+            return
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise OSError(errno.EADDRINUSE, 'Daemon already running', path)
+
+
+async def serve(path: str = DEFAULT_SOCKET) -> None:
+    """Serve until interrupted or terminated."""
+    remove_stale_socket(path)
+    task = asyncio.current_task()
+    assert task is not None
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    daemon = Daemon()
+    try:
+        listener = await daemon.start(path)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        daemon.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+
+
+def main(path: str = DEFAULT_SOCKET) -> None:
+    print(f'SubPascal daemon listening on {path}', file=sys.stderr)
+    with contextlib.suppress(KeyboardInterrupt, asyncio.CancelledError):
+        asyncio.run(serve(path))
@@ -0,0 +1,184 @@
+import asyncio
+import os
+
+from pytest import fixture, mark, raises
+
+import client
+import daemon
+import errors
+import evaluator
+
+GCD = """
+(define mod (m n) (- m (* n (/ m n))))
+(define gcd (m n) (if (= n 0) m (gcd n (mod m n))))
+(print (gcd a b))
+"""
+
+
+@fixture
+def fresh_cache():
+    daemon.scripts.clear()
+    yield
+    daemon.scripts.clear()
+
+
+@mark.parametrize("fields", [
+    [],
+    [''],
+    ['(print 1)', 'a:1'],
+    ['ação', '1:2,', ''],
+])
+def test_encode_decode(fields):
+    assert fields == client.decode(client.encode(fields))
+
+
+@mark.parametrize("message", [b'3:ab,', b'2:abc', b'x:ab,', b'2:ab'])
+def test_decode_invalid(message):
+    with raises(errors.InvalidRequest):
+        client.decode(message)
+
+
+def test_run_script(fresh_cache):
+    assert ('9\n', '', 0) == daemon.run_script(GCD, ['a:18', 'b:45'])
+    assert ('1\n', '', 0) == daemon.run_script(GCD, ['a:7', 'b:5'])
+    assert 1 == len(daemon.scripts)
+
+
+def test_run_script_is_isolated(fresh_cache):
+    global_env, function_env = evaluator.global_env, evaluator.function_env
+    daemon.run_script('(define f (n) n) (set x 1)', [])
+    stdout, stderr, status = daemon.run_script('(f x)', [])
+    assert "*** Undefined function: 'f'.\n" == stderr
+    assert 0 == status
+    assert evaluator.global_env is global_env
+    assert evaluator.function_env is function_env
+
+
+def test_functions_are_reused(fresh_cache):
+    daemon.run_script(GCD, ['a:18', 'b:45'])
+    [script] = daemon.scripts.values()
+    gcd = script.functions[1]
+    daemon.run_script(GCD, ['a:18', 'b:45'])
+    assert gcd is script.functions[1]
+
+
+def test_functions_defined_twice_are_not_reused(fresh_cache):
+    source = '(define f () 1) (print (f)) (define f () 2) (print (f))'
+    for _ in range(2):
+        assert ('1\n2\n', '', 0) == daemon.run_script(source, [])
+    [script] = daemon.scripts.values()
+    assert not script.functions
+
+
+def test_reused_functions_call_current_definitions(fresh_cache,
+                                                   monkeypatch):
+    monkeypatch.setattr(evaluator, 'tier_threshold', 10)
+    source = """
+    (define f (n) (abs n))
+    (define g () (f -5))
+    (print (g))
+    (define abs (n) 42)
+    (for i 1 20 (f i))
+    (print (g))
+    """
+    outputs = [daemon.run_script(source, []) for _ in range(3)]
+    assert [('5\n42\n', '', 0)] * 3 == outputs
+
+
+def test_reused_functions_stay_compiled(fresh_cache, monkeypatch):
+    monkeypatch.setattr(evaluator, 'tier_threshold', 10)
+    daemon.run_script(GCD, ['a:832040', 'b:514229'])  # many calls
+    [script] = daemon.scripts.values()
+    gcd = script.functions[1]
+    code = gcd.code
+    assert code is not None
+    assert ('1\n', '', 0) == daemon.run_script(GCD, ['a:8', 'b:5'])
+    assert code is gcd.code
+
+
+@mark.parametrize("source, stdout, stderr, status", [
+    ('(print 1) (print', '1\n', '*** Unexpected end of source code.\n', 1),
+    ('(print 1))', '1\n', '*** Unexpected close parenthesis.\n', 0),
+])
+def test_run_script_parser_error(fresh_cache, source, stdout, stderr, status):
+    assert (stdout, stderr, status) == daemon.run_script(source, [])
+
+
+def test_cache_is_bounded(fresh_cache, monkeypatch):
+    monkeypatch.setattr(daemon, 'MAX_SCRIPTS', 2)
+    for n in range(3):
+        daemon.run_script(f'(print {n})', [])
+    assert 2 == len(daemon.scripts)
+
+
+def test_client_and_daemon(tmp_path):
+    path = str(tmp_path / 'd.sock')
+    script = tmp_path / 'gcd.subpas'
+    script.write_text(GCD)
+
+    async def main():
+        server = daemon.Daemon(max_workers=2)
+        loop = asyncio.get_running_loop()
+        try:
+            async with await server.start(path):
+                jobs = [loop.run_in_executor(None, client.request, str(script),
+                                             [f'a:{n}', 'b:12'], path)
+                        for n in (18, 8, 5)]
+                return await asyncio.gather(*jobs)
+        finally:
+            server.close()
+
+    results = asyncio.run(main())
+    assert [('6\n', '', 0), ('4\n', '', 0), ('1\n', '', 0)] == results
+
+
+def test_daemon_not_running(tmp_path):
+    script = tmp_path / 'one.subpas'
+    script.write_text('(print 1)')
+    with raises(errors.DaemonNotRunning):
+        client.request(str(script), [], str(tmp_path / 'none.sock'))
+
+
+def test_client_refuses_daemon_of_other_user(tmp_path, monkeypatch):
+    path = str(tmp_path / 'd.sock')
+    script = tmp_path / 'one.subpas'
+    script.write_text('(print 1)')
+    received = []
+
+    async def handle(reader, writer):
+        received.append(await reader.read())
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_unix_server(handle, path)
+        async with server:
+            await asyncio.to_thread(client.request, str(script), [], path)
+
+    uid = os.getuid()
+    monkeypatch.setattr(os, 'getuid', lambda: uid + 1)
+    with raises(errors.UntrustedDaemon):
+        asyncio.run(main())
+    assert [b''] == received
+
+
+def test_socket_dir_must_be_private(tmp_path):
+    daemon.check_socket_dir(str(tmp_path / 'new'))
+    assert 0o700 == (tmp_path / 'new').stat().st_mode & 0o777
+    (tmp_path / 'shared').mkdir()
+    (tmp_path / 'shared').chmod(0o777)
+    with raises(errors.InvalidOption):
+        daemon.check_socket_dir(str(tmp_path / 'shared'))
+
+
+def test_remove_stale_socket(tmp_path):
+    path = str(tmp_path / 'd.sock')
+    daemon.remove_stale_socket(path)  # no socket: nothing to do
+
+    async def main():
+        server = await asyncio.start_unix_server(lambda r, w: None, path)
+        async with server:
+            with raises(OSError):
+                daemon.remove_stale_socket(path)
+    asyncio.run(main())
+    daemon.remove_stale_socket(path)  # closed: removed
+    assert not (tmp_path / 'd.sock').exists()
@@ -1,5 +1,3 @@
-from typing import Optional
-
 class InterpreterException(Exception):
     """Generic interpreter exception."""
 
@@ -30,6 +28,14 @@ class UnexpectedEndOfSource(ParserException):
     """Unexpected end of source code."""
 
 
+class InvalidBinaryAST(ParserException):
+    """Invalid binary AST."""
+
+
+class InvalidDefinition(ParserException):
+    """Invalid function definition."""
+
+
 class EvaluatorException(InterpreterException):
     """Generic exception while evaluating."""
 
@@ -52,3 +58,43 @@ class TooManyArguments(EvaluatorException):
 
 class MissingArgument(EvaluatorException):
     """Missing argument."""
+
+
+class NotInvertible(EvaluatorException):
+    """Base is not invertible for modulus."""
+
+
+class ServerException(InterpreterException):
+    """Generic exception in the REPL server."""
+
+
+class EvaluationTimeout(ServerException):
+    """Evaluation timed out."""
+
+
+class TooManyConnections(ServerException):
+    """Too many connections."""
+
+
+class DaemonNotRunning(ServerException):
+    """Daemon not running."""
+
+
+class UntrustedDaemon(ServerException):
+    """Daemon run by another user."""
+
+
+class InvalidRequest(ServerException):
+    """Invalid request."""
+
+
+class WorkerDied(ServerException):
+    """Worker died."""
+
+
+class InvalidSnapshot(InterpreterException):
+    """Invalid or stale snapshot."""
+
+
+class InvalidOption(InterpreterException):
+    """Invalid command-line option."""
@@ -1,11 +1,18 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Sequence
+import gc
+import math
 import operator
-from typing import (
-    Any, Callable, Dict, List, Optional, Sequence, Type, Union, Tuple
-)
 
 import errors
+from output import OutputSink, StreamSink
 from parser import Expression
 
+TYPE_CHECKING = False  # `typing` is imported only by type checkers
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Type
+
 VARIADIC = -1  # arity of variadic functions or forms
 
 
@@ -22,39 +29,142 @@ def check_arity(form_name: str, arity: int, args: Sequence[Any]) -> None:
 
 
 class Operator:
+    """Built-in function implemented in Python.
+
+    The flags describe `function`, and optimizers rely on them: `pure`
+    means it has no side effects, `deterministic` that its result
+    depends only on its arguments, and `never_raises` that it returns a
+    value for any integer arguments, if their number matches `arity`.
+
+    `version` identifies the implementation of a registered `function`,
+    to tell results saved by resultcache.py from those of other versions.
+    """
 
-    def __init__(self, name: str, function: Callable, arity: int):
+    def __init__(self, name: str, function: Callable, arity: int, *,
+                 pure: bool = False,
+                 deterministic: bool = False,
+                 never_raises: bool = False):
         self.name = name
         self.function = function
         self.arity = arity
+        self.pure = pure
+        self.deterministic = deterministic
+        self.never_raises = never_raises
+        self.version: Optional[str] = None  # set by `register_builtin`
+
+    def __repr__(self) -> str:
+        return f'<Operator {self.name!r}>'
+
+    @property
+    def transparent(self) -> bool:
+        """True if a call can be replaced by its result, or vice versa."""
+        return self.pure and self.deterministic
 
     def __call__(self, *args: int) -> int:
         check_arity(self.name, self.arity, args)
         return self.function(*args)
 
 
+output: OutputSink = StreamSink()  # where `print` writes; may be replaced
+
+
 def print_fn(n: int) -> int:
-    print(n)
+    output.print(n)
     return n
 
 
+# flags of functions of their arguments only, defined for any integers
+TOTAL: Dict[str, bool] = dict(pure=True, deterministic=True,
+                              never_raises=True)
+# flags of functions of their arguments only, that may raise
+PARTIAL: Dict[str, bool] = dict(pure=True, deterministic=True)
+
 BUILT_INS = [
-    Operator('+', operator.add, 2),
-    Operator('-', operator.sub, 2),
-    Operator('*', operator.mul, 2),
-    Operator('/', operator.floordiv, 2),
-    Operator('=', operator.eq, 2),
-    Operator('<', operator.lt, 2),
-    Operator('>', operator.gt, 2),
-    Operator('>=', operator.ge, 2),
-    Operator('print', print_fn, 1),
+    Operator('+', operator.add, 2, **TOTAL),
+    Operator('-', operator.sub, 2, **TOTAL),
+    Operator('*', operator.mul, 2, **TOTAL),
+    Operator('/', operator.floordiv, 2, **PARTIAL),
+    Operator('=', operator.eq, 2, **TOTAL),
+    Operator('<', operator.lt, 2, **TOTAL),
+    Operator('>', operator.gt, 2, **TOTAL),
+    Operator('>=', operator.ge, 2, **TOTAL),
+    Operator('print', print_fn, 1, deterministic=True),
 ]
 
-OperatorEnv = Dict[str, Operator]
+
+def pow_fn(*args: int) -> int:
+    if len(args) < 2:
+        raise errors.MissingArgument("'pow' needs 2 or 3")
+    elif len(args) > 3:
+        raise errors.TooManyArguments("'pow' needs 2 or 3")
+    base, exponent, *modulus = args
+    if modulus:
+        if modulus[0] == 0:
+            raise ZeroDivisionError()
+        try:
+            return pow(base, exponent, modulus[0])
+        except ValueError as exc:  # base has no inverse
+            raise errors.NotInvertible(f'{base} mod {modulus[0]}') from exc
+    if exponent < 0:  # integer division, like `/`
+        return 1 // base ** -exponent
+    return base ** exponent
+
+
+def as_int(function: Callable[..., Any]) -> Callable[..., int]:
+    return lambda *args: int(function(*args))
+
+
+# Native versions of functions often defined in SubPascal. User functions
+# with these names take precedence, see `fetch_function`.
+NATIVE_LIB = [
+    Operator('mod', operator.mod, 2, **PARTIAL),
+    Operator('pow', pow_fn, VARIADIC, **PARTIAL),
+    Operator('gcd', math.gcd, 2, **TOTAL),
+    Operator('abs', abs, 1, **TOTAL),
+    Operator('min', min, 2, **TOTAL),
+    Operator('max', max, 2, **TOTAL),
+    Operator('<=', as_int(operator.le), 2, **TOTAL),
+    Operator('<>', as_int(operator.ne), 2, **TOTAL),
+    Operator('and', lambda a, b: int(bool(a and b)), 2, **TOTAL),
+    Operator('or', lambda a, b: int(bool(a or b)), 2, **TOTAL),
+    Operator('not', as_int(operator.not_), 1, **TOTAL),
+]
+
+OperatorEnv = dict[str, Operator]
 
 VALUE_OPS: OperatorEnv = {op.name: op for op in BUILT_INS}
+NATIVE_OPS: OperatorEnv = {op.name: op for op in NATIVE_LIB}
+
+
+def register_builtin(name: str, function: Callable[..., int], arity: int,
+                     *, native: bool = False, version: Optional[str] = None,
+                     **flags: bool) -> Operator:
+    """Make Python `function` callable from SubPascal as `name`.
+
+    `flags` are the keyword arguments of `Operator`; leave out any that
+    are not certain. Like the native library, a `native` built-in can be
+    replaced by `define`; otherwise it replaces functions defined with
+    the same name. Results of functions calling it are cached only if
+    it has a `version`, to change with its implementation. Return the
+    new `Operator`.
+    """
+    if name in SPECIAL_FORMS:
+        raise ValueError(f'{name!r} is a special form')
+    op = Operator(name, function, arity, **flags)
+    op.version = version
+    (NATIVE_OPS if native else VALUE_OPS)[name] = op
+    function_changed(name)
+    return op
+
 
-ValueEnv = Dict[str, int]
+def unregister_builtin(name: str) -> None:
+    """Remove built-ins called `name`, if any."""
+    removed = [ops.pop(name) for ops in (VALUE_OPS, NATIVE_OPS) if name in ops]
+    if removed:
+        function_changed(name)
+
+
+ValueEnv = dict[str, int]
 
 class SpecialForm:
     arity: int
@@ -107,8 +217,10 @@ class While(SpecialForm):
     arity = 2
 
     def apply(self, environment, condition, block):  # type: ignore
+        global back_edges
         while evaluate(environment, condition):
             evaluate(environment, block)
+            back_edges += 1
         return 0
 
 
@@ -118,10 +230,12 @@ class For(SpecialForm):
     def apply(self, environment, name, exp_first, exp_last, block):  # type: ignore
         i = Let.apply(self, environment, name, exp_first)
         last_val = evaluate(environment, exp_last)
+        global back_edges
         while i <= last_val:
             evaluate(environment, block)
             i += 1
             Let.apply(self, environment, name, i)
+            back_edges += 1
 
 
 SPECIAL_FORMS: Dict[str, SpecialForm] = {
@@ -133,6 +247,19 @@ SPECIAL_FORMS: Dict[str, SpecialForm] = {
 }
 
 
+# Tiered execution: a function is compiled by compiler.py after it is
+# called or loops often enough. `back_edges` counts loop iterations.
+tier_threshold = 1000  # 0 disables compilation
+tier_stats: Dict[str, float] = {
+    'promotions': 0,
+    'deoptimizations': 0,
+    'compile_seconds': 0.0,
+}
+back_edges = 0
+
+CompiledCode = Callable[[ValueEnv, ValueEnv], int]  # local, global envs
+
+
 class UserFunction:
 
     def __init__(self, name: str, formals: List[str], body: Expression):
@@ -140,6 +267,11 @@ class UserFunction:
         self.formals = formals
         self.arity = len(formals)
         self.body = body
+        self.calls = 0
+        self.back_edges = 0  # includes loops in functions called
+        self.code: Optional[CompiledCode] = None
+        # names called by compiled code, to the functions it binds
+        self.callees: Dict[str, Optional[Function]] = {}
 
     def __repr__(self) -> str:
         formals = ' '.join(self.formals)
@@ -147,22 +279,118 @@ class UserFunction:
 
     def __call__(self, *values: int) -> int:
         check_arity(self.name, self.arity, values)
+        if result_cache is not None:
+            return result_cache(self, values)
+        if (self.code is not None
+                or 0 < tier_threshold <= self.calls + self.back_edges + 1):
+            return self.invoke(values)
+        # `invoke` inlined: one Python frame less per call, as the depth
+        # of recursion is limited by the Python stack
+        self.calls += 1
         local_env = dict(zip(self.formals, values))
-        return evaluate(local_env, self.body)
+        loops_before = back_edges
+        result = evaluate(local_env, self.body)
+        self.back_edges += back_edges - loops_before
+        return result
 
-
-FunctionEnv = Dict[str, UserFunction]
+    def invoke(self, values: Sequence[int]) -> int:
+        local_env = dict(zip(self.formals, values))
+        if self.code is None:
+            self.calls += 1
+            if 0 < tier_threshold <= self.calls + self.back_edges:
+                import compiler  # compiler imports this module
+                compiler.promote(self)
+        if self.code is not None:
+            return self.code(local_env, global_env)
+        loops_before = back_edges
+        result = evaluate(local_env, self.body)
+        self.back_edges += back_edges - loops_before
+        return result
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Pickle without compiled code, made of local closures."""
+        state = self.__dict__.copy()
+        state.update(code=None, callees={}, calls=0, back_edges=0)
+        return state
+
+    def deoptimize(self) -> None:
+        """Drop compiled code and go back to interpreting."""
+        self.code = None
+        self.callees = {}
+        self.calls = self.back_edges = 0
+        tier_stats['deoptimizations'] += 1
+
+
+FunctionEnv = dict[str, UserFunction]
 
 global_env: ValueEnv = {}
 function_env: FunctionEnv = {}
 
+# incremented by each `define`, so caches can tell when to invalidate
+generation = 0
+
+# optional hook to replace a call to a UserFunction, see specializer.py
+Specializer = Callable[[UserFunction, list[Expression]],
+                       tuple[UserFunction, list[Expression]]]
+specializer: Optional[Specializer] = None
+
+# optional hook to cache results of UserFunction calls, see resultcache.py
+ResultCache = Callable[[UserFunction, Sequence[int]], int]
+result_cache: Optional[ResultCache] = None
+
+
+# Parsed programs are large, long-lived and free of reference cycles, so
+# there is no point in the cyclic garbage collector scanning them again
+# and again. If true, `freeze_program` moves them out of its reach. Set
+# by subpascal.py only, so programs embedding the interpreter, or
+# running it for long, keep their objects in reach of the collector.
+freeze_gc = False
+
+
+def pause_gc() -> None:
+    """Stop cyclic GC while loading a program, until `freeze_program`.
+
+    Loading allocates many objects and no garbage, so collecting while
+    loading only scans the objects about to be frozen.
+    """
+    if freeze_gc:
+        gc.disable()
+
+
+def freeze_program() -> None:
+    """Exempt all objects allocated so far from cyclic GC.
+
+    Call once, after loading forms or function bodies that will live
+    long. Garbage is collected first, not to be kept forever. Frozen
+    objects are still freed when their reference counts drop to 0.
+    """
+    if freeze_gc:
+        gc.collect()
+        gc.freeze()
+        gc.enable()
+
+
+def function_changed(name: str) -> None:
+    """Invalidate caches and compiled code that depend on `name`."""
+    global generation
+    generation += 1
+    for func in function_env.values():
+        if func.code is not None and name in func.callees:
+            func.deoptimize()
+
 
 def define_function(name: str, formals: List[str], body: Expression) -> str:
     user_fn = UserFunction(name, formals, body)
     function_env[name] = user_fn
+    function_changed(name)
     return repr(user_fn)
 
 
+def undefine_function(name: str) -> None:
+    del function_env[name]
+    function_changed(name)
+
+
 def fetch_variable(env: ValueEnv, name: str) -> int:
     try:
         return env[name]
@@ -173,17 +401,22 @@ def fetch_variable(env: ValueEnv, name: str) -> int:
             raise errors.UndefinedVariable(name) from exc
 
 
-Function = Union[Operator, UserFunction]
+Function = Operator | UserFunction
 
 
 def fetch_function(name: str) -> Function:
     try:
         return VALUE_OPS[name]
     except KeyError:
-        try:
-            return function_env[name]
-        except KeyError as exc:
-            raise errors.UndefinedFunction(name) from exc
+        pass
+    try:
+        return function_env[name]
+    except KeyError:
+        pass
+    try:
+        return NATIVE_OPS[name]
+    except KeyError as exc:
+        raise errors.UndefinedFunction(name) from exc
 
 def evaluate(env: ValueEnv, exp: Expression) -> int:
     """Compute value of `exp` in `env`; return a number."""
@@ -192,6 +425,8 @@ def evaluate(env: ValueEnv, exp: Expression) -> int:
             return statement(env, *args)
         case [symbol, *args]:
             func = fetch_function(symbol)
+            if specializer and isinstance(func, UserFunction):
+                func, args = specializer(func, args)
             values = (evaluate(env, x) for x in args)
             try:
                 return func(*values)
@@ -201,3 +436,11 @@ def evaluate(env: ValueEnv, exp: Expression) -> int:
             return fetch_variable(env, exp)
         case int():
             return exp
+
+
+def evaluate_form(env: ValueEnv, exp: Expression) -> int:
+    """Evaluate top-level form `exp`; replaced by metrics.py to time it.
+
+    Callers look it up in this module at each call, like `evaluate`.
+    """
+    return evaluate(env, exp)
@@ -1,5 +1,9 @@
+import itertools
+import sys
+
 from pytest import mark, raises, fixture
 
+import evaluator
 from evaluator import evaluate, define_function, UserFunction
 import errors
 
@@ -195,3 +199,164 @@ def test_evaluate_if_missing_argument():
     with raises(errors.MissingArgument) as excinfo:
         evaluate({}, ast)
     assert str(excinfo.value) == "Missing argument: 'if' needs 3."
+
+
+# _____________________________________________________ Native library
+
+SUBPASCAL_LIB = {
+    'mod': (['m', 'n'], ['-', 'm', ['*', 'n', ['/', 'm', 'n']]]),
+    'abs': (['x'], ['if', ['<', 'x', 0], ['-', 0, 'x'], 'x']),
+    'min': (['x', 'y'], ['if', ['<', 'x', 'y'], 'x', 'y']),
+    'max': (['x', 'y'], ['if', ['>', 'x', 'y'], 'x', 'y']),
+    '<=': (['x', 'y'], ['if', ['>', 'x', 'y'], 0, 1]),
+    '<>': (['x', 'y'], ['if', ['=', 'x', 'y'], 0, 1]),
+    'and': (['a', 'b'], ['if', 'a', ['if', 'b', 1, 0], 0]),
+    'or': (['a', 'b'], ['if', 'a', 1, ['if', 'b', 1, 0]]),
+    'not': (['a'], ['if', 'a', 0, 1]),
+}
+
+SAMPLE_ARGS = [-7, -2, -1, 0, 1, 3, 12]
+
+
+@mark.parametrize("name", SUBPASCAL_LIB)
+def test_native_matches_subpascal_definition(name):
+    formals, body = SUBPASCAL_LIB[name]
+    defined = UserFunction(name, formals, body)
+    native = evaluator.NATIVE_OPS[name]
+    for args in itertools.product(SAMPLE_ARGS, repeat=len(formals)):
+        if name == 'mod' and args[1] == 0:
+            continue
+        assert defined(*args) == native(*args), args
+
+
+@mark.parametrize("ast, want", [
+    (['gcd', 18, 45], 9),
+    (['gcd', 0, 7], 7),
+    (['pow', 2, 10], 1024),
+    (['pow', 2, 0], 1),
+    (['pow', 2, -1], 0),
+    (['pow', 3, 200, 1000], 1),
+    (['pow', 3, -1, 7], 5),
+])
+def test_native_functions(ast, want):
+    assert want == evaluate({}, ast)
+
+
+@mark.parametrize("ast, error, message", [
+    (['pow', 2], errors.MissingArgument,
+     "Missing argument: 'pow' needs 2 or 3."),
+    (['pow', 1, 2, 3, 4], errors.TooManyArguments,
+     "Too many arguments: 'pow' needs 2 or 3."),
+    (['pow', 2, 3, 0], errors.DivisionByZero, "Division by zero."),
+    (['pow', 2, -1, 4], errors.NotInvertible,
+     "Base is not invertible for modulus: '2 mod 4'."),
+    (['mod', 1, 0], errors.DivisionByZero, "Division by zero."),
+    (['abs', 1, 2], errors.TooManyArguments,
+     "Too many arguments: 'abs' needs 1."),
+])
+def test_native_function_errors(ast, error, message):
+    with raises(error) as excinfo:
+        evaluate({}, ast)
+    assert message == str(excinfo.value)
+
+
+def test_user_function_overrides_native():
+    # backup function_env
+    initial_fundefs = evaluator.function_env
+    evaluator.function_env = {}
+    # test
+    assert 2 == evaluate({}, ['abs', -2])
+    define_function('abs', ['x'], ['*', 'x', 10])
+    assert -20 == evaluate({}, ['abs', -2])
+    # restore function_env
+    evaluator.function_env = initial_fundefs
+
+
+@fixture
+def builtins():
+    # backup function_env and the built-in operators
+    saved = (evaluator.function_env, dict(evaluator.VALUE_OPS),
+             dict(evaluator.NATIVE_OPS))
+    evaluator.function_env = {}
+    yield
+    # restore them
+    evaluator.function_env = saved[0]
+    for ops, backup in zip((evaluator.VALUE_OPS, evaluator.NATIVE_OPS),
+                           saved[1:]):
+        ops.clear()
+        ops.update(backup)
+
+
+def test_register_builtin(builtins):
+    table = [2, 3, 5, 7, 11]
+    op = evaluator.register_builtin('prime', table.__getitem__, 1,
+                                    pure=True, deterministic=True)
+    assert op.transparent and not op.never_raises
+    assert 7 == evaluate({}, ['prime', 3])
+    assert op is evaluator.fetch_function('prime')
+    with raises(errors.MissingArgument):
+        evaluate({}, ['prime'])
+
+
+def test_register_builtin_flags_default_to_false(builtins):
+    op = evaluator.register_builtin('zero', lambda: 0, 0)
+    assert not (op.pure or op.deterministic or op.never_raises)
+    assert not op.transparent
+
+
+@mark.parametrize("native, result", [(True, 2), (False, 1)])
+def test_register_builtin_precedence(builtins, native, result):
+    evaluator.register_builtin('one', lambda: 1, 0, native=native)
+    define_function('one', [], 2)
+    assert result == evaluate({}, ['one'])
+
+
+def test_register_builtin_special_form(builtins):
+    with raises(ValueError):
+        evaluator.register_builtin('if', lambda: 0, 0)
+
+
+def test_register_builtin_invalidates_callers(builtins):
+    define_function('f', [], ['g'])
+    define_function('g', [], 1)
+    func = evaluator.function_env['f']
+    func.code = lambda env, genv: 1  # as if compiled, calling `g`
+    func.callees = {'g': evaluator.function_env['g']}
+    generation = evaluator.generation
+    evaluator.register_builtin('g', lambda: 2, 0)
+    assert func.code is None
+    assert evaluator.generation > generation
+    assert 2 == evaluate({}, ['f'])
+
+
+def test_unregister_builtin(builtins):
+    evaluator.register_builtin('one', lambda: 1, 0)
+    evaluator.register_builtin('one', lambda: 1, 0, native=True)
+    evaluator.unregister_builtin('one')
+    evaluator.unregister_builtin('one')  # no error if missing
+    with raises(errors.UndefinedFunction):
+        evaluate({}, ['one'])
+
+
+@mark.parametrize("name", ['+', '/', 'print', 'mod', 'pow', 'not'])
+def test_builtin_flags(name):
+    op = evaluator.VALUE_OPS.get(name) or evaluator.NATIVE_OPS[name]
+    assert op.deterministic
+    assert op.pure == (name != 'print')
+    assert op.never_raises == (name in {'+', 'not'})
+
+
+def stack_depth():
+    frame, depth = sys._getframe(), 0
+    while frame is not None:
+        frame, depth = frame.f_back, depth + 1
+    return depth
+
+
+def test_interpreted_call_uses_two_frames(fresh_env, monkeypatch):
+    # deep recursion is limited by the Python stack
+    monkeypatch.setitem(evaluator.NATIVE_OPS, 'depth',
+                        evaluator.Operator('depth', stack_depth, 0))
+    define_function('inner', [], ['depth'])
+    define_function('outer', [], ['inner'])
+    assert 2 == evaluate({}, ['outer']) - evaluate({}, ['inner'])
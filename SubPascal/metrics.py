@@ -0,0 +1,266 @@
+"""Interpreter metrics, exported in the Prometheus text format.
+
+A `Collector` counts evaluation steps, calls, special forms and errors
+in plain local counters, by replacing `evaluator.evaluate` and
+`UserFunction.__call__` while installed, so the interpreter pays nothing
+when metrics are off. Top-level forms are those evaluated by
+`evaluator.evaluate_form`. Counts are merged into a `Registry` every
+`FLUSH_EVERY` steps and after each top-level form; the registry can be
+served over HTTP, or written to a file at most every `WRITE_INTERVAL`
+seconds when merged.
+"""
+
+import collections
+import http.server
+import os
+import threading
+import time
+from typing import Any, Counter, Dict, List, Optional, Sequence, Tuple
+
+from evaluator import (
+    NATIVE_OPS, SPECIAL_FORMS, VALUE_OPS, UserFunction, ValueEnv,
+)
+import errors
+import evaluator
+
+FLUSH_EVERY = 10_000  # steps
+WRITE_INTERVAL = 5.0  # seconds between writes of the metrics file
+LATENCY_BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1.0, 10.0, 100.0)  # seconds
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def escape(value: str) -> str:
+    return (value.replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{escape(value)}"' for name, value in labels)
+    return '{' + pairs + '}'
+
+
+class Metric:
+
+    def __init__(self, name: str, help_text: str, kind: str):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help_text}',
+                f'# TYPE {self.name} {self.kind}']
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class CounterMetric(Metric):
+    """Counter with values by one label, or no label."""
+
+    def __init__(self, name: str, help_text: str, label: str = ''):
+        super().__init__(name, help_text, 'counter')
+        self.label = label
+        self.values: Counter[str] = collections.Counter()
+
+    def add(self, counts: Dict[str, int]) -> None:
+        self.values.update(counts)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        if not self.label:
+            lines.append(f'{self.name} {self.values[""]}')
+        for key, value in sorted(self.values.items()):
+            if self.label:
+                labels = format_labels(((self.label, key),))
+                lines.append(f'{self.name}{labels} {value}')
+        return lines
+
+
+class HistogramMetric(Metric):
+
+    def __init__(self, name: str, help_text: str,
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, 'histogram')
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)  # not cumulative
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.total += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f'{self.name}_sum {self.total}')
+        lines.append(f'{self.name}_count {self.count}')
+        return lines
+
+
+class Registry:
+    """Metrics of the interpreter; safe to read from another thread."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.steps = CounterMetric(
+            'subpascal_steps_total', 'Expressions evaluated.')
+        self.function_calls = CounterMetric(
+            'subpascal_function_calls_total',
+            'Calls of user-defined functions.', 'function')
+        self.builtin_calls = CounterMetric(
+            'subpascal_builtin_calls_total',
+            'Calls of built-in operators.', 'operator')
+        self.special_forms = CounterMetric(
+            'subpascal_special_forms_total',
+            'Special forms executed.', 'form')
+        self.errors = CounterMetric(
+            'subpascal_errors_total',
+            'Errors raised by top-level forms.', 'error')
+        self.form_seconds = HistogramMetric(
+            'subpascal_form_seconds',
+            'Time to evaluate top-level forms.')
+        self.metrics: List[Metric] = [
+            self.steps, self.function_calls, self.builtin_calls,
+            self.special_forms, self.errors, self.form_seconds,
+        ]
+
+    def render(self) -> str:
+        with self.lock:
+            lines = [line for m in self.metrics for line in m.render()]
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        """Replace file at `path` with the current metrics."""
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as out_file:
+            out_file.write(self.render())
+        os.replace(temp_path, path)
+
+
+class Collector:
+    """Count interpreter events while used as a context manager.
+
+    Calls of functions compiled by compiler.py are counted, but the
+    steps, operators and special forms inside them are not.
+    """
+
+    def __init__(self, registry: Registry, path: Optional[str] = None,
+                 interval: float = WRITE_INTERVAL):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.last_write = time.monotonic()
+        self.steps = 0
+        self.calls: Counter[str] = collections.Counter()
+        self.builtins: Counter[str] = collections.Counter()
+        self.forms: Counter[str] = collections.Counter()
+        self.errors: Counter[str] = collections.Counter()
+        self.latencies: List[float] = []
+
+    def __enter__(self) -> 'Collector':
+        self.evaluate = evaluator.evaluate
+        self.evaluate_form = evaluator.evaluate_form
+        self.call = UserFunction.__call__
+        evaluator.evaluate = self.counting_evaluate
+        evaluator.evaluate_form = self.timed_evaluate
+        collector = self
+
+        def counting_call(func: UserFunction, *values: int) -> int:
+            collector.calls[func.name] += 1
+            return collector.call(func, *values)
+
+        UserFunction.__call__ = counting_call  # type: ignore[assignment]
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        evaluator.evaluate = self.evaluate
+        evaluator.evaluate_form = self.evaluate_form
+        UserFunction.__call__ = self.call  # type: ignore[assignment]
+        self.flush()
+        if self.path is not None:
+            self.write()
+
+    def counting_evaluate(self, env: ValueEnv, exp: Any) -> int:
+        self.steps += 1
+        if type(exp) is list and exp and type(exp[0]) is str:
+            head = exp[0]
+            if head in SPECIAL_FORMS:
+                self.forms[head] += 1
+            elif head in VALUE_OPS or (head in NATIVE_OPS and
+                                       head not in evaluator.function_env):
+                self.builtins[head] += 1
+        if self.steps >= FLUSH_EVERY:
+            self.flush()
+        return self.evaluate(env, exp)
+
+    def timed_evaluate(self, env: ValueEnv, exp: Any) -> int:
+        """Evaluate top-level form `exp`, timing it and counting errors."""
+        start = time.perf_counter()
+        try:
+            return self.counting_evaluate(env, exp)
+        except errors.InterpreterException as exc:
+            self.errors[type(exc).__name__] += 1
+            raise
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+            self.flush()
+
+    def flush(self) -> None:
+        """Merge local counts into the registry; write the file if due."""
+        registry = self.registry
+        with registry.lock:
+            registry.steps.add({'': self.steps})
+            registry.function_calls.add(self.calls)
+            registry.builtin_calls.add(self.builtins)
+            registry.special_forms.add(self.forms)
+            registry.errors.add(self.errors)
+            for latency in self.latencies:
+                registry.form_seconds.observe(latency)
+        self.steps = 0
+        for counter in (self.calls, self.builtins, self.forms, self.errors):
+            counter.clear()
+        self.latencies.clear()
+        if (self.path is not None and
+                time.monotonic() - self.last_write >= self.interval):
+            self.write()
+
+    def write(self) -> None:
+        assert self.path is not None
+        self.registry.write(self.path)
+        self.last_write = time.monotonic()
+
+
+def serve(registry: Registry, port: int,
+          host: str = '127.0.0.1') -> http.server.ThreadingHTTPServer:
+    """Serve metrics over HTTP from a daemon thread; return the server."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+
+        def do_GET(self) -> None:
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: Any) -> None:
+            pass  # keep stderr for the interpreter
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
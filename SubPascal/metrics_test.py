@@ -0,0 +1,97 @@
+import urllib.request
+
+from evaluator import define_function, evaluate
+from metrics import Collector, Registry, escape, serve
+from repl import eval_source
+import errors
+import evaluator
+import metrics
+
+
+def run_forms(*forms):
+    for form in forms:
+        try:
+            evaluator.evaluate_form({}, form)
+        except errors.EvaluatorException:
+            pass
+
+
+def test_collector(fresh_env):
+    registry = Registry()
+    define_function('double', ['n'], ['*', 'n', 2])
+    with Collector(registry):
+        run_forms(['let', 'x', ['double', 21]], ['if', 'x', 'y', 0])
+    assert evaluate is evaluator.evaluate
+    assert 9 == registry.steps.values['']
+    assert {'double': 1} == registry.function_calls.values
+    assert {'*': 1} == registry.builtin_calls.values
+    assert {'let': 1, 'if': 1} == registry.special_forms.values
+    assert {'UndefinedVariable': 1} == registry.errors.values
+    assert 2 == registry.form_seconds.count
+
+
+def test_forms_evaluated_by_repl(fresh_env):
+    registry = Registry()
+    with Collector(registry):
+        eval_source('(define f (n) (* n 2))')
+        assert '8' == eval_source('(f (f 2))')
+    assert 1 == registry.form_seconds.count
+    assert {'f': 2} == registry.function_calls.values
+
+
+def test_file_written_during_long_form(fresh_env, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'FLUSH_EVERY', 10)
+    path = tmp_path / 'metrics.prom'
+    written = []
+
+    def check():
+        if path.exists():  # not before the first flush
+            written.append(path.read_text())
+        return 0
+
+    evaluator.register_builtin('check', check, 0)
+    try:
+        with Collector(Registry(), str(path), interval=0):
+            run_forms(['for', 'i', 1, 20, ['check']])
+    finally:
+        evaluator.unregister_builtin('check')
+    assert 'subpascal_form_seconds_count 0\n' in written[-1]
+    assert 'subpascal_steps_total 0\n' not in written[-1]
+
+
+def test_render(fresh_env):
+    registry = Registry()
+    with Collector(registry):
+        run_forms(['+', 1, 2])
+    text = registry.render()
+    assert 'subpascal_steps_total 3\n' in text
+    assert 'subpascal_builtin_calls_total{operator="+"} 1\n' in text
+    assert '# TYPE subpascal_form_seconds histogram\n' in text
+    assert 'subpascal_form_seconds_bucket{le="+Inf"} 1\n' in text
+    assert 'subpascal_form_seconds_count 1\n' in text
+
+
+def test_escape():
+    assert r'a\"b\\c\n' == escape('a"b\\c\n')
+
+
+def test_write_file(fresh_env, tmp_path):
+    path = tmp_path / 'metrics.prom'
+    with Collector(Registry(), str(path)):
+        run_forms(['+', 1, 2])
+    assert 'subpascal_steps_total 3\n' in path.read_text()
+
+
+def test_serve(fresh_env):
+    registry = Registry()
+    with Collector(registry):
+        run_forms(['+', 1, 2])
+    server = serve(registry, 0)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics') as r:
+            text = r.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 'subpascal_steps_total 3\n' in text
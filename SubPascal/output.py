@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import io
+import os
+import sys
+
+TYPE_CHECKING = False  # `typing` is imported only by type checkers
+if TYPE_CHECKING:
+    from decimal import Context, Decimal
+    from typing import Dict, List, Optional, TextIO
+
+BUFFER_SIZE = 1 << 16  # characters
+
+# Integers up to this many bits are converted by `str`. It is quadratic,
+# and refuses to convert more digits than `sys.get_int_max_str_digits()`,
+# which is at least 640: 2048 bits are at most 617 digits.
+LEAF_BITS = 2048
+
+# Decimal values of 2 ** (LEAF_BITS << k), by k, computed as needed.
+powers_of_two: Dict[int, Decimal] = {}
+
+
+def power_of_two(k: int, context: Context) -> Decimal:
+    """Return 2 ** (LEAF_BITS << k) as a `Decimal`."""
+    if k not in powers_of_two:
+        if k == 0:
+            powers_of_two[k] = context.create_decimal(1 << LEAF_BITS)
+        else:
+            half = power_of_two(k - 1, context)
+            powers_of_two[k] = context.multiply(half, half)
+    return powers_of_two[k]
+
+
+def int_to_decimal(value: int, k: int, context: Context) -> Decimal:
+    """Convert `value`, 0 <= value < 2 ** (LEAF_BITS << k), to `Decimal`."""
+    if k == 0:
+        return context.create_decimal(value)
+    width = LEAF_BITS << (k - 1)
+    high = value >> width
+    low = value - (high << width)
+    high_part = context.multiply(int_to_decimal(high, k - 1, context),
+                                 power_of_two(k - 1, context))
+    return context.add(high_part, int_to_decimal(low, k - 1, context))
+
+
+def int_to_str(value: int) -> str:
+    """Return decimal digits of `value`, however large.
+
+    Large values are split in halves by powers of two, recursively, and
+    the halves are combined with exact `decimal` arithmetic, which
+    multiplies huge numbers in subquadratic time; converting a `Decimal`
+    to `str` takes linear time. The digit limit of `str` does not apply.
+    """
+    bits = value.bit_length()
+    if bits <= LEAF_BITS:
+        return str(value)
+    import decimal  # slow to import, and seldom needed
+    k = 0
+    while LEAF_BITS << k < bits:
+        k += 1
+    context = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX,
+                              traps=[decimal.Inexact])
+    digits = str(int_to_decimal(abs(value), k, context))
+    return '-' + digits if value < 0 else digits
+
+
+def format_int(value: int, radix: int = 10) -> str:
+    """Format `value` in radix 10, or 16 with a `0x` prefix."""
+    if radix == 16:
+        return f'{value:#x}'
+    return int_to_str(value)
+
+
+class OutputSink:
+    """Where the `print` builtin writes values.
+
+    Lines are kept in a buffer until it holds `buffer_size` characters,
+    or `flush` is called. If `line_flush` is true, or `buffer_size` is 0,
+    every line is written at once. By default lines are flushed at once
+    only when writing to a terminal. Values are written in `radix`, 10
+    or 16.
+    """
+
+    radix = 10
+
+    def __init__(self, buffer_size: int = BUFFER_SIZE,
+                 line_flush: Optional[bool] = None):
+        self.buffer_size = buffer_size
+        if line_flush is None:
+            line_flush = buffer_size == 0 or self.isatty()
+        self.line_flush = line_flush or buffer_size == 0
+        self.buffer: List[str] = []
+        self.buffered = 0
+
+    def isatty(self) -> bool:
+        return False
+
+    def emit(self, text: str) -> None:
+        """Write `text` to the destination."""
+        raise NotImplementedError
+
+    def print(self, value: int) -> None:
+        if self.radix == 10 and value.bit_length() <= LEAF_BITS:
+            text = f'{value}\n'
+        else:
+            text = format_int(value, self.radix) + '\n'
+        if self.line_flush:
+            if self.buffer:
+                self.flush()
+            self.emit(text)
+            return
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            text = ''.join(self.buffer)
+            self.buffer.clear()
+            self.buffered = 0
+            self.emit(text)
+
+
+class StreamSink(OutputSink):
+    """Write to a text stream; by default, whatever `sys.stdout` is now.
+
+    Looking up `sys.stdout` on each write keeps `contextlib.redirect_stdout`
+    and pytest's `capsys` working.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None,
+                 buffer_size: int = 0,
+                 line_flush: Optional[bool] = None):
+        self.stream = stream
+        super().__init__(buffer_size, line_flush)
+
+    def isatty(self) -> bool:
+        return (self.stream or sys.stdout).isatty()
+
+    def emit(self, text: str) -> None:
+        (self.stream or sys.stdout).write(text)
+
+    def flush(self) -> None:
+        super().flush()
+        (self.stream or sys.stdout).flush()
+
+
+class FdSink(OutputSink):
+    """Write UTF-8 bytes straight to file descriptor `fd`."""
+
+    def __init__(self, fd: int, buffer_size: int = BUFFER_SIZE,
+                 line_flush: Optional[bool] = None):
+        self.fd = fd
+        super().__init__(buffer_size, line_flush)
+
+    def isatty(self) -> bool:
+        return os.isatty(self.fd)
+
+    def emit(self, text: str) -> None:
+        data = memoryview(text.encode('utf-8'))
+        while data:
+            data = data[os.write(self.fd, data):]
+
+
+class MemorySink(OutputSink):
+    """Keep output in memory, to embed the interpreter."""
+
+    def __init__(self) -> None:
+        self.memory = io.StringIO()
+        super().__init__(BUFFER_SIZE, line_flush=False)
+
+    def emit(self, text: str) -> None:
+        self.memory.write(text)
+
+    def getvalue(self) -> str:
+        self.flush()
+        return self.memory.getvalue()
+
+
+def stdout_sink(buffer_size: int = BUFFER_SIZE) -> OutputSink:
+    """Buffered sink for standard output, using its file descriptor."""
+    sys.stdout.flush()
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return StreamSink(buffer_size=buffer_size)
+    return FdSink(fd, buffer_size)
@@ -0,0 +1,106 @@
+import io
+import math
+import os
+import sys
+
+from pytest import fixture, mark
+
+from output import FdSink, MemorySink, StreamSink, format_int, int_to_str
+import evaluator
+
+
+@fixture
+def memory_output():
+    previous = evaluator.output
+    evaluator.output = MemorySink()
+    yield evaluator.output
+    evaluator.output = previous
+
+
+def test_stream_sink_default_is_current_stdout(capsys):
+    sink = StreamSink()
+    sink.print(1)
+    assert '1\n' == capsys.readouterr().out
+    sink.print(2)
+    assert '2\n' == capsys.readouterr().out
+
+
+def test_stream_sink_buffered():
+    stream = io.StringIO()
+    sink = StreamSink(stream, buffer_size=8, line_flush=False)
+    sink.print(12)
+    sink.print(34)
+    assert '' == stream.getvalue()
+    sink.print(56)
+    assert '12\n34\n56\n' == stream.getvalue()
+    sink.print(7)
+    sink.flush()
+    assert '12\n34\n56\n7\n' == stream.getvalue()
+
+
+def test_stream_sink_line_flush():
+    stream = io.StringIO()
+    sink = StreamSink(stream, buffer_size=100, line_flush=True)
+    sink.print(12)
+    assert '12\n' == stream.getvalue()
+
+
+def test_fd_sink(tmp_path):
+    path = tmp_path / 'out.txt'
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT)
+    try:
+        sink = FdSink(fd, buffer_size=100)
+        assert not sink.line_flush
+        for n in [1, -2, 3 ** 50]:
+            sink.print(n)
+        assert '' == path.read_text()
+        sink.flush()
+    finally:
+        os.close(fd)
+    assert f'1\n-2\n{3 ** 50}\n' == path.read_text()
+
+
+def test_print_builtin_to_memory(memory_output, capsys):
+    evaluator.evaluate({}, ['print', ['*', 6, 7]])
+    evaluator.evaluate({}, ['print', ['<', 1, 2]])
+    assert '42\nTrue\n' == memory_output.getvalue()
+    assert '' == capsys.readouterr().out
+
+
+def str_unlimited(value):
+    limit = sys.get_int_max_str_digits()
+    sys.set_int_max_str_digits(0)
+    try:
+        return str(value)
+    finally:
+        sys.set_int_max_str_digits(limit)
+
+
+@mark.parametrize("value", [
+    0, 7, -7, 2 ** 2048 - 1, 2 ** 2048, -(2 ** 2048), 10 ** 4300,
+    10 ** 5000 - 1, -math.factorial(3000), 3 ** 30_000,
+], ids=lambda value: f'{value.bit_length()} bits')  # `str` fails
+def test_int_to_str(value):
+    assert str_unlimited(value) == int_to_str(value)
+
+
+@mark.parametrize("value, radix, text", [
+    (255, 10, '255'),
+    (255, 16, '0xff'),
+    (-255, 16, '-0xff'),
+    (2 ** 100_000, 16, '0x1' + '0' * 25_000),
+], ids=['decimal', 'hex', 'negative hex', 'huge hex'])
+def test_format_int(value, radix, text):
+    assert text == format_int(value, radix)
+
+
+def test_print_huge_value(memory_output):
+    value = 10 ** 20_000
+    evaluator.evaluate({}, ['print', value])
+    assert '1' + '0' * 20_000 + '\n' == memory_output.getvalue()
+
+
+def test_print_hex(memory_output):
+    memory_output.radix = 16
+    evaluator.evaluate({}, ['print', 4096])
+    assert '0x1000\n' == memory_output.getvalue()
@@ -0,0 +1,112 @@
+import os
+import pickle
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from parser import Expression, parse_exp, tokenize
+import binast
+import errors
+
+MIN_CHUNK_SIZE = 1 << 20  # characters
+CHUNKS_PER_WORKER = 4
+
+PARENS = re.compile('[()]')
+
+
+def split_points(source: str, targets: List[int]) -> List[int]:
+    """Find where to split `source` into chunks of whole top-level forms.
+
+    For each target offset, return the end of the first top-level form
+    that ends after it. Parens are always tokens by themselves, so
+    counting them gives the nesting depth anywhere in the source.
+    """
+    points = []
+    depth = 0
+    pos = 0  # `depth` is the nesting depth at `pos`
+    for target in targets:
+        if target <= pos:
+            continue
+        depth += source.count('(', pos, target)
+        depth -= source.count(')', pos, target)
+        pos = target
+        if depth < 0:
+            break  # unexpected ')': let the parser report it
+        for match in PARENS.finditer(source, pos):
+            depth += 1 if match.group() == '(' else -1
+            if depth <= 0:
+                pos = match.end()
+                break
+        else:
+            break  # unclosed '(': let the parser report it
+        if depth < 0:
+            break
+        points.append(pos)
+    return points
+
+
+def split_source(source: str, chunk_count: int) -> List[str]:
+    size = len(source) // chunk_count + 1
+    targets = list(range(size, len(source), size))
+    starts = [0] + split_points(source, targets)
+    ends = starts[1:] + [len(source)]
+    return [source[start:end] for start, end in zip(starts, ends)]
+
+
+ParsedChunk = Tuple[bytes, Optional[errors.ParserException]]
+
+
+def parse_chunk(source: str) -> ParsedChunk:
+    """Parse `source`; return the pickled forms, and any error.
+
+    Symbols are interned so each is pickled once. Forms nested too deeply
+    to pickle are returned in the binary AST format instead.
+    """
+    tokens = deque(map(sys.intern, tokenize(source)))
+    forms: List[Expression] = []
+    error = None
+    try:
+        while tokens:
+            forms.append(parse_exp(tokens))
+    except errors.ParserException as exc:
+        error = exc
+    try:
+        return pickle.dumps(forms, pickle.HIGHEST_PROTOCOL), error
+    except RecursionError:
+        return binast.dumps(forms), error
+
+
+def load_chunk(data: bytes) -> List[Expression]:
+    if data.startswith(binast.MAGIC):
+        return binast.loads(data)
+    return pickle.loads(data)
+
+
+def parse_parallel(source: str,
+                   workers: Optional[int] = None) -> Iterator[Expression]:
+    """Parse top-level forms of `source` in a pool of processes.
+
+    Yield forms in source order. A parser error is raised after the
+    forms before it are yielded, as it would be parsing sequentially.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunk_count = min(workers * CHUNKS_PER_WORKER,
+                      len(source) // MIN_CHUNK_SIZE + 1)
+    chunks = split_source(source, chunk_count)
+    if workers == 1 or len(chunks) == 1:
+        tokens = tokenize(source)
+        while tokens:
+            yield parse_exp(tokens)
+        return
+    with ProcessPoolExecutor(min(workers, len(chunks))) as pool:
+        # chunks are loaded here while later ones are being parsed
+        yield from iter_results(pool.map(parse_chunk, chunks))
+
+
+def iter_results(results: Iterable[ParsedChunk]) -> Iterator[Expression]:
+    for data, error in results:
+        yield from load_chunk(data)
+        if error is not None:
+            raise error
@@ -0,0 +1,72 @@
+from pytest import fixture, mark, raises
+
+from parallel_parse import parse_parallel, split_points, split_source
+from parser import parse_exp, tokenize
+import errors
+import parallel_parse
+
+SOURCE = """
+(define double (n) (* n 2))
+(let x 1)
+x
+(while (< x 100)
+    (let x (double x)))
+(print (double (double x)))
+"""
+
+
+def parse_all(source):
+    tokens = tokenize(source)
+    forms = []
+    while tokens:
+        forms.append(parse_exp(tokens))
+    return forms
+
+
+@fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(parallel_parse, 'MIN_CHUNK_SIZE', 10)
+
+
+@mark.parametrize("source, targets, points", [
+    ('(a) (b) (c)', [1, 5], [3, 7]),
+    ('(a) (b) (c)', [1, 2], [3]),
+    ('(a (b)) c (d)', [5], [7]),
+    ('x y (z)', [1], [7]),
+    ('(a) b', [4], []),
+    ('(a)) (b) (c)', [5], []),
+    ('(a) ((b) (c)', [1, 6], [3]),
+])
+def test_split_points(source, targets, points):
+    assert points == split_points(source, targets)
+
+
+def test_split_source():
+    chunks = split_source(SOURCE, 4)
+    assert SOURCE == ''.join(chunks)
+    assert parse_all(SOURCE) == [f for c in chunks for f in parse_all(c)]
+
+
+@mark.parametrize("workers", [1, 2, 3, 8])
+def test_parse_parallel(small_chunks, workers):
+    source = SOURCE * 20
+    assert parse_all(source) == list(parse_parallel(source, workers))
+
+
+@mark.parametrize("source, error", [
+    (SOURCE + ')' + SOURCE, errors.UnexpectedCloseParen),
+    (SOURCE + '(' + SOURCE, errors.UnexpectedEndOfSource),
+])
+def test_parse_parallel_error(small_chunks, source, error):
+    forms = parse_parallel(source, 2)
+    assert parse_all(SOURCE) == [next(forms) for _ in parse_all(SOURCE)]
+    with raises(error):
+        next(forms)
+
+
+def test_parse_parallel_deep_nesting(small_chunks):
+    depth = 100_000
+    source = '(begin ' * depth + '1' + ')' * depth + ' (print 2)' * 10
+    forms = list(parse_parallel(source, 2))
+    assert ['print', 2] == forms[-1]
+    assert 11 == len(forms)
@@ -1,13 +1,28 @@
 #!/usr/bin/env python3
 
+from __future__ import annotations
+
 import collections
-from typing import Deque, List, Union
+import contextlib
+import mmap
+import os
 
 import errors
 
+# `typing` is imported only by type checkers, to keep startup fast.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Deque, Iterator, List, Protocol, TypeGuard
+
+    class Tokens(Protocol):
+        """Tokens consumed by `parse_exp`; false when there are no more."""
+
+        def popleft(self) -> str:
+            ...
 
-Atom = Union[str, int]
-Expression = Union[Atom, List]
+
+Atom = str | int
+Expression = Atom | list
 
 
 def tokenize(source: str) -> Deque[str]:
@@ -15,6 +30,57 @@ def tokenize(source: str) -> Deque[str]:
     return collections.deque(spaced.split())
 
 
+SEPARATORS = frozenset(b' \t\n\r\v\f()')
+BLOCK_SIZE = 1 << 16  # bytes
+
+
+class BytesTokens:
+    """Tokens found lazily in a bytes-like `buffer`, such as an `mmap`.
+
+    The buffer is tokenized a block at a time, each block ending between
+    tokens, so memory used does not depend on the size of the buffer.
+    """
+
+    def __init__(self, buffer: bytes | memoryview | mmap.mmap,
+                 block_size: int = BLOCK_SIZE):
+        self.buffer = buffer
+        self.block_size = block_size
+        self.pos = 0
+        self.block: Deque[str] = collections.deque()
+        self.fill()
+
+    def fill(self) -> None:
+        size = len(self.buffer)
+        while not self.block and self.pos < size:
+            end = self.pos + self.block_size
+            buffer = self.buffer
+            while end < size and buffer[end] not in SEPARATORS:
+                end += 1
+            self.block = tokenize(str(self.buffer[self.pos:end], 'utf-8'))
+            self.pos = end
+
+    def __bool__(self) -> bool:
+        return bool(self.block)
+
+    def popleft(self) -> str:
+        token = self.block.popleft()
+        if not self.block:
+            self.fill()
+        return token
+
+
+@contextlib.contextmanager
+def tokenize_file(path: str) -> Iterator[BytesTokens]:
+    """Tokenize file at `path` through a read-only memory map."""
+    with open(path, 'rb') as source_file:
+        if os.fstat(source_file.fileno()).st_size == 0:
+            yield BytesTokens(b'')  # empty files cannot be mapped
+            return
+        with mmap.mmap(source_file.fileno(), 0,
+                       access=mmap.ACCESS_READ) as data:
+            yield BytesTokens(data)
+
+
 def parse_atom(token: str) -> Atom:
     if token[0] == '+':
         return token
@@ -24,20 +90,38 @@ def parse_atom(token: str) -> Atom:
         return token
 
 
-def parse_exp(tokens: Deque[str]) -> Expression:
+def parse_exp(tokens: Tokens) -> Expression:
+    """Parse one expression, consuming its tokens.
+
+    Open lists are kept in a stack instead of the Python call stack,
+    so nesting depth is limited only by memory.
+    """
     head = tokens.popleft()
-    if head == '(':
-        ast = []
-        while tokens and tokens[0] != ')':
-            ast.append(parse_exp(tokens))
-        if not tokens:
-            raise errors.UnexpectedEndOfSource()
-        tokens.popleft()  # discard ')'
-        return ast
-    elif head == ')':
+    if head == ')':
         raise errors.UnexpectedCloseParen()
-    else:
+    elif head != '(':
         return parse_atom(head)
+    popleft = tokens.popleft
+    stack: List[List[Expression]] = []  # enclosing lists
+    current: List[Expression] = []
+    while tokens:
+        token = popleft()
+        if token == '(':
+            stack.append(current)
+            current = []
+        elif token == ')':
+            if not stack:
+                return current
+            parent = stack.pop()
+            parent.append(current)
+            current = parent
+        else:
+            current.append(parse_atom(token))
+    raise errors.UnexpectedEndOfSource()
+
+
+def is_define(exp: Expression) -> TypeGuard[list]:
+    return isinstance(exp, list) and bool(exp) and exp[0] == 'define'
 
 
 if __name__ == '__main__':
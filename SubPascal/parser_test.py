@@ -1,6 +1,8 @@
 from pytest import mark, raises
 
-from parser import parse_exp, tokenize, parse_atom
+from parser import (
+    parse_exp, tokenize, parse_atom, tokenize_file, BytesTokens, is_define,
+)
 
 import errors
 
@@ -67,3 +69,72 @@ def test_parse_unexpected_end_of_source():
     with raises(errors.UnexpectedEndOfSource) as excinfo:
         parse_exp(tokens)
     assert "Unexpected end of source code." == str(excinfo.value)
+
+
+def test_parse_deeply_nested():
+    depth = 100_000
+    tokens = tokenize('(+ 1 ' * depth + '0' + ')' * depth)
+    ast = parse_exp(tokens)
+    for _ in range(depth):
+        assert ['+', 1] == ast[:2]
+        ast = ast[2]
+    assert 0 == ast
+
+
+def test_parse_leaves_following_tokens():
+    tokens = tokenize('(a (b)) (c)')
+    assert ['a', ['b']] == parse_exp(tokens)
+    assert ['(', 'c', ')'] == list(tokens)
+
+
+def test_parse_deeply_nested_unexpected_end_of_source():
+    tokens = tokenize('(' * 10_000)
+    with raises(errors.UnexpectedEndOfSource):
+        parse_exp(tokens)
+
+
+@mark.parametrize("source", [
+    '',
+    '7',
+    '(+ 2 (* 3 5))',
+    '(define double (n)\n\t(* n 2))  (double -21)',
+    '((()))) (',
+    '(print café)',
+    '(print 123456789012345678901234567890)',
+])
+@mark.parametrize("block_size", [1, 5, 1 << 16])
+def test_bytes_tokens(source, block_size):
+    tokens = BytesTokens(source.encode('utf-8'), block_size)
+    got = []
+    while tokens:
+        got.append(tokens.popleft())
+    assert list(tokenize(source)) == got
+    with raises(IndexError):
+        tokens.popleft()
+
+
+def test_tokenize_file(tmp_path):
+    path = tmp_path / 'source.subpas'
+    path.write_text('(print 1)\n(+ 2 3)')
+    with tokenize_file(str(path)) as tokens:
+        assert ['print', 1] == parse_exp(tokens)
+        assert ['+', 2, 3] == parse_exp(tokens)
+        assert not tokens
+
+
+def test_tokenize_file_empty(tmp_path):
+    path = tmp_path / 'empty.subpas'
+    path.write_text('')
+    with tokenize_file(str(path)) as tokens:
+        assert not tokens
+
+
+@mark.parametrize("exp, want", [
+    (['define', 'f', ['n'], 'n'], True),
+    (['print', 1], False),
+    ([], False),
+    ('define', False),
+    (7, False),
+])
+def test_is_define(exp, want):
+    assert want == is_define(exp)
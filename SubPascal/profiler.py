@@ -0,0 +1,60 @@
+import collections
+import signal
+import time
+from types import FrameType
+from typing import Counter, Optional, TextIO, Tuple
+
+from evaluator import UserFunction
+
+INTERVAL = 0.001  # seconds between samples
+ROOT = '<toplevel>'
+
+CALL_CODE = UserFunction.__call__.__code__
+
+Stack = Tuple[str, ...]  # function names, outermost first
+
+
+class SamplingProfiler:
+    """Sample the SubPascal call stack on a wall-clock timer.
+
+    On each SIGALRM, the Python frames of the interrupted code are
+    walked, and the names of the `UserFunction` objects being called
+    make up the sample. Use as a context manager around the code to
+    profile, then `write_folded` the samples. Unix only; SIGALRM is
+    also used for the evaluation timeout of server.py, so the two
+    cannot be combined. The CPU-time timer, SIGPROF, only fires on
+    clock ticks, too coarse for 1 kHz.
+    """
+
+    def __init__(self, interval: float = INTERVAL):
+        self.interval = interval
+        self.samples: Counter[Stack] = collections.Counter()
+        self.sampling_time = 0.0  # seconds spent in `sample`
+        self.previous_handler: object = None
+
+    def __enter__(self) -> 'SamplingProfiler':
+        self.previous_handler = signal.signal(signal.SIGALRM, self.sample)
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, self.previous_handler)  # type: ignore
+
+    def sample(self, signum: int, frame: Optional[FrameType]) -> None:
+        start = time.perf_counter()
+        names = []
+        while frame is not None:
+            if frame.f_code is CALL_CODE:
+                names.append(frame.f_locals['self'].name)
+            frame = frame.f_back
+        names.append(ROOT)
+        names.reverse()
+        self.samples[tuple(names)] += 1
+        self.sampling_time += time.perf_counter() - start
+
+    def write_folded(self, out: TextIO) -> None:
+        """Write samples in the collapsed format read by flamegraph.pl."""
+        for stack, count in sorted(self.samples.items()):
+            names = (name.replace(';', ':') for name in stack)
+            out.write(f"{';'.join(names)} {count}\n")
@@ -0,0 +1,64 @@
+import io
+import signal
+import sys
+
+from pytest import fixture
+
+from evaluator import Operator, define_function, evaluate
+from parser import parse_exp, tokenize
+from profiler import SamplingProfiler
+import evaluator
+
+SOURCE = """
+(define inner (n) (probe))
+(define outer (n) (if (< n 1) (inner n) (outer (- n 1))))
+"""
+
+
+@fixture
+def functions(fresh_env):
+    evaluator.tier_threshold = 0
+    tokens = tokenize(SOURCE)
+    while tokens:
+        define_function(*parse_exp(tokens)[1:])
+
+
+def probing(sampler, monkeypatch):
+    def probe():
+        sampler.sample(signal.SIGALRM, sys._getframe())
+        return 0
+    operator = Operator('probe', probe, 0)
+    monkeypatch.setitem(evaluator.NATIVE_OPS, 'probe', operator)
+
+
+def test_sample(functions, monkeypatch):
+    sampler = SamplingProfiler()
+    probing(sampler, monkeypatch)
+    evaluate({}, ['outer', 2])
+    evaluate({}, ['inner', 0])
+    evaluate({}, ['probe'])
+    assert {
+        ('<toplevel>', 'outer', 'outer', 'outer', 'inner'): 1,
+        ('<toplevel>', 'inner'): 1,
+        ('<toplevel>',): 1,
+    } == sampler.samples
+
+
+def test_write_folded(functions, monkeypatch):
+    sampler = SamplingProfiler()
+    probing(sampler, monkeypatch)
+    evaluate({}, ['outer', 1])
+    evaluate({}, ['outer', 1])
+    out = io.StringIO()
+    sampler.write_folded(out)
+    assert '<toplevel>;outer;outer;inner 2\n' == out.getvalue()
+
+
+def test_timer(functions):
+    previous = signal.getsignal(signal.SIGALRM)
+    with SamplingProfiler(interval=0.0005) as sampler:
+        evaluate({}, parse_exp(tokenize(
+            '(begin (let i 0) (while (< i 20000) (let i (+ i 1))))')))
+    assert sum(sampler.samples.values()) > 0
+    assert previous == signal.getsignal(signal.SIGALRM)
+    assert (0.0, 0.0) == signal.getitimer(signal.ITIMER_REAL)
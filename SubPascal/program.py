@@ -0,0 +1,185 @@
+"""Programs compiled once, to be run many times, as by embedding services.
+
+`compile_program` parses a source and compiles its forms to closures
+with compiler.py. Function calls are bound when compiling, to the
+definitions made before each top-level form, as `subpascal.run` would
+find them; a function body called from forms with different
+definitions in effect is compiled once for each. Global variables are
+kept in a dict created for each run, so nothing a `Program` holds
+changes after compiling, and any number of threads can run it at once.
+"""
+
+import types
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from compiler import Compiler, Node
+from evaluator import (
+    NATIVE_OPS, VALUE_OPS, Function, ValueEnv, check_arity,
+)
+from parser import Expression, is_define, parse_exp, tokenize
+import errors
+
+
+class Definition:
+    """A `define` form of the source."""
+
+    def __init__(self, exp: Expression):
+        assert isinstance(exp, list)
+        if not (len(exp) == 4 and isinstance(exp[1], str)
+                and isinstance(exp[2], list)
+                and all(isinstance(f, str) for f in exp[2])):
+            raise errors.InvalidDefinition(str(exp[1]) if exp[1:] else '')
+        self.name: str = exp[1]
+        self.formals: List[str] = exp[2]
+        self.body: Expression = exp[3]
+
+
+class ProgramFunction:
+    """Function of a `Program`, compiled with the definitions it sees.
+
+    Calling it from Python runs it with no global variables.
+    """
+
+    def __init__(self, definition: Definition):
+        self.name = definition.name
+        self.formals = definition.formals
+        self.arity = len(self.formals)
+        self.code: Node = unfinished
+
+    def __repr__(self) -> str:
+        formals = ' '.join(self.formals)
+        return f'<ProgramFunction ({self.name} {formals})>'
+
+    def __call__(self, *values: int) -> int:
+        check_arity(self.name, self.arity, values)
+        return self.code(dict(zip(self.formals, values)), {})
+
+
+def unfinished(env: ValueEnv, genv: ValueEnv) -> int:
+    raise AssertionError('function called while compiling')
+
+
+FunctionTable = Dict[str, Definition]
+CompiledTable = Dict[Tuple[int, str], ProgramFunction]  # by version, name
+
+
+class ProgramCompiler(Compiler):
+    """Compile calls with the function definitions in `table`.
+
+    `version` identifies `table`, and `compiled` holds the functions
+    compiled for each version, shared by compilers of all versions.
+    """
+
+    def __init__(self, table: FunctionTable, version: int,
+                 compiled: CompiledTable):
+        super().__init__()
+        self.table = table
+        self.version = version
+        self.compiled = compiled
+
+    def resolve(self, name: str) -> Function:
+        """Find built-ins; program functions are bound at compile time."""
+        op = VALUE_OPS.get(name) or NATIVE_OPS.get(name)
+        if op is None:
+            raise errors.UndefinedFunction(name)
+        return op
+
+    def fallback(self, exp: Expression) -> Node:
+        assert isinstance(exp, list)
+        if exp and not isinstance(exp[0], str):
+            return self.compile_late_call(exp[0], exp[1:])  # raises
+        return super().fallback(exp)  # `()` or `(begin)` use no state
+
+    def compile_call(self, name: str, args: List[Expression]) -> Node:
+        if name in VALUE_OPS or name not in self.table:
+            return super().compile_call(name, args)
+        return program_call(self.function(name),
+                            [self.compile(x) for x in args])
+
+    def function(self, name: str) -> ProgramFunction:
+        """Return function `name` compiled for this version."""
+        key = self.version, name
+        func = self.compiled.get(key)
+        if func is None:
+            definition = self.table[name]
+            self.compiled[key] = func = ProgramFunction(definition)
+            func.code = self.compile(definition.body)  # may call `func`
+        return func
+
+
+def program_call(func: ProgramFunction, arg_nodes: List[Node]) -> Node:
+    if len(arg_nodes) == func.arity == 1:
+        [arg] = arg_nodes
+        [formal] = func.formals
+
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            return func.code({formal: arg(env, genv)}, genv)
+    else:
+        formals = func.formals
+
+        def node(env: ValueEnv, genv: ValueEnv) -> int:
+            values = [arg(env, genv) for arg in arg_nodes]
+            if len(values) != func.arity:
+                check_arity(func.name, func.arity, values)
+            return func.code(dict(zip(formals, values)), genv)
+    return node
+
+
+class Program:
+    """Compiled forms of a source, and the functions it defines.
+
+    Use `compile_program` to make one.
+    """
+
+    __slots__ = ('forms', 'functions')
+
+    forms: Tuple[Node, ...]
+    functions: Mapping[str, ProgramFunction]
+
+    def __init__(self, forms: Tuple[Node, ...],
+                 functions: Mapping[str, ProgramFunction]):
+        object.__setattr__(self, 'forms', forms)
+        object.__setattr__(self, 'functions',
+                           types.MappingProxyType(dict(functions)))
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError('Program is immutable')
+
+    def __repr__(self) -> str:
+        names = ' '.join(self.functions)
+        return f'<Program: {len(self.forms)} forms, functions: {names}>'
+
+    def run(self, env: Optional[ValueEnv] = None) -> ValueEnv:
+        """Run the forms with a copy of `env`; return global variables.
+
+        Unlike `subpascal.run`, the first error is raised. `print`
+        writes to `evaluator.output`, shared by all threads.
+        """
+        local_env = dict(env or {})
+        global_env: ValueEnv = {}
+        for form in self.forms:
+            form(local_env, global_env)
+        return global_env
+
+
+def compile_program(source: str) -> Program:
+    """Parse and compile `source`."""
+    tokens = tokenize(source)
+    compiled: CompiledTable = {}
+    table: FunctionTable = {}
+    version = 0
+    in_use = False  # if `table` is used by a compiler, copy before changing
+    forms = []
+    while tokens:
+        exp = parse_exp(tokens)
+        if is_define(exp):
+            definition = Definition(exp)
+            if in_use:
+                table, version, in_use = dict(table), version + 1, False
+            table[definition.name] = definition
+            continue
+        forms.append(ProgramCompiler(table, version, compiled).compile(exp))
+        in_use = True
+    compiler = ProgramCompiler(table, version, compiled)
+    functions = {name: compiler.function(name) for name in table}
+    return Program(tuple(forms), functions)
@@ -0,0 +1,101 @@
+import threading
+
+from pytest import mark, raises
+
+import evaluator
+from program import compile_program
+import errors
+
+GCD = """
+(define mod (m n) (- m (* n (/ m n))))
+(define gcd (m n) (if (= n 0) m (gcd n (mod m n))))
+(let r (gcd a b))
+"""
+
+
+def test_run_many_times(fresh_env):
+    program = compile_program(GCD)
+    assert {'r': 9} == program.run({'a': 18, 'b': 45})
+    assert {'r': 4} == program.run({'a': 8, 'b': 12})
+    assert {} == evaluator.global_env
+    assert {} == evaluator.function_env
+
+
+def test_run_does_not_change_env():
+    env = {'n': 3}
+    program = compile_program('(let n (+ n 1)) (let m n)')
+    assert {'m': 4} == program.run(env)
+    assert {'n': 3} == env
+
+
+def test_functions_are_callables():
+    program = compile_program(GCD)
+    assert ['mod', 'gcd'] == list(program.functions)
+    assert 6 == program.functions['gcd'](18, 12)
+    with raises(errors.MissingArgument):
+        program.functions['gcd'](1)
+
+
+@mark.parametrize("source, want", [
+    ('(define f () 1) (let x (f)) (define f () 2) (let y (f))',
+     {'x': 1, 'y': 2}),
+    ('(define g () (f)) (define f () 1) (let x (g))'
+     ' (define f () 2) (let y (g))', {'x': 1, 'y': 2}),
+    ('(define + (a b) 0) (let x (+ 1 2))', {'x': 3}),
+    ('(define pow (n) 0) (let x (pow 2))', {'x': 0}),
+    ('(let x 1) (define f () x) (let y (f))', {'x': 1, 'y': 1}),
+])
+def test_definitions_in_order(source, want):
+    assert want == compile_program(source).run()
+
+
+@mark.parametrize("source, error", [
+    ('(let x (f))', errors.UndefinedFunction),
+    ('(let x (f)) (define f () 1)', errors.UndefinedFunction),
+    ('(define f (n) n) (f)', errors.MissingArgument),
+    ('(define f (n) n) (f 1 2)', errors.TooManyArguments),
+    ('(define f (n) (/ n 0)) (f 1)', errors.DivisionByZero),
+    ('(1 2)', errors.UndefinedFunction),
+    ('y', errors.UndefinedVariable),
+])
+def test_run_errors(source, error):
+    program = compile_program(source)
+    with raises(error):
+        program.run()
+
+
+@mark.parametrize("source, error", [
+    ('(define f (n) n', errors.UnexpectedEndOfSource),
+    ('(define f (n))', errors.InvalidDefinition),
+    ('(define f n n)', errors.InvalidDefinition),
+    ('(define 1 () 1)', errors.InvalidDefinition),
+])
+def test_compile_errors(source, error):
+    with raises(error):
+        compile_program(source)
+
+
+def test_program_is_immutable():
+    program = compile_program(GCD)
+    with raises(AttributeError):
+        program.forms = ()
+    with raises(TypeError):
+        program.functions['gcd'] = program.functions['mod']
+
+
+def test_run_in_threads():
+    loop = '(let i 0) (while (< i 200) (let i (+ i 1)))'
+    program = compile_program(GCD + loop)
+    pairs = [(a, 360) for a in range(1, 41)]
+    results = [None] * len(pairs)
+
+    def work(index, a, b):
+        results[index] = program.run({'a': a, 'b': b})['r']
+
+    threads = [threading.Thread(target=work, args=(i, a, b))
+               for i, (a, b) in enumerate(pairs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [program.functions['gcd'](a, b) for a, b in pairs] == results
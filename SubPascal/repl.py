@@ -1,27 +1,49 @@
 #!/usr/bin/env python3
 
+import collections
 import sys
 
-from parser import parse_exp, tokenize, Expression
-from evaluator import evaluate, define_function
+from parser import is_define, parse_exp, tokenize, Expression
+from evaluator import define_function
+from output import int_to_str
 import errors
+import evaluator
+import snapshot
 
-from typing import Callable, List, Tuple, NoReturn, cast
+from typing import Callable, Deque, Iterable, List, Tuple, NoReturn, cast
 
 QUIT_COMMAND = '.q'
+SAVE_COMMAND = '.save'
+LOAD_COMMAND = '.load'
 
 
 class QuitRequest(Exception):
     """Signal to quit multi-line input."""
 
 
-def raise_unexpected_paren(line: str) -> NoReturn:
+def unexpected_paren(line: str) -> errors.UnexpectedCloseParen:
     max_msg_len = 16
     if len(line) < max_msg_len:
         msg = line
     else:
         msg = '\N{HORIZONTAL ELLIPSIS}' + line[-(max_msg_len-1):]
-    raise errors.UnexpectedCloseParen(msg)
+    return errors.UnexpectedCloseParen(msg)
+
+
+def raise_unexpected_paren(line: str) -> NoReturn:
+    raise unexpected_paren(line)
+
+
+def paren_balance(line: str, paren_cnt: int = 0) -> int:
+    """Update count of open parens with `line`; return new count."""
+    for char in line:
+        if char == '(':
+            paren_cnt += 1
+        elif char == ')':
+            paren_cnt -= 1
+        if paren_cnt < 0:
+            raise_unexpected_paren(line)
+    return paren_cnt
 
 
 InputFnType = Callable[[str], str]
@@ -39,13 +61,7 @@ def multiline_input(prompt1: str = '',
         line = input_fn(prompt).rstrip()
         if line == quit_cmd:
             raise QuitRequest()
-        for char in line:
-            if char == '(':
-                paren_cnt += 1
-            elif char == ')':
-                paren_cnt -= 1
-            if paren_cnt < 0:
-                raise_unexpected_paren(line)
+        paren_cnt = paren_balance(line, paren_cnt)
         lines.append(line)
         prompt = prompt2
         if paren_cnt == 0:
@@ -54,8 +70,81 @@ def multiline_input(prompt1: str = '',
     return '\n'.join(lines)
 
 
+def eval_exp(exp: Expression) -> str:
+    """Evaluate one form; return the text to display."""
+    if is_define(exp):
+        return define_function(*exp[1:])
+    value = evaluator.evaluate_form({}, exp)
+    if isinstance(value, int):
+        return int_to_str(value)  # `str` fails on very large values
+    return str(value)  # `None`, from `while` and `for`
+
+
+def eval_source(source: str) -> str:
+    """Parse and evaluate one form; return the text to display."""
+    return eval_exp(parse_exp(tokenize(source)))
+
+
+def is_command(source: str) -> bool:
+    return source.split()[0] in (SAVE_COMMAND, LOAD_COMMAND)
+
+
+def run_command(line: str) -> str:
+    """Execute a REPL command like `.save FILE`; return text to display."""
+    command, _, path = line.strip().partition(' ')
+    try:
+        if command == SAVE_COMMAND:
+            return snapshot.save(path.strip())
+        return snapshot.load(path.strip())
+    except (OSError, errors.InterpreterException) as exc:
+        return f'*** {exc}'
+
+
+def batch_repl(lines: Iterable[str]) -> None:
+    """Read-Eval-Print-Loop for input that is not interactive.
+
+    Tokens of each line are added to a stream, and evaluated as soon as
+    they make complete forms. No prompts are displayed. Unlike with
+    interactive input, every form in a line is evaluated.
+    """
+    write = sys.stdout.write
+    tokens: Deque[str] = collections.deque()
+    depth = 0
+    for line in lines:
+        if line.rstrip() == QUIT_COMMAND:
+            break
+        if not tokens:
+            if not line.strip():
+                continue
+            if is_command(line):
+                write(run_command(line) + '\n')
+                continue
+        tokens.extend(tokenize(line))
+        depth += line.count('(') - line.count(')')
+        if depth > 0:
+            continue
+        if depth < 0:  # discard the pending form, like `multiline_input`
+            tokens.clear()
+            write(f'*** {unexpected_paren(line.rstrip())}\n')
+        depth = 0
+        while tokens:
+            try:
+                exp = parse_exp(tokens)
+            except errors.UnexpectedCloseParen:
+                tokens.clear()
+                write(f'*** {unexpected_paren(line.rstrip())}\n')
+                break
+            try:
+                write(eval_exp(exp) + '\n')
+            except errors.EvaluatorException as exc:
+                write(f'*** {exc}\n')
+
+
 def repl(input_fn: InputFnType = input) -> None:
     """Read-Eval-Print-Loop"""
+    if input_fn is input and not sys.stdin.isatty():
+        batch_repl(sys.stdin)
+        return
     print(f'To exit, type {QUIT_COMMAND}', file=sys.stderr)
 
     while True:
@@ -75,15 +164,14 @@ def repl(input_fn: InputFnType = input) -> None:
         # def define_function(parts: Tuple[str, List[str], Expression]) -> str:
 
         # ___________________________________________ Eval
-        current_exp = parse_exp(tokenize(source))
-        if isinstance(current_exp, list) and current_exp[0] == 'define':
-            result = define_function(*current_exp[1:])
-        else:
-            try:
-                result = str(evaluate({}, current_exp))
-            except errors.EvaluatorException as exc:
-                print('***', exc)
-                continue
+        if is_command(source):
+            print(run_command(source))
+            continue
+        try:
+            result = eval_source(source)
+        except errors.EvaluatorException as exc:
+            print('***', exc)
+            continue
 
         # ___________________________________________ Print
         print(result)
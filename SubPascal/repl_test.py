@@ -1,8 +1,11 @@
+import io
+import sys
+
 from pytest import mark, raises
 
 from dialogue import Dialogue, normalize
 
-from repl import repl, multiline_input, QuitRequest
+from repl import batch_repl, repl, multiline_input, QuitRequest
 import errors
 
 
@@ -159,3 +162,27 @@ def test_repl_gcd_example_multiline(capsys):
     repl(dlg.fake_input)
     captured = capsys.readouterr()
     assert dlg.session == normalize(captured.out)
+
+
+@mark.parametrize("source, output", [
+    ('3\n', '3\n'),
+    ('\n(* (+ 2 4) (- 10 3))\n(/ (* (- 100 32) 5) 9)\n', '42\n37\n'),
+    ('(let n (* 4\n2))\n(* n n) x\n', "8\n64\n*** Undefined variable: 'x'.\n"),
+    ('(print 1)\n(+ 1 1))\n(print 2)\n',
+     "1\n1\n*** Unexpected close parenthesis: '(+ 1 1))'.\n2\n2\n"),
+    ('(+ 1\n.q\n2)\n', ''),
+    ('4\n.q\n5\n', '4\n'),
+])
+def test_batch_repl(capsys, source, output):
+    batch_repl(io.StringIO(source))
+    captured = capsys.readouterr()
+    assert output == captured.out
+    assert '' == captured.err
+
+
+def test_repl_batch_when_not_a_tty(capsys, monkeypatch):
+    monkeypatch.setattr(sys, 'stdin', io.StringIO('(* 6 7)\n'))
+    repl()
+    captured = capsys.readouterr()
+    assert '42\n' == captured.out
+    assert '' == captured.err
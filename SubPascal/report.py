@@ -0,0 +1,111 @@
+import csv
+import sys
+import time
+import tracemalloc
+from typing import Any, List, Optional, TextIO
+
+from evaluator import ValueEnv, define_function
+from parser import is_define, parse_exp, tokenize
+from watch import split_forms
+import errors
+import evaluator
+
+COLUMNS = ['line', 'wall_ms', 'cpu_ms', 'steps', 'peak_kib', 'form']
+FORM_WIDTH = 32
+
+
+class FormReport:
+    """Measurements of one top-level form."""
+
+    def __init__(self, line: int, text: str):
+        self.line = line
+        self.text = ' '.join(text.split())
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.steps = 0
+        self.peak = 0  # bytes allocated above the level before the form
+
+    def row(self) -> List[Any]:
+        return [self.line, f'{self.wall * 1000:.3f}', f'{self.cpu * 1000:.3f}',
+                self.steps, f'{self.peak / 1024:.1f}', self.text]
+
+
+class StepCounter:
+    """Count calls to `evaluator.evaluate` while in a `with` block.
+
+    `evaluate` is replaced only within the block, so there is no cost
+    when no report is requested. Code compiled by compiler.py does not
+    call `evaluate`, so functions are not compiled within the block.
+    """
+
+    def __init__(self) -> None:
+        self.steps = 0
+
+    def __enter__(self) -> 'StepCounter':
+        self.tier_threshold = evaluator.tier_threshold
+        evaluator.tier_threshold = 0
+        self.original = evaluate = evaluator.evaluate
+
+        def counting_evaluate(env: ValueEnv, exp: Any) -> int:
+            self.steps += 1
+            return evaluate(env, exp)
+
+        evaluator.evaluate = counting_evaluate
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        evaluator.evaluate = self.original
+        evaluator.tier_threshold = self.tier_threshold
+
+
+def run(source: str, env: Optional[ValueEnv] = None) -> List[FormReport]:
+    """Execute `source` like `subpascal.run`, measuring each form."""
+    if env is None:
+        env = {}
+    reports = []
+    tracemalloc.start()
+    try:
+        with StepCounter() as counter:
+            for line, text in split_forms(source):
+                try:
+                    exp = parse_exp(tokenize(text))
+                except errors.ParserException as exc:
+                    print('***', exc, file=sys.stderr)
+                    break
+                report = FormReport(line, text)
+                reports.append(report)
+                counter.steps = 0
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                wall, cpu = time.perf_counter(), time.process_time()
+                try:
+                    if is_define(exp):
+                        define_function(*exp[1:])
+                    else:
+                        evaluator.evaluate(env, exp)
+                except errors.EvaluatorException as exc:
+                    print('***', exc, file=sys.stderr)
+                report.wall = time.perf_counter() - wall
+                report.cpu = time.process_time() - cpu
+                report.steps = counter.steps
+                report.peak = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return reports
+
+
+def write_table(reports: List[FormReport], out: TextIO) -> None:
+    out.write(f'{"line":>6} {"wall ms":>10} {"cpu ms":>10} {"steps":>10} '
+              f'{"peak KiB":>10}  form\n')
+    for report in reports:
+        line, wall, cpu, steps, peak, text = report.row()
+        if len(text) > FORM_WIDTH:
+            text = text[:FORM_WIDTH - 1] + '\N{HORIZONTAL ELLIPSIS}'
+        out.write(f'{line:>6} {wall:>10} {cpu:>10} {steps:>10} '
+                  f'{peak:>10}  {text}\n')
+
+
+def write_csv(reports: List[FormReport], out: TextIO) -> None:
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS)
+    writer.writerows(report.row() for report in reports)
@@ -0,0 +1,62 @@
+import csv
+import io
+
+import evaluator
+import report
+import subpascal
+
+SOURCE = """
+(define double (n) (* n 2))
+(let x (double 21))
+
+(print x)
+(spam)
+"""
+
+
+def test_run(fresh_env, capsys):
+    reports = report.run(SOURCE)
+    captured = capsys.readouterr()
+    assert '42\n' == captured.out
+    assert "*** Undefined function: 'spam'.\n" == captured.err
+    assert [2, 3, 5, 6] == [r.line for r in reports]
+    assert '(let x (double 21))' == reports[1].text
+    # (let x ...), (double 21), 21, (* n 2), n, 2
+    assert 6 == reports[1].steps
+    assert all(r.wall >= 0 and r.cpu >= 0 for r in reports)
+
+
+def test_step_counter_restores_evaluate():
+    original = evaluator.evaluate
+    with report.StepCounter() as counter:
+        evaluator.evaluate({}, ['+', 1, ['*', 2, 3]])
+    assert 5 == counter.steps
+    assert original is evaluator.evaluate
+
+
+def test_steps_of_hot_functions_are_counted(fresh_env, monkeypatch):
+    source = '(define double (n) (* n 2)) (for i 1 100 (double i))'
+    monkeypatch.setattr(evaluator, 'tier_threshold', 0)
+    cold = report.run(source)[1].steps
+    monkeypatch.setattr(evaluator, 'tier_threshold', 10)
+    assert cold == report.run(source)[1].steps
+    assert 10 == evaluator.tier_threshold
+    assert evaluator.function_env['double'].code is None
+
+
+def test_write_csv(fresh_env, capsys):
+    out = io.StringIO()
+    report.write_csv(report.run(SOURCE), out)
+    rows = list(csv.reader(io.StringIO(out.getvalue())))
+    assert report.COLUMNS == rows[0]
+    assert ['5', '(print x)'] == [rows[3][0], rows[3][-1]]
+
+
+def test_main_report(fresh_env, tmp_path, capsys):
+    path = tmp_path / 'script.subpas'
+    path.write_text(SOURCE)
+    subpascal.main(['--report', str(path)])
+    captured = capsys.readouterr()
+    assert '42\n' == captured.out
+    assert 'peak KiB' in captured.err
+    assert '(let x (double 21))' in captured.err
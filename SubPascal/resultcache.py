@@ -0,0 +1,176 @@
+import hashlib
+import sqlite3
+from typing import Dict, Optional, Sequence, Set, Tuple
+
+import evaluator
+from evaluator import Operator, UserFunction, SPECIAL_FORMS
+from parser import Expression
+from specializer import NAME_FORMS
+import errors
+
+MAX_ENTRIES = 100_000
+EVICT_EVERY = 1000  # insertions
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_used ON results (used);
+"""
+
+
+def scan(exp: Expression, formals: Set[str], calls: Set[str]) -> bool:
+    """Check that `exp` uses no variables but `formals`.
+
+    Names of the functions called are added to `calls`.
+    """
+    if isinstance(exp, int):
+        return True
+    elif isinstance(exp, str):
+        return exp in formals
+    elif not exp or not isinstance(exp[0], str):
+        return False
+    head, *args = exp
+    if head in NAME_FORMS:
+        if not args or args[0] not in formals:
+            return False  # assigns a global variable
+        args = args[1:]
+    elif head not in SPECIAL_FORMS:
+        calls.add(head)
+    return all(scan(x, formals, calls) for x in args)
+
+
+# operators of the interpreter, which change only with its source code
+CORE_OPERATORS = frozenset(evaluator.BUILT_INS + evaluator.NATIVE_LIB)
+
+
+def operator_key(op: Operator) -> Optional[str]:
+    """Identify the implementation of `op`; None if it may change unseen."""
+    if op in CORE_OPERATORS:
+        return f'op:{op.name}'
+    if op.version is None:
+        return None
+    function = op.function
+    module = getattr(function, '__module__', None)
+    qualname = getattr(function, '__qualname__', type(function).__qualname__)
+    return f'op:{op.name}:{module}.{qualname}:{op.version}'
+
+
+def function_digest(func: UserFunction,
+                    visiting: Tuple[str, ...] = ()) -> Optional[str]:
+    """Hash body of `func` and of all functions it calls.
+
+    Return None if `func` is not pure: it reads or writes global
+    variables, or calls an undefined function, or a built-in that is
+    not pure and deterministic. Also return None if it calls a built-in
+    registered without a version, whose results could change unseen.
+    """
+    calls: Set[str] = set()
+    if not scan(func.body, set(func.formals), calls):
+        return None
+    digest = hashlib.sha256(repr((func.formals, func.body)).encode())
+    for name in sorted(calls):
+        try:
+            callee = evaluator.fetch_function(name)
+        except errors.UndefinedFunction:
+            return None
+        if isinstance(callee, Operator):
+            if not callee.transparent:
+                return None
+            part = operator_key(callee)
+            if part is None:
+                return None
+        elif callee is func or name in visiting:
+            part = f'recursive:{name}'
+        else:
+            part = function_digest(callee, visiting + (func.name,))
+            if part is None:
+                return None
+        digest.update(f'{name}={part};'.encode())
+    return digest.hexdigest()
+
+
+def encode_value(value: int) -> str:
+    if isinstance(value, bool):  # from comparisons
+        return str(value)
+    return format(value, 'x')  # not limited like decimal `str`
+
+
+def decode_value(text: str) -> int:
+    if text in ('True', 'False'):
+        return text == 'True'
+    return int(text, 16)
+
+
+class ResultCache:
+    """Store results of pure function calls in a SQLite database.
+
+    Results are keyed by a hash of the function, the functions it calls,
+    and the arguments. When there are more than `max_entries` results,
+    the least recently used are deleted.
+    """
+
+    def __init__(self, path: str, max_entries: int = MAX_ENTRIES):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.max_entries = max_entries
+        query = 'SELECT COALESCE(MAX(used), 0) FROM results'
+        self.clock = self.db.execute(query).fetchone()[0]
+        self.digests: Dict[UserFunction, Optional[str]] = {}
+        self.generation = evaluator.generation
+        self.touched: Dict[str, int] = {}
+        self.inserted = 0
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, func: UserFunction) -> Optional[str]:
+        if self.generation != evaluator.generation:
+            self.digests.clear()
+            self.generation = evaluator.generation
+        try:
+            return self.digests[func]
+        except KeyError:
+            digest = self.digests[func] = function_digest(func)
+            return digest
+
+    def __call__(self, func: UserFunction, values: Sequence[int]) -> int:
+        digest = self.digest(func)
+        if digest is None:
+            return func.invoke(values)
+        args = ','.join(encode_value(v) for v in values)
+        key = hashlib.sha256(f'{digest}({args})'.encode()).hexdigest()
+        self.clock += 1
+        query = 'SELECT value FROM results WHERE key = ?'
+        row = self.db.execute(query, (key,)).fetchone()
+        if row is not None:
+            self.hits += 1
+            self.touched[key] = self.clock
+            return decode_value(row[0])
+        self.misses += 1
+        result = func.invoke(values)
+        self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?)',
+                        (key, encode_value(result), self.clock))
+        self.inserted += 1
+        if self.inserted % EVICT_EVERY == 0:
+            self.evict()
+        return result
+
+    def evict(self) -> None:
+        """Save times results were used, then delete least recently used."""
+        updates = ((used, key) for key, used in self.touched.items())
+        self.db.executemany('UPDATE results SET used = ? WHERE key = ?',
+                            updates)
+        self.touched.clear()
+        count = self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.db.execute('DELETE FROM results WHERE key IN '
+                            '(SELECT key FROM results ORDER BY used LIMIT ?)',
+                            (excess,))
+
+    def close(self) -> None:
+        self.evict()
+        self.db.commit()
+        self.db.close()
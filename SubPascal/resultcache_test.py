@@ -0,0 +1,120 @@
+from pytest import mark
+
+import evaluator
+from evaluator import define_function, evaluate, Operator
+from resultcache import ResultCache, function_digest, scan
+
+
+FACTORIAL_BODY = ['if', ['<', 'n', 2], 1, ['*', 'n', ['!', ['-', 'n', 1]]]]
+
+
+@mark.parametrize("body, pure, calls", [
+    (['*', 'n', 2], True, {'*'}),
+    (['let', 'n', ['+', 'n', 1]], True, {'+'}),
+    (['for', 'n', 1, 3, 'n'], True, set()),
+    (['*', 'n', 'x'], False, {'*'}),
+    (['let', 'x', 'n'], False, set()),
+    (['begin', ['print', 'n'], 'n'], True, {'print'}),
+    (FACTORIAL_BODY, True, {'<', '*', '!', '-'}),
+])
+def test_scan(body, pure, calls):
+    got_calls = set()
+    assert pure == scan(body, {'n'}, got_calls)
+    if pure:
+        assert calls == got_calls
+
+
+def test_function_digest(fresh_env):
+    define_function('!', ['n'], FACTORIAL_BODY)
+    define_function('double', ['n'], ['*', 'n', 2])
+    define_function('g', ['n'], ['double', ['!', 'n']])
+    define_function('show', ['n'], ['print', 'n'])
+    define_function('h', ['n'], ['show', 'n'])
+    g = evaluator.function_env['g']
+    digest = function_digest(g)
+    assert digest is not None
+    assert digest == function_digest(g)
+    assert function_digest(evaluator.function_env['show']) is None
+    assert function_digest(evaluator.function_env['h']) is None
+    define_function('double', ['n'], ['+', 'n', 'n'])
+    assert digest != function_digest(g)
+
+
+def test_function_digest_nondeterministic_builtin(fresh_env, monkeypatch):
+    monkeypatch.setitem(evaluator.VALUE_OPS, 'dice',
+                        Operator('dice', lambda: 4, 0, pure=True))
+    define_function('roll', ['n'], ['+', 'n', ['dice']])
+    assert function_digest(evaluator.function_env['roll']) is None
+
+
+def test_function_digest_registered_builtin(fresh_env, monkeypatch):
+    monkeypatch.setattr(evaluator, 'VALUE_OPS', dict(evaluator.VALUE_OPS))
+    define_function('twice', ['n'], ['double', ['double', 'n']])
+    twice = evaluator.function_env['twice']
+    evaluator.register_builtin('double', lambda n: n * 2, 1,
+                               pure=True, deterministic=True)
+    assert function_digest(twice) is None  # no version
+    evaluator.register_builtin('double', lambda n: n * 2, 1, version='1',
+                               pure=True, deterministic=True)
+    digest = function_digest(twice)
+    assert digest is not None
+    evaluator.register_builtin('double', lambda n: n + n, 1, version='2',
+                               pure=True, deterministic=True)
+    assert function_digest(twice) not in (None, digest)
+
+
+def test_results_reused_across_runs(fresh_env, tmp_path):
+    path = str(tmp_path / 'results.db')
+    define_function('!', ['n'], FACTORIAL_BODY)
+    cache = evaluator.result_cache = ResultCache(path)
+    assert 3628800 == evaluate({}, ['!', 10])
+    assert (0, 10) == (cache.hits, cache.misses)
+    cache.close()
+    cache = evaluator.result_cache = ResultCache(path)
+    assert 3628800 == evaluate({}, ['!', 10])
+    assert 2 ** 5000 == evaluate({}, ['pow', 2, 5000])
+    assert (1, 0) == (cache.hits, cache.misses)
+    cache.close()
+
+
+def test_redefined_function_misses(fresh_env, tmp_path):
+    cache = evaluator.result_cache = ResultCache(str(tmp_path / 'r.db'))
+    define_function('f', ['n'], ['+', 'n', 1])
+    assert 2 == evaluate({}, ['f', 1])
+    define_function('f', ['n'], ['+', 'n', 2])
+    assert 3 == evaluate({}, ['f', 1])
+    assert 0 == cache.hits
+    cache.close()
+
+
+def test_impure_functions_not_cached(fresh_env, tmp_path, capsys):
+    cache = evaluator.result_cache = ResultCache(str(tmp_path / 'r.db'))
+    define_function('show', ['n'], ['print', 'n'])
+    evaluate({}, ['show', 1])
+    evaluate({}, ['show', 1])
+    assert '1\n1\n' == capsys.readouterr().out
+    assert (0, 0) == (cache.hits, cache.misses)
+    cache.close()
+
+
+def test_booleans_preserved(fresh_env, tmp_path):
+    cache = evaluator.result_cache = ResultCache(str(tmp_path / 'r.db'))
+    define_function('same', ['a', 'b'], ['=', 'a', 'b'])
+    assert evaluate({}, ['same', 1, 1]) is True
+    assert evaluate({}, ['same', 1, 1]) is True
+    assert 1 == cache.hits
+    cache.close()
+
+
+def test_least_recently_used_evicted(fresh_env, tmp_path):
+    path = str(tmp_path / 'r.db')
+    cache = evaluator.result_cache = ResultCache(path, max_entries=2)
+    define_function('double', ['n'], ['*', 'n', 2])
+    for n in [1, 2, 3, 1]:
+        evaluate({}, ['double', n])
+    cache.close()
+    cache = evaluator.result_cache = ResultCache(path, max_entries=2)
+    for n in [1, 3, 2]:
+        evaluate({}, ['double', n])
+    assert (2, 1) == (cache.hits, cache.misses)
+    cache.close()
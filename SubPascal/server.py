@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from types import FrameType
+from typing import List, NoReturn, Optional, Tuple
+
+import evaluator
+from evaluator import FunctionEnv, ValueEnv
+from repl import QUIT_COMMAND, QuitRequest, eval_source, paren_balance
+import errors
+
+MAX_WORKERS = 4
+MAX_CONNECTIONS = 64
+EVAL_TIMEOUT = 10.0  # seconds for each evaluation
+IDLE_TIMEOUT = 600.0  # seconds waiting for the next line
+TIMEOUT_GRACE = 1.0  # extra seconds before giving up on a worker
+
+SessionState = Tuple[ValueEnv, FunctionEnv]
+
+
+def raise_timeout(signum: int, frame: Optional[FrameType]) -> NoReturn:
+    raise errors.EvaluationTimeout()
+
+
+def eval_in_session(state: SessionState,
+                    source: str,
+                    timeout: float) -> Tuple[str, SessionState]:
+    """Evaluate `source` in a worker process; return output and new state."""
+    saved_state = evaluator.global_env, evaluator.function_env
+    evaluator.global_env, evaluator.function_env = state
+    output = io.StringIO()
+    previous_handler = signal.signal(signal.SIGALRM, raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with contextlib.redirect_stdout(output):
+            try:
+                print(eval_source(source))
+            except errors.InterpreterException as exc:
+                print('***', exc)
+            except Exception as exc:  # don't let a bad form end the session
+                print(f'*** {type(exc).__name__}: {exc}')
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+        state = evaluator.global_env, evaluator.function_env
+        evaluator.global_env, evaluator.function_env = saved_state
+    return output.getvalue(), state
+
+
+class ReplServer:
+    """Serve isolated REPL sessions, evaluating in a pool of processes."""
+
+    def __init__(self,
+                 max_workers: int = MAX_WORKERS,
+                 max_connections: int = MAX_CONNECTIONS,
+                 eval_timeout: float = EVAL_TIMEOUT,
+                 idle_timeout: float = IDLE_TIMEOUT):
+        # spawned workers don't inherit the sockets of open connections
+        spawn = multiprocessing.get_context('spawn')
+        self.pool = ProcessPoolExecutor(max_workers, mp_context=spawn)
+        self.slots = asyncio.Semaphore(max_connections)
+        self.eval_timeout = eval_timeout
+        self.idle_timeout = idle_timeout
+
+    async def start(self,
+                    host: str = '127.0.0.1',
+                    port: int = 0,
+                    path: str = '') -> asyncio.AbstractServer:
+        if path:
+            return await asyncio.start_unix_server(self.handle, path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+
+    async def handle(self,
+                     reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        try:
+            if self.slots.locked():
+                writer.write(f'*** {errors.TooManyConnections()}\n'.encode())
+                writer.write_eof()
+                # drain input so closing doesn't reset the connection
+                await asyncio.wait_for(reader.read(), TIMEOUT_GRACE)
+                return
+            async with self.slots:
+                await self.session(reader, writer)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            writer.close()
+
+    async def read_source(self,
+                          reader: asyncio.StreamReader,
+                          writer: asyncio.StreamWriter) -> str:
+        """Network version of `repl.multiline_input`."""
+        paren_cnt = 0
+        lines: List[str] = []
+        prompt = '> '
+        while True:
+            writer.write(prompt.encode())
+            await writer.drain()
+            data = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+            if not data:
+                raise EOFError()
+            line = data.decode(errors='replace').rstrip()
+            if line == QUIT_COMMAND:
+                raise QuitRequest()
+            paren_cnt = paren_balance(line, paren_cnt)
+            lines.append(line)
+            prompt = '... '
+            if paren_cnt == 0:
+                break
+        return '\n'.join(lines)
+
+    async def session(self,
+                      reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        writer.write(f'To exit, type {QUIT_COMMAND}\n'.encode())
+        state: SessionState = ({}, {})
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                source = await self.read_source(reader, writer)
+            except (EOFError, QuitRequest, asyncio.TimeoutError):
+                break
+            except errors.UnexpectedCloseParen as exc:
+                writer.write(f'*** {exc}\n'.encode())
+                continue
+            if not source:
+                continue
+
+            job = loop.run_in_executor(self.pool, eval_in_session,
+                                       state, source, self.eval_timeout)
+            try:
+                output, state = await asyncio.wait_for(
+                    job, self.eval_timeout + TIMEOUT_GRACE)
+            except asyncio.TimeoutError:
+                output = f'*** {errors.EvaluationTimeout()}\n'
+            except errors.InterpreterException as exc:
+                output = f'*** {exc}\n'
+            except Exception as exc:  # like sending the state back
+                output = f'*** {type(exc).__name__}: {exc}\n'
+            writer.write(output.encode())
+
+
+async def serve(host: str, port: int, path: str = '') -> None:
+    server = ReplServer()
+    try:
+        listener = await server.start(host, port, path)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(args: List[str]) -> None:
+    """Usage: server.py [HOST PORT | SOCKET_PATH]"""
+    if len(args) == 1:
+        asyncio.run(serve('', 0, args[0]))
+    else:
+        host, port = args if args else ('127.0.0.1', '7070')
+        asyncio.run(serve(host, int(port)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
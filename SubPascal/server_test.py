@@ -0,0 +1,136 @@
+import asyncio
+
+from pytest import fixture
+
+from server import ReplServer, eval_in_session
+
+
+def test_eval_in_session():
+    state = ({}, {})
+    output, state = eval_in_session(state, '(let x 7)', 1)
+    assert '7\n' == output
+    output, state = eval_in_session(state, '(* x 6)', 1)
+    assert '42\n' == output
+    assert {'x': 7} == state[0]
+
+
+def test_eval_in_session_error():
+    output, _ = eval_in_session(({}, {}), 'x', 1)
+    assert "*** Undefined variable: 'x'.\n" == output
+
+
+def test_eval_in_session_timeout():
+    output, _ = eval_in_session(({}, {}), '(while 1 0)', 0.1)
+    assert '*** Evaluation timed out.\n' == output
+
+
+@fixture
+def repl_server():
+    server = ReplServer(max_workers=2, max_connections=2, eval_timeout=0.5)
+    yield server
+    server.close()
+
+
+async def talk(port, lines):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(''.join(line + '\n' for line in lines).encode())
+    writer.write_eof()
+    transcript = await reader.read()
+    writer.close()
+    return transcript.decode()
+
+
+def run_dialogues(server, *dialogues):
+    async def main():
+        listener = await server.start('127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            return await asyncio.gather(*(talk(port, d) for d in dialogues))
+    return asyncio.run(main())
+
+
+def test_session(repl_server):
+    dialogue = [
+        '(define mod (m n) (- m (* n (/ m n))))',
+        '(mod 11',
+        '4)',
+        'x',
+        '.q',
+    ]
+    [transcript] = run_dialogues(repl_server, dialogue)
+    assert transcript == ('To exit, type .q\n'
+                          '> <UserFunction (mod m n)>\n'
+                          '> ... 3\n'
+                          "> *** Undefined variable: 'x'.\n"
+                          '> ')
+
+
+def test_session_with_compiled_function(repl_server):
+    dialogue = [
+        '(define square (n) (* n n))',
+        '(for i 1 2000 (square i))',  # over the tier threshold
+        '(square 7)',
+    ]
+    [transcript] = run_dialogues(repl_server, dialogue)
+    assert transcript.endswith('> 49\n> ')
+
+
+def test_python_errors_do_not_end_session(repl_server):
+    dialogue = [
+        '(define g (x) (g x))',
+        '(g 1)',
+        '(define f)',
+        '(let x 7)',
+        'x',
+    ]
+    [transcript] = run_dialogues(repl_server, dialogue)
+    assert '> *** RecursionError: maximum recursion depth' in transcript
+    assert '> *** TypeError: ' in transcript
+    assert transcript.endswith('> 7\n> 7\n> ')
+
+
+def test_invalid_utf8(repl_server):
+    async def main():
+        listener = await repl_server.start('127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'(+ 1 \xff)\n(+ 1 2)\n')
+            writer.write_eof()
+            transcript = await reader.read()
+            writer.close()
+            return transcript.decode()
+    transcript = asyncio.run(main())
+    assert "> *** Undefined variable: '\ufffd'.\n> 3\n> " in transcript
+
+
+def test_sessions_are_isolated(repl_server):
+    first = ['(let x 1)', '(define f (n) n)', 'x']
+    second = ['x', '(f 1)']
+    transcript1, transcript2 = run_dialogues(repl_server, first, second)
+    assert transcript1.endswith('> 1\n> ')
+    assert "> *** Undefined variable: 'x'.\n" in transcript2
+    assert "> *** Undefined function: 'f'.\n" in transcript2
+
+
+def test_long_loop_does_not_stall_other_session(repl_server):
+    looping = ['(while 1 0)', '(+ 1 1)']
+    other = ['(* 6 7)']
+    transcript1, transcript2 = run_dialogues(repl_server, looping, other)
+    assert '> *** Evaluation timed out.\n> 2\n' in transcript1
+    assert transcript2.endswith('> 42\n> ')
+
+
+def test_unexpected_close_paren(repl_server):
+    [transcript] = run_dialogues(repl_server, ['(+ 1 2))'])
+    assert "> *** Unexpected close parenthesis: '(+ 1 2))'.\n" in transcript
+
+
+def test_too_many_connections():
+    server = ReplServer(max_workers=1, max_connections=1)
+    try:
+        transcripts = run_dialogues(server, ['(+ 1 1)'], ['(+ 1 1)'])
+    finally:
+        server.close()
+    assert '*** Too many connections.\n' in transcripts
+    assert 'To exit, type .q\n> 2\n> ' in transcripts
@@ -0,0 +1,83 @@
+import marshal
+import struct
+import sys
+from typing import Any, List, Tuple
+
+import evaluator
+from evaluator import UserFunction, ValueEnv
+from parser import Expression
+import errors
+
+# Snapshots are encoded with `marshal`: compact, fast to load, and unable
+# to run code. But its format changes between Python releases, so the
+# header records all versions involved, and `loads` rejects mismatches.
+MAGIC = b'SubPascal snapshot\n'
+VERSION = 1
+HEADER = struct.Struct('>HHBB')  # VERSION, marshal version, Python version
+
+
+def make_header(magic: bytes = MAGIC) -> bytes:
+    major, minor = sys.version_info[:2]
+    return magic + HEADER.pack(VERSION, marshal.version, major, minor)
+
+
+def encode(state: Any, magic: bytes = MAGIC) -> bytes:
+    return make_header(magic) + marshal.dumps(state)
+
+
+def decode(data: bytes, magic: bytes = MAGIC, kind: str = 'snapshot') -> Any:
+    """Check header of `data` and return the state it encodes."""
+    header = make_header(magic)
+    if not data.startswith(magic):
+        raise errors.InvalidSnapshot(f'not a {kind}')
+    if not data.startswith(header):
+        raise errors.InvalidSnapshot('written by another version')
+    try:
+        return marshal.loads(data[len(header):])
+    except (EOFError, ValueError, TypeError) as exc:
+        raise errors.InvalidSnapshot('corrupted data') from exc
+
+
+def function_table() -> List[Tuple[str, List[str], Expression]]:
+    return [(f.name, f.formals, f.body)
+            for f in evaluator.function_env.values()]
+
+
+def restore(global_env: ValueEnv,
+            functions: List[Tuple[str, List[str], Expression]]) -> None:
+    """Replace variables and functions with those given."""
+    evaluator.global_env.clear()
+    evaluator.global_env.update(global_env)
+    evaluator.function_env.clear()
+    for name, formals, body in functions:
+        evaluator.function_env[name] = UserFunction(name, formals, body)
+    evaluator.freeze_program()
+
+
+def dumps() -> bytes:
+    return encode((evaluator.global_env, function_table()))
+
+
+def loads(data: bytes) -> None:
+    try:
+        global_env, functions = decode(data)
+    except ValueError as exc:
+        raise errors.InvalidSnapshot('corrupted data') from exc
+    restore(global_env, functions)
+
+
+def save(path: str) -> str:
+    with open(path, 'wb') as snapshot_file:
+        snapshot_file.write(dumps())
+    return describe(path)
+
+
+def load(path: str) -> str:
+    with open(path, 'rb') as snapshot_file:
+        loads(snapshot_file.read())
+    return describe(path)
+
+
+def describe(path: str) -> str:
+    return (f'<Snapshot {path}: {len(evaluator.function_env)} functions, '
+            f'{len(evaluator.global_env)} variables>')
@@ -0,0 +1,90 @@
+from pytest import fixture, raises
+
+from dialogue import Dialogue, normalize
+
+import evaluator
+from evaluator import define_function, evaluate
+from repl import repl
+import errors
+import snapshot
+import subpascal
+
+
+@fixture
+def session():
+    # backup global_env and function_env
+    initial_globals = evaluator.global_env
+    initial_fundefs = evaluator.function_env
+    evaluator.global_env = {}
+    evaluator.function_env = {}
+    yield
+    # restore global_env and function_env
+    evaluator.global_env = initial_globals
+    evaluator.function_env = initial_fundefs
+
+
+def test_dumps_loads(session):
+    define_function('mod', ['m', 'n'], ['-', 'm', ['*', 'n', ['/', 'm', 'n']]])
+    evaluate({}, ['let', 'big', ['*', 2 ** 70, 3]])
+    data = snapshot.dumps()
+    evaluator.global_env.clear()
+    evaluator.function_env.clear()
+    snapshot.loads(data)
+    assert {'big': 3 * 2 ** 70} == evaluator.global_env
+    assert 3 == evaluate({}, ['mod', 11, 4])
+
+
+def test_loads_not_a_snapshot(session):
+    with raises(errors.InvalidSnapshot) as excinfo:
+        snapshot.loads(b'(define mod (m n) 0)')
+    assert "Invalid or stale snapshot: 'not a snapshot'." == str(excinfo.value)
+
+
+def test_loads_stale_version(session, monkeypatch):
+    data = snapshot.dumps()
+    monkeypatch.setattr(snapshot, 'VERSION', snapshot.VERSION + 1)
+    with raises(errors.InvalidSnapshot) as excinfo:
+        snapshot.loads(data)
+    assert 'another version' in str(excinfo.value)
+
+
+def test_loads_corrupted(session):
+    data = snapshot.dumps()
+    with raises(errors.InvalidSnapshot):
+        snapshot.loads(data[:-3])
+
+
+def test_repl_save_load(capsys, session, tmp_path):
+    path = tmp_path / 'session.snap'
+    session = f"""
+    > (define triple (n) (* n 3))
+    <UserFunction (triple n)>
+    > (let x 7)
+    7
+    > .save {path}
+    <Snapshot {path}: 1 functions, 1 variables>
+    > (let x 8)
+    8
+    > .load {path}
+    <Snapshot {path}: 1 functions, 1 variables>
+    > (triple x)
+    21
+    > .load {tmp_path / 'missing.snap'}
+    *** [Errno 2] No such file or directory: '{tmp_path / 'missing.snap'}'
+    """
+    dlg = Dialogue(session)
+    repl(dlg.fake_input)
+    captured = capsys.readouterr()
+    assert dlg.session == normalize(captured.out)
+
+
+def test_main_restore(capsys, session, tmp_path):
+    path = tmp_path / 'session.snap'
+    define_function('triple', ['n'], ['*', 'n', 3])
+    snapshot.save(str(path))
+    evaluator.function_env.clear()
+    script = tmp_path / 'script.subpas'
+    script.write_text('(print (triple a))')
+    subpascal.main(['--restore', str(path), str(script), 'a:5'])
+    captured = capsys.readouterr()
+    assert '15\n' == captured.out
@@ -0,0 +1,120 @@
+import collections
+from typing import Dict, List, Optional, OrderedDict, Set, Tuple
+
+import evaluator
+from evaluator import (
+    UserFunction, Operator, SPECIAL_FORMS, VALUE_OPS, NATIVE_OPS
+)
+from parser import Expression
+import errors
+
+CACHE_SIZE = 512
+
+# special forms that take a variable name as their first argument
+NAME_FORMS = {'let', 'for'}
+
+Constants = Tuple[Tuple[int, int], ...]  # (position, value) pairs
+Residual = Tuple[UserFunction, List[int]]  # function, positions of args
+
+
+def assigned_names(exp: Expression) -> Set[str]:
+    """Return names that are targets of `let` or `for` within `exp`."""
+    names: Set[str] = set()
+    if isinstance(exp, list) and exp:
+        if exp[0] in NAME_FORMS and len(exp) > 1 and isinstance(exp[1], str):
+            names.add(exp[1])
+        for part in exp[1:]:
+            names |= assigned_names(part)
+    return names
+
+
+def foldable_op(name: str) -> Optional[Operator]:
+    """Return built-in `name` if calls can be computed ahead of time."""
+    op = VALUE_OPS.get(name)
+    if op is None and name not in evaluator.function_env:
+        op = NATIVE_OPS.get(name)
+    if op is None or not op.transparent:
+        return None
+    return op
+
+
+def fold(exp: Expression, bindings: Dict[str, int]) -> Expression:
+    """Replace variables in `bindings` and fold constant subexpressions."""
+    if isinstance(exp, str):
+        return bindings.get(exp, exp)
+    if not isinstance(exp, list) or not exp or not isinstance(exp[0], str):
+        return exp
+    head, *args = exp
+    if head == 'if' and len(args) == 3:
+        condition = fold(args[0], bindings)
+        if isinstance(condition, int):
+            return fold(args[1] if condition else args[2], bindings)
+        return [head, condition, *(fold(x, bindings) for x in args[1:])]
+    elif head in NAME_FORMS and args:
+        return [head, args[0], *(fold(x, bindings) for x in args[1:])]
+    args = [fold(x, bindings) for x in args]
+    if head not in SPECIAL_FORMS and all(isinstance(x, int) for x in args):
+        op = foldable_op(head)
+        if op is not None:
+            try:
+                return op(*args)
+            except (errors.EvaluatorException, ArithmeticError):
+                pass  # leave it to raise the error when evaluated
+    return [head, *args]
+
+
+def specialize(func: UserFunction, constants: Constants) -> Residual:
+    """Build residual of `func` for the constant arguments given."""
+    assigned = assigned_names(func.body)
+    values = dict(constants)
+    bindings = {}
+    positions = []
+    formals = []
+    for i, name in enumerate(func.formals):
+        if i in values and name not in assigned:
+            bindings[name] = values[i]
+        else:
+            positions.append(i)
+            formals.append(name)
+    body = fold(func.body, bindings)
+    return UserFunction(func.name, formals, body), positions
+
+
+class Specializer:
+    """Specialize calls to user functions with literal arguments.
+
+    Residual functions are kept in a LRU cache, which is cleared
+    when any function is defined.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.cache: OrderedDict[Tuple[UserFunction, Constants], Residual]
+        self.cache = collections.OrderedDict()
+        self.generation = evaluator.generation
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, func: UserFunction, args: List[Expression]
+                 ) -> Tuple[UserFunction, List[Expression]]:
+        if len(args) != func.arity:
+            return func, args  # let the call report the error
+        constants = tuple((i, x) for i, x in enumerate(args)
+                          if isinstance(x, int))
+        if not constants:
+            return func, args
+        if self.generation != evaluator.generation:
+            self.cache.clear()
+            self.generation = evaluator.generation
+        key = func, constants
+        residual = self.cache.get(key)
+        if residual is None:
+            self.misses += 1
+            residual = self.cache[key] = specialize(func, constants)
+            if len(self.cache) > self.size:
+                self.cache.popitem(last=False)
+        else:
+            self.hits += 1
+            self.cache.move_to_end(key)
+        residual_fn, positions = residual
+        return residual_fn, [args[i] for i in positions]
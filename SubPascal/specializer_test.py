@@ -0,0 +1,106 @@
+from pytest import mark
+
+import evaluator
+from evaluator import define_function, evaluate, Operator, UserFunction
+from specializer import Specializer, assigned_names, fold, specialize
+import subpascal
+
+
+ARROW_BODY = ['if', ['=', 'n', 0],
+              ['*', 'a', 'b'],
+              ['if', ['=', 'b', 0],
+               1,
+               ['arrow', ['-', 'n', 1], 'a',
+                ['arrow', 'n', 'a', ['-', 'b', 1]]]]]
+
+
+@mark.parametrize("exp, bindings, want", [
+    ('x', {'x': 1}, 1),
+    ('y', {'x': 1}, 'y'),
+    (['+', 'x', ['*', 2, 3]], {'x': 1}, 7),
+    (['+', 'x', 'y'], {'x': 1}, ['+', 1, 'y']),
+    (['if', ['>', 'x', 0], 'y', ['/', 1, 0]], {'x': 1}, 'y'),
+    (['if', 'y', 'x', 2], {'x': 1}, ['if', 'y', 1, 2]),
+    (['/', 1, 'x'], {'x': 0}, ['/', 1, 0]),
+    (['print', 'x'], {'x': 1}, ['print', 1]),
+    (['let', 'x', 'x'], {'x': 1}, ['let', 'x', 1]),
+    (['x', 'x'], {'x': 1}, ['x', 1]),
+])
+def test_fold(fresh_env, exp, bindings, want):
+    assert want == fold(exp, bindings)
+
+
+def test_fold_uses_user_definition(fresh_env):
+    assert 1 == fold(['mod', 7, 3], {})
+    define_function('mod', ['m', 'n'], 0)
+    assert ['mod', 7, 3] == fold(['mod', 7, 3], {})
+
+
+@mark.parametrize("flags, want", [
+    (dict(pure=True, deterministic=True), 3),
+    (dict(pure=True), ['next', 2]),
+    (dict(deterministic=True), ['next', 2]),
+])
+def test_fold_registered_builtin(fresh_env, monkeypatch, flags, want):
+    monkeypatch.setitem(evaluator.VALUE_OPS, 'next',
+                        Operator('next', lambda n: n + 1, 1, **flags))
+    assert want == fold(['next', 2], {})
+
+
+def test_assigned_names():
+    body = ['begin', ['let', 'r', 1], ['while', 'r', ['for', 'i', 1, 'n', 0]]]
+    assert {'r', 'i'} == assigned_names(body)
+
+
+def test_specialize():
+    arrow = UserFunction('arrow', ['n', 'a', 'b'], ARROW_BODY)
+    residual, positions = specialize(arrow, ((0, 1), (1, 2)))
+    assert ['b'] == residual.formals
+    assert [2] == positions
+    assert ['if', ['=', 'b', 0],
+            1,
+            ['arrow', 0, 2, ['arrow', 1, 2, ['-', 'b', 1]]]] == residual.body
+
+
+def test_specialize_skips_assigned_formals():
+    countdown = UserFunction('countdown', ['n'],
+                             ['while', 'n', ['let', 'n', ['-', 'n', 1]]])
+    residual, positions = specialize(countdown, ((0, 3),))
+    assert ['n'] == residual.formals
+    assert [0] == positions
+    assert 0 == residual(3)
+
+
+def test_specializer_results(fresh_env):
+    evaluator.specializer = Specializer()
+    define_function('arrow', ['n', 'a', 'b'], ARROW_BODY)
+    for n, a, b, want in [(0, 2, 3, 6), (1, 2, 3, 8), (2, 2, 4, 65536)]:
+        assert want == evaluate({}, ['arrow', n, a, b])
+    assert evaluator.specializer.hits > 0
+
+
+def test_specializer_cache_is_bounded(fresh_env):
+    specializer = evaluator.specializer = Specializer(size=3)
+    define_function('double', ['n'], ['*', 'n', 2])
+    for i in range(10):
+        assert i * 2 == evaluate({}, ['double', i])
+    assert 3 == len(specializer.cache)
+
+
+def test_specializer_invalidated_by_define(fresh_env):
+    evaluator.specializer = Specializer()
+    define_function('f', ['n'], ['+', 'n', 1])
+    assert 2 == evaluate({}, ['f', 1])
+    define_function('f', ['n'], ['+', 'n', 2])
+    assert 3 == evaluate({}, ['f', 1])
+
+
+def test_run_arrow_demo_specialized(capsys, fresh_env):
+    with open('examples/arrow-demo.subpas') as source_file:
+        subpascal.run(source_file)
+    want = capsys.readouterr().out
+    evaluator.function_env = {}
+    evaluator.specializer = Specializer()
+    with open('examples/arrow-demo.subpas') as source_file:
+        subpascal.run(source_file)
+    assert want == capsys.readouterr().out
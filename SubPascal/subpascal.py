@@ -1,12 +1,33 @@
 #!/usr/bin/env python3
 
+from __future__ import annotations
+
+import contextlib
 import sys
-from typing import List, TextIO, cast, Tuple
 
-from parser import parse_exp, tokenize, Expression
-from evaluator import evaluate, define_function, ValueEnv
-from repl import repl
+from parser import is_define, parse_exp, tokenize, tokenize_file, Expression
+from evaluator import define_function, ValueEnv, NATIVE_OPS
 import errors
+import evaluator
+
+# Modules needed only for some options, and `typing`, are imported only
+# where they are used, so running a script starts faster.
+# See bench_startup.py and `test_startup_imports` in subpascal_test.py.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import (
+        ContextManager, Dict, Iterator, List, Optional, TextIO, Tuple, Union,
+    )
+    from parser import Tokens
+
+VALUE_OPTIONS = {'--restore', '--tier-threshold', '--result-cache',
+                 '--parallel-parse', '--output-buffer', '--watch',
+                 '--report-csv', '--sample-profile', '--metrics-file',
+                 '--metrics-port', '--socket', '--checkpoint',
+                 '--checkpoint-every', '--resume', '--batch', '--workers',
+                 '--listen', '--batch-worker'}
+FLAG_OPTIONS = {'--no-native', '--specialize', '--stats', '--report',
+                '--daemon', '--client', '--hex'}
 
 
 def env_from_args(args: List[str]) -> ValueEnv:
@@ -24,38 +45,206 @@ def env_from_args(args: List[str]) -> ValueEnv:
     return env
 
 
-def run(source_file: TextIO, env: ValueEnv = None) -> None:
-    """Read and execute opened source file"""
-    source = source_file.read()
+def read_forms(tokens: Tokens) -> Iterator[Expression]:
+    while tokens:
+        yield parse_exp(tokens)
+
+
+def execute(forms: Iterator[Expression], env: ValueEnv) -> None:
+    loading = True  # the definitions before the first other form
+    evaluator.pause_gc()
+    try:
+        for current_exp in forms:
+            if is_define(current_exp):
+                define_function(*current_exp[1:])
+            else:
+                if loading:
+                    evaluator.freeze_program()
+                    loading = False
+                try:
+                    evaluator.evaluate_form(env, current_exp)
+                except errors.EvaluatorException as exc:
+                    print('***', exc, file=sys.stderr)
+                    continue
+    except errors.UnexpectedCloseParen as exc:
+        print('***', exc, file=sys.stderr)
+    finally:
+        if loading:
+            evaluator.freeze_program()
+
+
+def run(source: Union[TextIO, str], env: ValueEnv = None,
+        workers: int = 0) -> None:
+    """Read and execute opened source file, or file at path `source`.
+
+    A file given by path is tokenized through a memory map, unless
+    `workers` is not zero: then it is parsed in that many processes.
+    """
     if env is None:
         env = {}
-    tokens = tokenize(source)
+    if isinstance(source, str) and not workers:
+        with tokenize_file(source) as tokens:
+            execute(read_forms(tokens), env)
+        return
+    if isinstance(source, str):
+        with open(source) as source_file:
+            text = source_file.read()
+    else:
+        text = source.read()
+    if workers:
+        from parallel_parse import parse_parallel
+        execute(parse_parallel(text, workers), env)
+    else:
+        execute(read_forms(tokenize(text)), env)
 
-    while tokens:
-        try:
-            current_exp = parse_exp(tokens)
-        except errors.UnexpectedCloseParen as exc:
-            print('***', exc, file=sys.stderr)
-            break
 
-        if isinstance(current_exp, list) and current_exp[0] == 'define':
-            define_function(*current_exp[1:])
+def run_with_report(path: str, env: ValueEnv,
+                    csv_path: Optional[str]) -> None:
+    """Run file at `path`; report on each form to stderr, or to `csv_path`."""
+    import report
+    with open(path) as source_file:
+        reports = report.run(source_file.read(), env)
+    evaluator.output.flush()
+    if csv_path is None:
+        report.write_table(reports, sys.stderr)
+    else:
+        with open(csv_path, 'w', newline='') as csv_file:
+            report.write_csv(reports, csv_file)
+
+
+def parse_options(args: List[str]) -> Tuple[Dict[str, str], List[str]]:
+    """Split leading `--option` arguments from the other arguments."""
+    options: Dict[str, str] = {}
+    args = list(args)
+    while args and args[0].startswith('--'):
+        name = args.pop(0)
+        if name in VALUE_OPTIONS:
+            if not args:
+                raise errors.InvalidOption(f'{name} needs a value')
+            options[name] = args.pop(0)
+        elif name in FLAG_OPTIONS:
+            options[name] = ''
         else:
-            try:
-                evaluate(env, current_exp)
-            except errors.EvaluatorException as exc:
-                print('***', exc, file=sys.stderr)
-                continue
+            raise errors.InvalidOption(name)
+    return options, args
 
 
 def main(args: List[str]) -> None:
-    if not args:
-        repl()
-    else:
-        env = env_from_args(args[1:])
-        with open(args[0]) as source_file:
-            run(source_file, env)
+    try:
+        options, args = parse_options(args)
+        if '--no-native' in options:
+            NATIVE_OPS.clear()
+        if '--specialize' in options:
+            import specializer
+            evaluator.specializer = specializer.Specializer()
+        if '--tier-threshold' in options:
+            threshold = options['--tier-threshold']
+            if not threshold.isdigit():
+                raise errors.InvalidOption(f'--tier-threshold {threshold}')
+            evaluator.tier_threshold = int(threshold)
+        workers = options.get('--parallel-parse', '0')
+        if not workers.isdigit():
+            raise errors.InvalidOption(f'--parallel-parse {workers}')
+        buffer_size = options.get('--output-buffer', '0')
+        if not buffer_size.isdigit():
+            raise errors.InvalidOption(f'--output-buffer {buffer_size}')
+        port = options.get('--metrics-port', '0')
+        if not port.isdigit():
+            raise errors.InvalidOption(f'--metrics-port {port}')
+        every = options.get('--checkpoint-every')
+        if every is not None and not every.isdigit():
+            raise errors.InvalidOption(f'--checkpoint-every {every}')
+        checkpointer = None
+        start = 0
+        if '--resume' in options:
+            import checkpoint
+            checkpointer, start = checkpoint.Checkpointer.resume(
+                options['--resume'], None if every is None else int(every))
+        elif '--checkpoint' in options:
+            import checkpoint
+            if not args:
+                raise errors.InvalidOption('--checkpoint needs a script')
+            checkpointer = checkpoint.Checkpointer(
+                options['--checkpoint'], args[0], env_from_args(args[1:]),
+                int(every or 0))
+        if '--restore' in options:
+            import snapshot
+            snapshot.load(options['--restore'])
+        if '--client' in options:
+            import client
+            if not args:
+                raise errors.InvalidOption('--client needs a script')
+            client.main(args[0], args[1:],
+                        options.get('--socket', client.DEFAULT_SOCKET))
+        if '--daemon' in options:
+            import daemon
+            daemon.main(options.get('--socket', daemon.DEFAULT_SOCKET))
+            return
+        if '--batch-worker' in options:
+            import batch
+            batch.work(options['--batch-worker'])
+            return
+        if '--batch' in options:
+            import batch
+            batch_workers = options.get('--workers')
+            if batch_workers is not None and not batch_workers.isdigit():
+                raise errors.InvalidOption(f'--workers {batch_workers}')
+            if not args:
+                raise errors.InvalidOption('--batch needs a script')
+            sys.exit(batch.main(
+                args[0], options['--batch'],
+                None if batch_workers is None else int(batch_workers),
+                options.get('--listen', '127.0.0.1:0')))
+    except (OSError, EOFError, errors.InterpreterException) as exc:
+        sys.exit(f'*** {exc}')
+    cache = None
+    if '--result-cache' in options:
+        import resultcache
+        cache = resultcache.ResultCache(options['--result-cache'])
+        evaluator.result_cache = cache
+    collector: ContextManager[object] = contextlib.nullcontext()
+    if '--metrics-file' in options or int(port):
+        import metrics
+        registry = metrics.Registry()
+        if int(port):
+            metrics.serve(registry, int(port))
+        collector = metrics.Collector(registry, options.get('--metrics-file'))
+    with collector:
+        try:
+            if '--watch' in options:
+                import watch
+                watch.Watcher(options['--watch'], env_from_args(args)).watch()
+            elif not args and checkpointer is None:
+                from repl import repl
+                repl()
+            else:
+                env = env_from_args(args[1:])
+                if int(buffer_size):
+                    import output
+                    evaluator.output = output.stdout_sink(int(buffer_size))
+                if '--hex' in options:
+                    evaluator.output.radix = 16
+                if checkpointer is not None:
+                    checkpointer.run(start)
+                elif '--report' in options or '--report-csv' in options:
+                    run_with_report(args[0], env, options.get('--report-csv'))
+                elif '--sample-profile' in options:
+                    import profiler
+                    with profiler.SamplingProfiler() as sampler:
+                        run(args[0], env, int(workers))
+                    with open(options['--sample-profile'], 'w') as out_file:
+                        sampler.write_folded(out_file)
+                else:
+                    run(args[0], env, int(workers))
+        finally:
+            evaluator.output.flush()
+            if cache is not None:
+                cache.close()
+    if '--stats' in options:
+        import compiler
+        print(compiler.stats_report(), file=sys.stderr)
 
 
 if __name__ == '__main__':
+    evaluator.freeze_gc = True  # the whole process is the interpreter
     main(sys.argv[1:])
@@ -1,8 +1,15 @@
+import gc
 import io
+import os
+import subprocess
+import sys
+import weakref
 
-from pytest import mark
+from pytest import mark, raises
 
-from subpascal import run, env_from_args
+from subpascal import run, env_from_args, parse_options
+import errors
+import evaluator
 
 
 def test_run_single_line(capsys):
@@ -61,6 +68,14 @@ def test_run_gcd_example(capsys):
     assert '1\n' == captured.out
 
 
+def test_run_path(tmp_path, capsys):
+    path = tmp_path / 'doubling.subpas'
+    path.write_text(DOUBLING_EXAMPLE)
+    run(str(path))
+    captured = capsys.readouterr()
+    assert '1\n2\n4\n8\n16\n32\n64\n128\n256\n' == captured.out
+
+
 def test_run_undefined_func_example(capsys):
     source_file = io.StringIO('(spam 18 35)')
     run(source_file)
@@ -77,6 +92,36 @@ def test_run_unexpected_close_paren_example(capsys):
     assert "*** Unexpected close parenthesis.\n" == captured.err
 
 
+@mark.parametrize("freeze_gc, frozen", [(True, True), (False, False)])
+def test_run_freezes_forms(capsys, monkeypatch, freeze_gc, frozen):
+    monkeypatch.setattr(evaluator, 'freeze_gc', freeze_gc)
+    gc.unfreeze()
+    try:
+        run(io.StringIO('(define frozen (n) n) (print (frozen 1))'))
+        assert frozen == (gc.get_freeze_count() > 0)
+    finally:
+        gc.unfreeze()
+    assert '1\n' == capsys.readouterr().out
+
+
+class Cycle:
+    """Object in a reference cycle, freed only by the cyclic GC."""
+
+    def __init__(self):
+        self.cycle = self
+
+
+def test_run_freezes_once_after_collecting(capsys, monkeypatch):
+    monkeypatch.setattr(evaluator, 'freeze_gc', True)
+    garbage = weakref.ref(Cycle())
+    frozen_with = []
+    monkeypatch.setattr(gc, 'freeze', lambda: frozen_with.append(garbage()))
+    run(io.StringIO('(define f (n) n) (print (f 1)) (print (f 2))'))
+    assert [None] == frozen_with
+    assert gc.isenabled()
+    assert '1\n2\n' == capsys.readouterr().out
+
+
 @mark.parametrize("args, global_env", [
     ([], {}),
     (['x'], {}),
@@ -86,3 +131,48 @@ def test_run_unexpected_close_paren_example(capsys):
 def test_env_from_args(args, global_env):
     got = env_from_args(args)
     assert global_env == got
+
+
+@mark.parametrize("args, options, rest", [
+    ([], {}, []),
+    (['x.subpas', 'a:1'], {}, ['x.subpas', 'a:1']),
+    (['--restore', 's.snap'], {'--restore': 's.snap'}, []),
+    (['--restore', 's.snap', 'x.subpas'], {'--restore': 's.snap'},
+     ['x.subpas']),
+])
+def test_parse_options(args, options, rest):
+    assert (options, rest) == parse_options(args)
+
+
+@mark.parametrize("args, message", [
+    (['--spam'], "Invalid command-line option: '--spam'."),
+    (['--restore'], "Invalid command-line option: '--restore needs a value'."),
+])
+def test_parse_options_invalid(args, message):
+    with raises(errors.InvalidOption) as excinfo:
+        parse_options(args)
+    assert message == str(excinfo.value)
+
+
+# Modules that running a script must not import: each would slow startup.
+STARTUP_EXCLUDED = [
+    'typing', 're', 'repl', 'compiler', 'specializer', 'resultcache',
+    'snapshot', 'parallel_parse', 'report', 'watch', 'profiler', 'metrics',
+    'daemon', 'client', 'asyncio', 'concurrent.futures', 'http.server',
+    'sqlite3', 'tracemalloc', 'checkpoint', 'hashlib', 'threading', 'batch',
+]
+
+
+def loaded_modules(code):
+    code += '; import sys; print(" ".join(sys.modules))'
+    result = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(__file__) or '.')
+    return set(result.stdout.split())
+
+
+def test_startup_imports():
+    loaded = loaded_modules('import subpascal')
+    assert 'subpascal' in loaded
+    loaded -= loaded_modules('pass')  # may be imported by site.py
+    assert [] == [name for name in STARTUP_EXCLUDED if name in loaded]
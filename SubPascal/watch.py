@@ -0,0 +1,291 @@
+import difflib
+import hashlib
+import os
+import re
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from evaluator import (
+    ValueEnv, SPECIAL_FORMS, define_function, undefine_function,
+)
+from parser import Expression, parse_exp, tokenize
+from specializer import assigned_names
+import errors
+import evaluator
+
+POLL_INTERVAL = 0.5  # seconds
+
+TOKEN_RE = re.compile(r'[()]|[^\s()]+')
+
+EnvPair = Tuple[ValueEnv, ValueEnv]  # local and global environments
+
+
+def split_forms(source: str) -> List[Tuple[int, str]]:
+    """Split `source` into top-level forms; return line and text of each.
+
+    Unbalanced parens end up in a form of their own, or in the last form.
+    """
+    forms = []
+    depth = 0
+    line = 1
+    line_pos = start = 0
+    for match in TOKEN_RE.finditer(source):
+        token = match.group()
+        if depth == 0:
+            start = match.start()
+        if token == '(':
+            depth += 1
+            continue
+        elif token == ')':
+            depth -= 1
+            if depth > 0:
+                continue
+        elif depth > 0:
+            continue
+        depth = 0
+        line += source.count('\n', line_pos, start)
+        line_pos = start
+        forms.append((line, source[start:match.end()]))
+    if depth > 0:
+        line += source.count('\n', line_pos, start)
+        forms.append((line, source[start:]))
+    return forms
+
+
+def called_names(exp: Expression) -> Set[str]:
+    """Return names of the functions called within `exp`."""
+    names: Set[str] = set()
+    if isinstance(exp, list) and exp:
+        if isinstance(exp[0], str) and exp[0] not in SPECIAL_FORMS:
+            names.add(exp[0])
+        for part in exp[1:]:
+            names |= called_names(part)
+    return names
+
+
+class Form:
+    """A top-level form of the watched file."""
+
+    def __init__(self, line: int, text: str, key: str):
+        self.line = line
+        self.text = text
+        self.key = key
+        self.exp: Optional[Expression] = None
+        self.error: Optional[errors.ParserException] = None
+        try:
+            self.exp = parse_exp(tokenize(text))
+        except errors.ParserException as exc:
+            self.error = exc
+        self.defines: Optional[str] = None
+        self.calls: Set[str] = set()
+        self.assigns = False
+        exp = self.exp
+        if isinstance(exp, list) and exp and exp[0] == 'define':
+            if (len(exp) == 4 and isinstance(exp[1], str)
+                    and isinstance(exp[2], list)):
+                self.defines = exp[1]
+                self.calls = called_names(exp[3])
+                self.assigns = bool(assigned_names(exp[3]) - set(exp[2]))
+        elif exp is not None:
+            self.calls = called_names(exp)
+            self.assigns = bool(assigned_names(exp))
+        self.writes = self.assigns  # updated with the functions called
+        self.env_after: Optional[EnvPair] = None  # if `writes`
+
+    @staticmethod
+    def key_of(text: str) -> str:
+        """Hash tokens of `text`, so changes in spacing are ignored."""
+        normalized = ' '.join(tokenize(text))
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def defined_names(forms: Iterable[Form]) -> Set[str]:
+    return {f.defines for f in forms if f.defines is not None}
+
+
+def closure(names: Set[str], forms: Iterable[Form]) -> Set[str]:
+    """Add to `names` the functions that call them, directly or not."""
+    forms = list(forms)
+    names = set(names)
+    while True:
+        more = defined_names(f for f in forms if f.calls & names) - names
+        if not more:
+            return names
+        names |= more
+
+
+class Watcher:
+    """Run a source file, then re-run only what each change affects.
+
+    The parsed forms of the previous run are kept, and matched with the
+    forms of the changed file by hash. Changed `define` forms are
+    re-run, with the forms after them that call the changed functions.
+    If a form that assigns global variables changed, all forms after it
+    are re-run, starting from the variables saved after the form before.
+    """
+
+    def __init__(self, path: str, env: Optional[ValueEnv] = None):
+        self.path = path
+        self.forms: List[Form] = []
+        self.initial: EnvPair = (dict(env or {}), dict(evaluator.global_env))
+        self.env: ValueEnv = dict(self.initial[0])
+        self.stamp: Tuple[int, int] = (0, -1)
+
+    def changed(self) -> bool:
+        stat = os.stat(self.path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self.stamp:
+            return False
+        self.stamp = stamp
+        return True
+
+    def update(self) -> str:
+        """Re-read the file and re-run affected forms; return a summary."""
+        start = time.perf_counter()
+        with open(self.path) as source_file:
+            source = source_file.read()
+        old_forms = self.forms
+        old_keys = [f.key for f in old_forms]
+        pieces = split_forms(source)
+        new_keys = [Form.key_of(text) for _, text in pieces]
+        matcher = difflib.SequenceMatcher(None, old_keys, new_keys,
+                                          autojunk=False)
+        forms: List[Optional[Form]] = [None] * len(pieces)
+        changed: Set[int] = set()
+        removed: List[Tuple[int, Form]] = []  # new position, old form
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                for i, j in zip(range(i1, i2), range(j1, j2)):
+                    forms[j] = old_forms[i]
+                    old_forms[i].line = pieces[j][0]
+                continue
+            for j in range(j1, j2):
+                forms[j] = Form(*pieces[j], new_keys[j])
+                changed.add(j)
+            removed.extend((j1, old_forms[i]) for i in range(i1, i2))
+        self.forms = new_forms = [f for f in forms if f is not None]
+        count = self.execute(changed, removed)
+        elapsed = (time.perf_counter() - start) * 1000
+        return f'ran {count} of {len(new_forms)} forms in {elapsed:.1f} ms'
+
+    def execute(self, changed: Set[int],
+                removed: List[Tuple[int, Form]]) -> int:
+        forms = self.forms
+        defined = defined_names(forms)
+        changed_funcs = defined_names(forms[i] for i in changed)
+        for _, form in removed:
+            if form.defines is not None:
+                changed_funcs.add(form.defines)
+                if (form.defines not in defined
+                        and form.defines in evaluator.function_env):
+                    undefine_function(form.defines)
+        affected = self.affected(changed, removed)
+        writers = closure(defined_names(f for f in forms if f.assigns), forms)
+        for form in forms:
+            form.writes = form.assigns or bool(form.calls & writers)
+        restart = len(forms)
+        for position, form in removed:
+            if form.defines is None and form.writes:
+                restart = min(restart, position)
+        for index, form in enumerate(forms):
+            if (form.defines is None and form.writes
+                    and (index in changed or form.calls & affected[index])):
+                restart = min(restart, index)
+                break
+        count = 0
+        for index, form in enumerate(forms):
+            if index == restart:
+                self.restore(index)
+            if form.defines is not None:
+                run = index in changed or form.defines in changed_funcs
+            else:
+                run = (index >= restart or index in changed
+                       or bool(form.calls & affected[index]))
+            if not run:
+                continue
+            if index < restart and form.defines is None:
+                self.run_isolated(form, index)
+            else:
+                self.run_form(form)
+            count += 1
+        return count
+
+    def affected(self, changed: Set[int],
+                 removed: List[Tuple[int, Form]]) -> List[Set[str]]:
+        """Return, for each form, the functions changed before it.
+
+        These are the functions whose `define` changed or was removed
+        before the form, and the functions calling them. Forms before a
+        changed `define` ran with the definitions before it, if any.
+        """
+        forms = self.forms
+        starts: Dict[str, int] = {}  # index of first form seeing a change
+        changes = [(forms[index].defines, index + 1) for index in changed]
+        changes += [(form.defines, position) for position, form in removed]
+        for name, start in changes:
+            if name is not None:
+                starts[name] = min(starts.get(name, start), start)
+        affected: List[Set[str]] = []
+        names: Set[str] = set()
+        current: Set[str] = set()
+        for index in range(len(forms)):
+            started = {n for n, start in starts.items() if start <= index}
+            if started != names:
+                names = started
+                current = closure(names, forms)
+            affected.append(current)
+        return affected
+
+    def saved_before(self, index: int) -> EnvPair:
+        """Return variables as they were before form at `index`."""
+        for form in reversed(self.forms[:index]):
+            if form.env_after is not None:
+                return form.env_after
+        return self.initial
+
+    def restore(self, index: int) -> None:
+        env, genv = self.saved_before(index)
+        self.env = dict(env)
+        evaluator.global_env.clear()
+        evaluator.global_env.update(genv)
+
+    def run_isolated(self, form: Form, index: int) -> None:
+        """Run form with the variables it saw, leaving current ones alone."""
+        env, genv = self.saved_before(index)
+        current = self.env, evaluator.global_env
+        self.env, evaluator.global_env = dict(env), dict(genv)
+        try:
+            self.run_form(form)
+        finally:
+            self.env, evaluator.global_env = current
+
+    def run_form(self, form: Form) -> None:
+        if form.error is not None:
+            print(f'*** line {form.line}: {form.error}', file=sys.stderr)
+            return
+        exp = form.exp
+        if isinstance(exp, list) and exp and exp[0] == 'define':
+            if form.defines is None:
+                print(f'*** line {form.line}: invalid define',
+                      file=sys.stderr)
+            else:
+                define_function(*exp[1:])
+            return
+        try:
+            evaluator.evaluate_form(self.env, exp)  # type: ignore[arg-type]
+        except errors.EvaluatorException as exc:
+            print(f'*** line {form.line}: {exc}', file=sys.stderr)
+        if form.writes:
+            form.env_after = (dict(self.env), dict(evaluator.global_env))
+
+    def watch(self, interval: float = POLL_INTERVAL) -> None:
+        """Poll the file, and update after each change, until interrupted."""
+        try:
+            while True:
+                if self.changed():
+                    print(f'[{self.update()}]', file=sys.stderr)
+                    evaluator.output.flush()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
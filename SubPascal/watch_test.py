@@ -0,0 +1,90 @@
+from pytest import fixture, mark
+
+import evaluator
+from watch import Watcher, split_forms
+
+
+@mark.parametrize("source, forms", [
+    ('', []),
+    ('x (+ 1 2)', [(1, 'x'), (1, '(+ 1 2)')]),
+    ('(a\n (b))\n\n(c)', [(1, '(a\n (b))'), (4, '(c)')]),
+    ('(a) )\n(b', [(1, '(a)'), (1, ')'), (2, '(b')]),
+])
+def test_split_forms(source, forms):
+    assert forms == split_forms(source)
+
+
+SOURCE = """
+(define double (n) (* n 2))
+(define quad (n) (double (double n)))
+(let x 1)
+(print (quad x))
+(let x (+ x 10))
+(print x)
+(print 7)
+"""
+
+
+@fixture
+def watcher(tmp_path, fresh_env, capsys):
+    path = tmp_path / 'script.subpas'
+    path.write_text(SOURCE)
+    watcher = Watcher(str(path))
+    assert 'ran 7 of 7 forms' in watcher.update()
+    assert '4\n11\n7\n' == capsys.readouterr().out
+    yield watcher
+
+
+def edit(watcher, old, new):
+    with open(watcher.path) as source_file:
+        source = source_file.read()
+    with open(watcher.path, 'w') as source_file:
+        source_file.write(source.replace(old, new))
+    return watcher.update()
+
+
+def test_watch_spacing_change(watcher, capsys):
+    assert 'ran 0 of 7 forms' in edit(watcher, '(print 7)', '(print\n  7)')
+    assert '' == capsys.readouterr().out
+
+
+def test_watch_changed_define(watcher, capsys):
+    assert 'ran 2 of 7 forms' in edit(watcher, '(* n 2)', '(* n 3)')
+    assert '9\n' == capsys.readouterr().out
+    assert 11 == evaluator.global_env['x']
+
+
+def test_watch_changed_let(watcher, capsys):
+    assert 'ran 5 of 7 forms' in edit(watcher, '(let x 1)', '(let x 2)')
+    assert '8\n12\n7\n' == capsys.readouterr().out
+    assert 12 == evaluator.global_env['x']
+
+
+def test_watch_changed_later_let(watcher, capsys):
+    assert 'ran 3 of 7 forms' in edit(watcher, '(+ x 10)', '(+ x 20)')
+    assert '21\n7\n' == capsys.readouterr().out
+
+
+def test_watch_removed_define(watcher, capsys):
+    message = edit(watcher, '(define double (n) (* n 2))', '')
+    assert 'ran 1 of 6 forms' in message
+    captured = capsys.readouterr()
+    assert "line 5: Undefined function: 'double'." in captured.err
+    assert 'double' not in evaluator.function_env
+
+
+def test_watch_form_before_changed_define(tmp_path, fresh_env, capsys):
+    path = tmp_path / 'script.subpas'
+    path.write_text('(print (f 1))\n(define f (x) (+ x 1))\n(print (f 2))\n')
+    watcher = Watcher(str(path))
+    watcher.update()
+    assert '3\n' == capsys.readouterr().out
+    assert 'ran 2 of 3 forms' in edit(watcher, '(+ x 1)', '(+ x 100)')
+    assert '102\n' == capsys.readouterr().out
+
+
+def test_watch_changed(watcher):
+    assert watcher.changed()
+    assert not watcher.changed()
+    edit(watcher, '(print 7)', '(print 70)')
+    assert watcher.changed()